@@ -3,17 +3,78 @@
 gen_mysql_heavy_full.py
 Создаёт 10 «тяжёлых» таблиц и заполняет их данными батчами.
 Цель размера: TARGET_GB (по умолчанию 8.0 GB).
-Работает через pymysql и INSERT (executemany).
+Работает через pymysql: INSERT (executemany) или LOAD DATA LOCAL INFILE.
+
+Режимы (MODE или --mode):
+  insert    — multi-row INSERT ... VALUES (...),(...), пачки режутся по байтам (INSERT_MAX_BYTES,
+              но не больше max_allowed_packet сервера), а не по числу строк;
+  load_data — строки сразу пишутся в TSV и стримятся в LOAD DATA LOCAL INFILE через именованный
+              канал (mkfifo), без временных файлов на диске; чанки по LOAD_CHUNK_BYTES, COMMIT после
+              каждого. На сервере нужен local_infile=ON (SET GLOBAL local_infile = 1).
+  --bench [--bench_rows N] — сравнить executemany, multi-row INSERT и LOAD DATA на одних и тех же
+              заранее сгенерированных строках (во временные bench_<table>), печатает rows/s и MB/s;
+              основная генерация не запускается.
+
+Загрузка параллельная (--workers, по умолчанию WORKERS): каждая таблица режется на диапазоны
+индексов примерно по TASK_BYTES, диапазоны раздаются пулу процессов, у каждого процесса одно
+соединение. Независимые таблицы грузятся одновременно; orders/messages/sessions/payments
+ссылаются на users/products и стартуют, когда нужные им таблицы догружены (подсказки id берутся
+из MAX(id)).
+
+python3 generate_mysql.py --mode load_data
+python3 generate_mysql.py --workers 16
+
+Строки/текст/JSON берутся из пулов, заготовленных при импорте (STRING_POOL, TEXT_POOL, LEAF_POOL,
+шаблоны JSON): срез вместо посимвольной генерации. --bench_gen сравнивает каждый gen_* с
+исходными rnd_*_ref. Метки времени — целые секунды + fmt_ts() с кэшем префиксов дня/минуты.
+Содержимое files режется окнами из BLOB_POOL_BYTES заранее сгенерированных байт (BlobSource;
+строится в родителе до старта пула, воркеры делят его после fork);
+--blob_compress R (0..1) задаёт долю сжимаемых байт, чтобы проверить ROW_FORMAT=COMPRESSED.
+
+Размер: план строк из EST_ROW_BYTES — только начальный. Во время загрузки генератор раз в
+  SIZE_POLL_SECONDS читает information_schema.TABLES (data_length + index_length), пересчитывает
+  оставшиеся строки каждой таблицы под её долю SPLIT от TARGET_GB и перестаёт выдавать новые
+  диапазоны, когда реальный размер достиг цели (--no_feedback — грузить ровно по оценке).
+  С --fast_load индексы строятся после загрузки, поэтому их объём обратная связь не видит.
+
+--fast_load — таблицы создаются только с PRIMARY KEY, загрузчики работают с unique_checks=0,
+  foreign_key_checks=0 и (если хватает прав) GLOBAL innodb_flush_log_at_trx_commit=2 на время
+  загрузки, как в generate_base.sql. Как только таблица догружена, все её вторичные и FULLTEXT
+  индексы добавляются одним ALTER TABLE ... ADD INDEX ..., ADD FULLTEXT KEY ... В конце —
+  время загрузки и построения индексов по таблицам и оценка сэкономленного времени (по пробной
+  вставке FAST_LOAD_PROBE_ROWS строк в копии таблицы с индексами и без).
+
+--server_side (--server-side) — строки генерирует сам MySQL: на каждую таблицу процедура
+  gen_fill_<table> в духе fill_fat_rows из dbas/mysql/bash/generate_base.sql (рекурсивный CTE ->
+  INSERT ... SELECT пачками по SERVER_BATCH_BYTES, COMMIT после каждой), диапазоны вызываются
+  через CALL из тех же воркеров — т.е. параллельными сессиями. Клиентский CPU и сеть не нужны;
+  текст и base64 берутся из маленьких пулов gen_text_pool/gen_blob_pool, залитых клиентом.
+  Совместим с --fast_load, --resume и обратной связью по размеру.
+
+--resume — продолжить прерванную генерацию. id строк задаются явно (= индекс строки, у sessions
+  индекс — hex-префикс id), а random пересеивается от --seed на каждые SEED_BLOCK индексов, так что
+  строка с данным индексом всегда одна и та же. По COUNT(*)/MAX(id) в каждом диапазоне видно, что
+  уже закоммичено, догружаются только пропуски. Воркер при обрыве соединения сам переподключается
+  и дописывает свой диапазон (LOAD_RETRIES раз). Без --resume непустые таблицы — ошибка.
+  TASK_BYTES, --seed и --blob_compress между запусками не меняйте.
+python3 generate_mysql.py --bench --bench_rows 20000
 """
 
 import os
+import re
 import sys
 import time
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 import math
 import random
 import string
 import base64
-from datetime import datetime, timedelta
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 import json
 
 try:
@@ -39,8 +100,38 @@ DB = {
 # Параметры генерации
 # -----------------------
 TARGET_GB = 10.0           # целевой размер базы в ГБ (измените: 5..30)
-MODE = "insert"           # только 'insert' поддержан по умолчанию (без LOAD DATA)
-BATCH_SIZE = 1000         # строки за INSERT executemany
+MODE = "insert"           # 'insert' (executemany) или 'load_data' (LOAD DATA LOCAL INFILE)
+BATCH_SIZE = 1000         # строки за executemany (только для сравнения в --bench)
+INSERT_MAX_BYTES = 8 * 1024 * 1024    # размер одного multi-row INSERT, урезается до max_allowed_packet
+PACKET_HEADROOM = 64 * 1024           # запас под заголовки пакета
+LOAD_CHUNK_BYTES = 64 * 1024 * 1024   # TSV-байт на один LOAD DATA (= одна транзакция)
+WORKERS = os.cpu_count() or 4         # процессов-загрузчиков, у каждого своё соединение
+TASK_BYTES = 256 * 1024 * 1024        # большие таблицы режутся на диапазоны примерно такого объёма
+FAST_LOAD_SESSION = [                 # --fast_load: на каждое соединение загрузчика
+    "SET SESSION unique_checks = 0",
+    "SET SESSION foreign_key_checks = 0",
+    # "SET SESSION sql_log_bin = 0",      # только если это не реплика/прод
+]
+SIZE_FEEDBACK = True                  # подгонять план строк по information_schema.TABLES
+SIZE_POLL_SECONDS = 15
+FEEDBACK_MIN_ROWS = 1000              # меньше строк — байт/строку ещё не показателен
+FAST_LOAD_PROBE_ROWS = 2000           # строк на таблицу для оценки выигрыша --fast_load
+BLOB_POOL_BYTES = 64 * 1024 * 1024    # буфер, из которого режется содержимое files
+BLOB_BLOCK = 4096
+BLOB_COMPRESSIBILITY = 0.0            # 0 — несжимаемые данные, 0.6 — zlib ужимает примерно в 2.5 раза
+SEED = 1                              # --seed: строки детерминированы (seed, таблица, индекс)
+POOL_SEED = 20240101                  # пулы строк/текста/байт одинаковы во всех запусках
+SEED_BLOCK = 1000                     # random пересеивается на каждом блоке индексов
+SESSION_ID_HEX = 12                   # hex-цифр индекса в начале sessions.id
+LOAD_RETRIES = 3                      # переподключений воркера на один диапазон
+SERVER_BATCH_BYTES = 32 * 1024 * 1024 # --server_side: примерно столько данных на один INSERT ... SELECT
+SERVER_BATCH_MAX_ROWS = 100000        # как батч fill_fat_rows в generate_base.sql
+TEXT_POOL_ROWS = 1024                 # строк в gen_text_pool
+TEXT_POOL_ROW = 4096                  # символов в каждой (самый длинный текст — 3000)
+BLOB_POOL_ROWS = 32                   # строк в gen_blob_pool
+BLOB_ROW_SLACK = 1024                 # вариантов начала окна в строке gen_blob_pool (шаг 3 байта)
+BENCH_ROWS = 20000        # строк на таблицу для --bench
+BENCH_TABLES = ["metrics", "orders", "users", "logs", "files"]
 COMMIT_EVERY = 20000      # количество строк до вызова conn.commit()
 VERBOSE = True
 
@@ -250,11 +341,19 @@ COUNTRIES = ["US","NL","DE","RU","CN","IN","GB","FR","ES","IT","JP","BR","CA","A
 SERVICES = ["auth","payments","worker","api","cron","scheduler","ui","db"]
 EVENT_TYPES = ["click","view","purchase","login","logout","update","create","delete"]
 
-def rnd_string(min_len=10, max_len=60):
+# Быстрое ядро: вместо посимвольной генерации для каждой строки — заранее сгенерированные пулы,
+# из которых строки вырезаются срезом (O(длины)), а JSON собирается по готовым шаблонам.
+STRING_ALPHABET = string.ascii_letters + string.digits + "   "
+POOL_CHARS = 1024 * 1024           # символов в пулах строк и текста
+WORD_POOL_SIZE = 8192              # словарь для rnd_text
+LEAF_POOL_SIZE = 16384             # готовые JSON-листья для rnd_json
+JSON_TEMPLATE_VARIANTS = 256       # разных структур на каждую пару (n, depth)
+
+def rnd_string_ref(min_len=10, max_len=60):
     l = random.randint(min_len, max_len)
-    return ''.join(random.choices(string.ascii_letters + string.digits + "   ", k=l)).strip()
+    return ''.join(random.choices(STRING_ALPHABET, k=l)).strip()
 
-def rnd_text(min_len=100, max_len=2000):
+def rnd_text_ref(min_len=100, max_len=2000):
     size = random.randint(min_len, max_len)
     words = []
     while sum(len(w)+1 for w in words) < size:
@@ -262,35 +361,166 @@ def rnd_text(min_len=100, max_len=2000):
         words.append(''.join(random.choices(string.ascii_lowercase, k=wlen)))
     return ' '.join(words)[:size]
 
-def rnd_json_kv(n=5, depth=1):
+def rnd_json_kv(n=5, depth=1, leaf=None):
     obj = {}
     for i in range(n):
         k = "k"+str(i)
         if depth > 0 and random.random() < 0.3:
-            obj[k] = rnd_json_kv(n=3, depth=depth-1)
+            obj[k] = rnd_json_kv(n=3, depth=depth-1, leaf=leaf)
         else:
-            obj[k] = rnd_string(3,20)
+            obj[k] = leaf if leaf is not None else rnd_string_ref(3,20)
     return obj
 
+def rnd_json_ref(n=5, depth=1):
+    return json.dumps(rnd_json_kv(n, depth), ensure_ascii=False)
+
+# пулы от фиксированного зерна: иначе --resume догенерировал бы другие строки
+random.seed(POOL_SEED)
+STRING_POOL = ''.join(random.choices(STRING_ALPHABET, k=POOL_CHARS))
+WORD_POOL = [''.join(random.choices(string.ascii_lowercase, k=random.randint(3, 12))) for _ in range(WORD_POOL_SIZE)]
+# ~POOL_CHARS текста из словаря и смещения начал слов, чтобы срез начинался с целого слова
+TEXT_POOL = ' '.join(random.choices(WORD_POOL, k=POOL_CHARS // 8))
+TEXT_STARTS = [0] + [m.end() for m in re.finditer(" ", TEXT_POOL)]
+# листья уже в кавычках: строки из букв/цифр/пробелов не требуют JSON-экранирования
+LEAF_POOL = ['"' + rnd_string_ref(3, 20) + '"' for _ in range(LEAF_POOL_SIZE)]
+JSON_TEMPLATES = {}
+_LEAF_MARK = "\x00"
+_LEAF_SLOT = json.dumps(_LEAF_MARK)
+
+def rnd_string(min_len=10, max_len=60):
+    l = random.randint(min_len, max_len)
+    start = random.randrange(len(STRING_POOL) - l)
+    return STRING_POOL[start:start + l].strip()
+
+def rnd_text(min_len=100, max_len=2000):
+    size = random.randint(min_len, max_len)
+    start = TEXT_STARTS[random.randrange(len(TEXT_STARTS))]
+    text = TEXT_POOL[start:start + size]
+    # хвост пула короче size — дописываем с начала, всё равно O(size)
+    while len(text) < size:
+        text += ' ' + TEXT_POOL[:size - len(text) - 1]
+    return text
+
+def json_templates(n, depth):
+    """Шаблоны JSON-объектов той же формы, что у rnd_json_kv, разрезанные по местам листьев."""
+    key = (n, depth)
+    templates = JSON_TEMPLATES.get(key)
+    if templates is None:
+        # своё зерно и сохранённое состояние random: шаблоны создаются лениво, в каком-то
+        # процессе посреди диапазона, и не должны сбивать последовательность строк
+        state = random.getstate()
+        random.seed(f"{POOL_SEED}:json:{n}:{depth}")
+        templates = []
+        for _ in range(JSON_TEMPLATE_VARIANTS):
+            doc = json.dumps(rnd_json_kv(n, depth, leaf=_LEAF_MARK), ensure_ascii=False)
+            templates.append(doc.split(_LEAF_SLOT))
+        random.setstate(state)
+        JSON_TEMPLATES[key] = templates
+    return templates
+
+def rnd_json(n=5, depth=1):
+    """Готовая JSON-строка: случайный шаблон + случайные листья из LEAF_POOL."""
+    parts = random.choice(json_templates(n, depth))
+    out = [None] * (2 * len(parts) - 1)
+    out[0::2] = parts
+    out[1::2] = random.choices(LEAF_POOL, k=len(parts) - 1)
+    return ''.join(out)
+
+# Метки времени: вместо datetime.now() + timedelta + strftime на каждую строку — целые секунды
+# «локального» времени от 1970-01-01 и кэш форматированных префиксов дня и минут.
+DAY = 86400
+EPOCH_DATE = date(1970, 1, 1)
+NOW_SEC = int((datetime.now() - datetime(1970, 1, 1)).total_seconds())
+DAY_PREFIX = {}
+MINUTE_OF_DAY = [f"{h:02d}:{m:02d}:" for h in range(24) for m in range(60)]
+SECOND = [f"{s:02d}" for s in range(60)]
+
+def fmt_ts(sec):
+    """Секунды от 1970-01-01 -> 'YYYY-MM-DD HH:MM:SS' (как strftime, но без datetime на строку)."""
+    day, tod = divmod(sec, DAY)
+    prefix = DAY_PREFIX.get(day)
+    if prefix is None:
+        prefix = DAY_PREFIX[day] = (EPOCH_DATE + timedelta(days=day)).strftime("%Y-%m-%d ")
+    minute, second = divmod(tod, 60)
+    return prefix + MINUTE_OF_DAY[minute] + SECOND[second]
+
+def days_ago(max_days):
+    return NOW_SEC - random.randint(0, max_days) * DAY
+
+def seconds_ago(max_seconds):
+    return NOW_SEC - random.randint(0, max_seconds)
+
+class BlobSource:
+    """
+    Содержимое files: один большой буфер, из которого режутся окна через memoryview, без копий.
+    compressibility — доля «сжимаемых» байт: в каждом блоке BLOB_BLOCK байт первые
+    (1 - compressibility) случайные, остальные повторяют начало блока, так что zlib
+    (ROW_FORMAT=COMPRESSED) сжимает примерно в 1 / (1 - compressibility) раз.
+    Пул один раз кодируется в base64; окно, начинающееся на границе 3 байт, — это срез
+    закодированной строки, т.е. на строку не тратится ни urandom, ни base64.
+    """
+
+    def __init__(self, size=BLOB_POOL_BYTES, compressibility=BLOB_COMPRESSIBILITY):
+        size -= size % BLOB_BLOCK
+        rand_len = max(1, int(BLOB_BLOCK * (1.0 - min(max(compressibility, 0.0), 1.0))))
+        rng = random.Random(POOL_SEED)
+        if rand_len >= BLOB_BLOCK:
+            buf = bytearray(rng.randbytes(size))
+        else:
+            buf = bytearray(size)
+            for off in range(0, size, BLOB_BLOCK):
+                head = rng.randbytes(rand_len)
+                block = (head * (BLOB_BLOCK // rand_len + 1))[:BLOB_BLOCK]
+                buf[off:off + BLOB_BLOCK] = block
+        self.buf = bytes(buf)
+        self.view = memoryview(self.buf)
+        self.b64 = base64.b64encode(self.view).decode('ascii')
+        self.compressibility = compressibility
+
+    def _offset(self, size):
+        # кратно 3 байтам: тогда base64 окна = срез base64 всего пула
+        return random.randrange(0, (len(self.buf) - size) // 3 + 1) * 3
+
+    def window(self, size):
+        off = self._offset(size)
+        return self.view[off:off + size]
+
+    def window_b64(self, size):
+        off = self._offset(size)
+        full = size - size % 3
+        text = self.b64[off // 3 * 4:(off + full) // 3 * 4]
+        if size % 3:
+            # хвост в 1-2 байта кодируем сами, с паддингом, как b64encode всего окна
+            text += base64.b64encode(self.view[off + full:off + size]).decode('ascii')
+        return text
+
+_blob = None
+
+def blob_source():
+    global _blob
+    if _blob is None or _blob.compressibility != BLOB_COMPRESSIBILITY:
+        _blob = BlobSource(compressibility=BLOB_COMPRESSIBILITY)
+    return _blob
+
 def gen_user(i):
     username = f"user{i}_{rnd_string(4,8)}"
     email = f"{username}@example.com"
     full_name = rnd_string(10,40)
-    profile = rnd_json_kv(6, depth=2)
+    profile = rnd_json(6, depth=2)
     bio = rnd_text(200, 1200)
     country = random.choice(COUNTRIES)
-    created = datetime.now() - timedelta(days=random.randint(0, 3650))
-    last_login = created + timedelta(days=random.randint(0, 3000))
+    created = days_ago(3650)
+    last_login = created + random.randint(0, 3000) * DAY
     flags = random.randint(0, 255)
     return (
         username,
         email,
         full_name,
-        json.dumps(profile, ensure_ascii=False),  # ✅ правильный JSON
+        profile,  # ✅ правильный JSON
         bio,
         country,
-        created.strftime("%Y-%m-%d %H:%M:%S"),
-        last_login.strftime("%Y-%m-%d %H:%M:%S"),
+        fmt_ts(created),
+        fmt_ts(last_login),
         flags
     )
 
@@ -298,13 +528,13 @@ def gen_product(i):
     sku = f"SKU-{i:012d}"
     name = " ".join([rnd_string(4,12) for _ in range(6)])[:300]
     category = random.choice(["electronics","books","clothing","home","garden","sports","auto","software"])
-    attributes = rnd_json_kv(10, depth=2)
+    attributes = rnd_json(10, depth=2)
     description = rnd_text(400, 2000)
     price = round(random.uniform(0.5, 10000.0), 4)
     stock = random.randint(0, 10000)
     vendor = rnd_string(6, 40)
-    created = datetime.now() - timedelta(days=random.randint(0, 3650))
-    return (sku, name, category, json.dumps(attributes, ensure_ascii=False), description, price, stock, vendor, created.strftime("%Y-%m-%d %H:%M:%S"))
+    created = days_ago(3650)
+    return (sku, name, category, attributes, description, price, stock, vendor, fmt_ts(created))
 
 def gen_order(i, max_user_id, max_product_id):
     user_id = random.randint(1, max(1, max_user_id))
@@ -315,8 +545,8 @@ def gen_order(i, max_user_id, max_product_id):
     shipping = round(random.uniform(0, 50.0), 4)
     total = round(unit_price * qty + tax + shipping, 4)
     status = random.choice(["new","processing","shipped","delivered","cancelled","failed"])
-    created = datetime.now() - timedelta(days=random.randint(0, 3650))
-    return (user_id, product_id, qty, unit_price, tax, shipping, total, status, created.strftime("%Y-%m-%d %H:%M:%S"))
+    created = days_ago(3650)
+    return (user_id, product_id, qty, unit_price, tax, shipping, total, status, fmt_ts(created))
 
 def gen_log(i):
     level = random.choice(["DEBUG","INFO","WARN","ERROR","CRITICAL"])
@@ -325,21 +555,21 @@ def gen_log(i):
     pid = random.randint(100, 99999)
     thread = rnd_string(6, 20)
     message = rnd_text(300, 2500)
-    context = rnd_json_kv(6, depth=2)
-    created = datetime.now() - timedelta(seconds=random.randint(0, 60*60*24*365))
-    return (level, service, host, pid, thread, message, json.dumps(context, ensure_ascii=False), created.strftime("%Y-%m-%d %H:%M:%S"))
+    context = rnd_json(6, depth=2)
+    created = seconds_ago(60*60*24*365)
+    return (level, service, host, pid, thread, message, context, fmt_ts(created))
 
 def gen_audit(i):
     user_id = random.randint(1, 1000000)
     object_type = random.choice(["order","product","user","session","payment","file"])
     object_id = str(random.randint(1, 1000000000))
     action = random.choice(["create","update","delete","access","permission_change"])
-    payload = rnd_json_kv(10, depth=2)
+    payload = rnd_json(10, depth=2)
     old = rnd_text(50, 800)
     new = rnd_text(50, 800)
     ip = f"{random.randint(1,255)}.{random.randint(0,255)}.{random.randint(0,255)}.{random.randint(0,255)}"
-    created = datetime.now() - timedelta(days=random.randint(0, 3650))
-    return (user_id, object_type, object_id, action, json.dumps(payload, ensure_ascii=False), old, new, ip, created.strftime("%Y-%m-%d %H:%M:%S"))
+    created = days_ago(3650)
+    return (user_id, object_type, object_id, action, payload, old, new, ip, fmt_ts(created))
 
 def gen_file(i):
     owner_id = random.randint(1, 1000000)
@@ -347,40 +577,41 @@ def gen_file(i):
     mime = random.choice(["application/octet-stream","image/png","application/pdf","text/plain","application/zip"])
     # size around 100KB..300KB (adjust if needed)
     size = random.randint(100*1024, 300*1024)
-    # random bytes then base64 to simulate content stored as base64 MEDIUMTEXT
-    b = os.urandom(size)
-    b64 = base64.b64encode(b).decode('ascii')
-    metadata = rnd_json_kv(6, depth=1)
-    created = datetime.now() - timedelta(days=random.randint(0, 3650))
-    return (owner_id, filename, mime, size, b64, json.dumps(metadata, ensure_ascii=False), created.strftime("%Y-%m-%d %H:%M:%S"))
+    # окно из заранее сгенерированного и закодированного пула вместо os.urandom + base64 на строку
+    b64 = blob_source().window_b64(size)
+    metadata = rnd_json(6, depth=1)
+    created = days_ago(3650)
+    return (owner_id, filename, mime, size, b64, metadata, fmt_ts(created))
 
 def gen_metric(i):
     metric_name = random.choice(["cpu.usage","mem.usage","disk.io","http.requests","db.connections","latency"])
-    ts = datetime.now() - timedelta(seconds=random.randint(0, 60*60*24*365))
+    ts = seconds_ago(60*60*24*365)
     value = random.random() * 1000.0
-    tags = rnd_json_kv(5, depth=1)
+    tags = rnd_json(5, depth=1)
     sample_rate = random.choice([1,5,10,60])
-    created = ts
-    return (metric_name, ts.strftime("%Y-%m-%d %H:%M:%S"), value, json.dumps(tags, ensure_ascii=False), sample_rate, created.strftime("%Y-%m-%d %H:%M:%S"))
+    # created совпадает с ts — форматируем один раз
+    ts_str = fmt_ts(ts)
+    return (metric_name, ts_str, value, tags, sample_rate, ts_str)
 
 def gen_message(i, max_user_id):
     from_user = random.randint(1, max(1, max_user_id))
     to_user = random.randint(1, max(1, max_user_id))
     subject = rnd_string(20, 200)[:300]
     body = rnd_text(200, 3000)
-    attachments = rnd_json_kv(3, depth=1)
+    attachments = rnd_json(3, depth=1)
     is_read = random.choice([0,1])
-    created = datetime.now() - timedelta(days=random.randint(0, 3650))
-    return (from_user, to_user, subject, body, json.dumps(attachments, ensure_ascii=False), is_read, created.strftime("%Y-%m-%d %H:%M:%S"))
+    created = days_ago(3650)
+    return (from_user, to_user, subject, body, attachments, is_read, fmt_ts(created))
 
 def gen_session(i, max_user_id):
-    sid = ''.join(random.choices('0123456789abcdef', k=36))
+    # индекс строки в начале id: по нему --resume находит, что уже загружено
+    sid = f"{i:0{SESSION_ID_HEX}x}-" + ''.join(random.choices('0123456789abcdef', k=35 - SESSION_ID_HEX))
     user_id = random.randint(1, max(1, max_user_id))
     token = ''.join(random.choices(string.ascii_letters + string.digits, k=120))
-    data = rnd_json_kv(8, depth=2)
-    created = datetime.now() - timedelta(days=random.randint(0, 3650))
-    expires = created + timedelta(days=random.randint(1, 365))
-    return (sid, user_id, token, json.dumps(data, ensure_ascii=False), created.strftime("%Y-%m-%d %H:%M:%S"), expires.strftime("%Y-%m-%d %H:%M:%S"))
+    data = rnd_json(8, depth=2)
+    created = days_ago(3650)
+    expires = created + random.randint(1, 365) * DAY
+    return (sid, user_id, token, data, fmt_ts(created), fmt_ts(expires))
 
 def gen_payment(i, max_user_id):
     order_id = random.randint(1, 20000000)
@@ -390,8 +621,8 @@ def gen_payment(i, max_user_id):
     method = random.choice(["card","paypal","bank","crypto","apple_pay"])
     status = random.choice(["ok","failed","pending","refunded"])
     details = rnd_text(50, 400)
-    created = datetime.now() - timedelta(days=random.randint(0, 3650))
-    return (order_id, user_id, amount, currency, method, status, details, created.strftime("%Y-%m-%d %H:%M:%S"))
+    created = days_ago(3650)
+    return (order_id, user_id, amount, currency, method, status, details, fmt_ts(created))
 
 # -----------------------
 # Вспомогательные: расчет количества строк для каждой таблицы
@@ -431,6 +662,14 @@ INSERT_SQL = {
                  gen_payment),
 }
 
+# у этих таблиц id = индекс строки задаётся явно (gen_rows добавляет его первым полем),
+# у sessions индекс уже сидит в префиксе id
+EXPLICIT_ID = {t for t, (q, _) in INSERT_SQL.items() if "(id," not in q}
+
+# колонки для LOAD DATA берём из тех же INSERT, чтобы порядок полей совпадал с gen_*
+TABLE_COLUMNS = {t: ("id," if t in EXPLICIT_ID else "") + re.search(r"\(([^)]*)\) VALUES", q).group(1)
+                 for t, (q, _) in INSERT_SQL.items()}
+
 # -----------------------
 # Основные функции вставки
 # -----------------------
@@ -438,149 +677,988 @@ def connect():
     return pymysql.connect(host=DB["host"], port=DB["port"],
                            user=DB["user"], password=DB["password"],
                            database=DB["database"], charset=DB["charset"],
-                           cursorclass=DB["cursorclass"], autocommit=False)
+                           cursorclass=DB["cursorclass"], autocommit=False,
+                           local_infile=True)
+
+SECONDARY_KEY_PREFIXES = ("INDEX ", "KEY ", "UNIQUE ", "FULLTEXT ", "SPATIAL ")
+
+def split_table_sql(ddl):
+    """
+    CREATE TABLE из TABLE_SQL -> (тот же CREATE только с PRIMARY KEY, [определения вторичных индексов]).
+    Индексы — строки вида INDEX/KEY/FULLTEXT KEY ... внутри скобок.
+    """
+    lines = ddl.strip().splitlines()
+    keep, indexes = [], []
+    for line in lines:
+        body = line.strip().rstrip(",")
+        if body.upper().startswith(SECONDARY_KEY_PREFIXES):
+            indexes.append(body)
+        else:
+            keep.append(line)
+    # после выкидывания индексов у последней колонки перед ") ENGINE" остаётся лишняя запятая
+    close = next(i for i in range(len(keep) - 1, -1, -1) if keep[i].lstrip().startswith(")"))
+    keep[close - 1] = keep[close - 1].rstrip().rstrip(",")
+    return "\n".join(keep) + "\n", indexes
 
-def create_tables(conn):
+def create_tables(conn, fast_load=False):
     cur = conn.cursor()
     for name, sql in TABLE_SQL.items():
         if VERBOSE:
-            print(f"[DDL] creating table {name} ...")
-        cur.execute(sql)
+            print(f"[DDL] creating table {name}{' (PK only)' if fast_load else ''} ...")
+        cur.execute(split_table_sql(sql)[0] if fast_load else sql)
     conn.commit()
 
-def batched_insert(conn, table, count, gen_fn, batch_size=BATCH_SIZE, commit_every=COMMIT_EVERY, start_index=0, max_user_id_hint=1000000, max_product_id_hint=1000000):
+def add_indexes(conn, table):
+    """Все недостающие вторичные индексы таблицы одним ALTER TABLE (один проход по данным)."""
     cur = conn.cursor()
-    sql, _ = INSERT_SQL[table]
-    inserted = 0
-    to_commit = 0
+    cur.execute("SELECT DISTINCT index_name FROM information_schema.STATISTICS "
+                "WHERE table_schema = DATABASE() AND table_name = %s", (table,))
+    existing = {r[0] for r in cur.fetchall()}
+    clauses = []
+    for idx in split_table_sql(TABLE_SQL[table])[1]:
+        name = re.search(r"(?:INDEX|KEY)\s+`?(\w+)`?\s*\(", idx, re.I).group(1)
+        if name not in existing:
+            clauses.append("ADD " + idx)
+    if not clauses:
+        return 0.0
     t0 = time.time()
-    batch = []
-    while inserted < count:
-        idx = start_index + inserted + 1
+    cur.execute(f"ALTER TABLE `{table}` " + ", ".join(clauses))
+    conn.commit()
+    return time.time() - t0
+
+def apply_fast_load_session(conn):
+    """Сессионные настройки массовой загрузки, как в dbas/mysql/bash/generate_base.sql."""
+    cur = conn.cursor()
+    for stmt in FAST_LOAD_SESSION:
+        try:
+            cur.execute(stmt)
+        except pymysql.MySQLError as e:
+            print(f"[fast_load] {stmt} failed: {e}")
+
+def set_global_flush(conn, value):
+    """
+    innodb_flush_log_at_trx_commit — только GLOBAL (SET SESSION из generate_base.sql MySQL не примет).
+    Возвращает прежнее значение или None, если прав не хватило.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT @@GLOBAL.innodb_flush_log_at_trx_commit")
+        old = cur.fetchone()[0]
+        cur.execute("SET GLOBAL innodb_flush_log_at_trx_commit = %s", (value,))
+        return old
+    except pymysql.MySQLError as e:
+        print(f"[fast_load] cannot set innodb_flush_log_at_trx_commit: {e}")
+        return None
+
+def gen_rows(table, count, gen_fn, start_index=0, max_user_id_hint=1000000, max_product_id_hint=1000000, seed=None):
+    """
+    Строки с индексами start_index+1 .. start_index+count. С seed random пересеивается от
+    (seed, table, номер блока) в начале каждого блока SEED_BLOCK, а генерация идёт с начала
+    блока (лишние строки выбрасываются) — строка зависит только от индекса, не от нарезки.
+    """
+    explicit_id = table in EXPLICIT_ID
+    first = start_index + 1
+    end = start_index + count
+    idx = first if seed is None else first - (first - 1) % SEED_BLOCK
+    while idx <= end:
+        if seed is not None and (idx - 1) % SEED_BLOCK == 0:
+            random.seed(f"{seed}:{table}:{(idx - 1) // SEED_BLOCK}")
         # generate row based on table specifics
         if table == "orders":
             row = gen_fn(idx, max_user_id_hint, max_product_id_hint)
-        elif table == "messages":
-            row = gen_fn(idx, max_user_id_hint)
-        elif table == "sessions":
-            row = gen_fn(idx, max_user_id_hint)
-        elif table == "payments":
+        elif table in ("messages", "sessions", "payments"):
             row = gen_fn(idx, max_user_id_hint)
         else:
             # generic single-arg generator
             row = gen_fn(idx)
-        batch.append(row)
-        if len(batch) >= batch_size:
-            cur.executemany(sql, batch)
-            inserted += len(batch)
-            to_commit += len(batch)
-            batch = []
-            if to_commit >= commit_every:
-                conn.commit()
-                to_commit = 0
-            if VERBOSE and inserted % (batch_size*5) == 0:
-                elapsed = time.time() - t0
-                print(f"[{table}] inserted {inserted}/{count} rows, elapsed {elapsed:.1f}s")
-    # final flush
-    if batch:
-        cur.executemany(sql, batch)
-        inserted += len(batch)
+        if idx >= first:
+            yield (idx,) + row if explicit_id else row
+        idx += 1
+
+def packet_limit(conn):
+    """Сколько байт можно отправить одним запросом: меньшее из max_allowed_packet сервера и клиента."""
+    cur = conn.cursor()
+    cur.execute("SELECT @@max_allowed_packet")
+    server = int(cur.fetchone()[0])
+    return min(server, conn.max_allowed_packet) - PACKET_HEADROOM
+
+def extended_inserts(conn, table, rows, max_bytes, columns=None):
+    """
+    Собирает из строк multi-row INSERT ... VALUES (...),(...) не длиннее max_bytes байт.
+    Экранирование — conn.literal(), как в cursor.execute(), поэтому и мелкие строки metrics,
+    и 300 KB строки files упаковываются в пакеты почти предельного размера.
+    Отдаёт пары (sql, число строк).
+    """
+    prefix = f"INSERT INTO `{table}` ({columns or TABLE_COLUMNS[table]}) VALUES "
+    prefix_len = len(prefix.encode("utf-8"))
+    parts = []
+    size = prefix_len
+    for row in rows:
+        values = "(" + ",".join(conn.literal(v) for v in row) + ")"
+        n = len(values.encode("utf-8")) + 1
+        if parts and size + n > max_bytes:
+            yield prefix + ",".join(parts), len(parts)
+            parts = []
+            size = prefix_len
+        if prefix_len + n > max_bytes:
+            raise ValueError(f"{table}: row of {n} bytes does not fit into max_allowed_packet ({max_bytes} bytes)")
+        parts.append(values)
+        size += n
+    if parts:
+        yield prefix + ",".join(parts), len(parts)
+
+def batched_insert(conn, table, count, gen_fn, max_bytes=INSERT_MAX_BYTES, commit_every=COMMIT_EVERY, start_index=0, max_user_id_hint=1000000, max_product_id_hint=1000000, seed=None):
+    cur = conn.cursor()
+    max_bytes = min(max_bytes, packet_limit(conn))
+    inserted = 0
+    to_commit = 0
+    statements = 0
+    t0 = time.time()
+    rows = gen_rows(table, count, gen_fn, start_index, max_user_id_hint, max_product_id_hint, seed)
+    for sql, n in extended_inserts(conn, table, rows, max_bytes):
+        cur.execute(sql)
+        inserted += n
+        to_commit += n
+        statements += 1
+        if to_commit >= commit_every:
+            conn.commit()
+            to_commit = 0
+        if VERBOSE and statements % 5 == 0:
+            elapsed = time.time() - t0
+            print(f"[{table}] inserted {inserted}/{count} rows, elapsed {elapsed:.1f}s")
     conn.commit()
     if VERBOSE:
-        print(f"[{table}] done. inserted {inserted} rows in {time.time()-t0:.1f}s")
+        print(f"[{table}] done. inserted {inserted} rows in {time.time()-t0:.1f}s "
+              f"({statements} INSERTs, ~{inserted / max(1, statements):.0f} rows each)")
+    return inserted
+
+# -----------------------
+# LOAD DATA LOCAL INFILE
+# -----------------------
+# формат по умолчанию у LOAD DATA: поля через \t, строки через \n, экранирование \, NULL = \N
+TSV_ESCAPE = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\0": "\\0"})
+
+def tsv_line(row):
+    return "\t".join("\\N" if v is None else str(v).translate(TSV_ESCAPE) for v in row) + "\n"
+
+def load_data_chunk(conn, table, columns, rows, max_bytes=LOAD_CHUNK_BYTES):
+    """
+    Один LOAD DATA LOCAL INFILE: строки из итератора rows пишутся в TSV, пока не наберётся
+    max_bytes. pymysql читает «файл» по имени, поэтому отдаём ему именованный канал, в который
+    пишет отдельный поток, — данные идут на сервер по мере генерации. Возвращает (строк, байт).
+    """
+    state = {"rows": 0, "bytes": 0, "error": None}
+
+    def write_to(f):
+        for row in rows:
+            data = tsv_line(row).encode("utf-8")
+            f.write(data)
+            state["rows"] += 1
+            state["bytes"] += len(data)
+            if state["bytes"] >= max_bytes:
+                break
+
+    tmpdir = tempfile.mkdtemp(prefix="gen_mysql_")
+    path = os.path.join(tmpdir, f"{table}.tsv")
+    writer = None
+    try:
+        if hasattr(os, "mkfifo"):
+            os.mkfifo(path)
+
+            def writer_main():
+                try:
+                    with open(path, "wb", buffering=1024 * 1024) as f:
+                        write_to(f)
+                except Exception as e:
+                    state["error"] = e
+
+            writer = threading.Thread(target=writer_main, daemon=True)
+            writer.start()
+        else:
+            # без mkfifo (Windows) — чанк через временный файл
+            with open(path, "wb") as f:
+                write_to(f)
+        cur = conn.cursor()
+        try:
+            cur.execute(f"LOAD DATA LOCAL INFILE %s INTO TABLE `{table}` CHARACTER SET utf8mb4 ({columns})", (path,))
+        finally:
+            if writer is not None and writer.is_alive():
+                # сервер отказал до чтения канала — открываем его сами, чтобы писатель не висел
+                try:
+                    fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+                    os.close(fd)
+                except OSError:
+                    pass
+                writer.join(timeout=5)
+        if state["error"] is not None:
+            raise state["error"]
+        return state["rows"], state["bytes"]
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+        os.rmdir(tmpdir)
+
+def load_data_insert(conn, table, count, gen_fn, chunk_bytes=LOAD_CHUNK_BYTES, start_index=0, max_user_id_hint=1000000, max_product_id_hint=1000000, seed=None):
+    rows = gen_rows(table, count, gen_fn, start_index, max_user_id_hint, max_product_id_hint, seed)
+    inserted = 0
+    total_bytes = 0
+    t0 = time.time()
+    while inserted < count:
+        n, nbytes = load_data_chunk(conn, table, TABLE_COLUMNS[table], rows, chunk_bytes)
+        if n == 0:
+            break
+        conn.commit()
+        inserted += n
+        total_bytes += nbytes
+        if VERBOSE:
+            elapsed = time.time() - t0
+            print(f"[{table}] loaded {inserted}/{count} rows, {total_bytes / 1024**2:.0f} MB, elapsed {elapsed:.1f}s")
+    if VERBOSE:
+        elapsed = max(time.time() - t0, 1e-9)
+        print(f"[{table}] done. loaded {inserted} rows in {elapsed:.1f}s "
+              f"({inserted / elapsed:.0f} rows/s, {total_bytes / 1024**2 / elapsed:.1f} MB/s)")
     return inserted
 
+# -----------------------
+# Генерация на стороне сервера (--server_side)
+# -----------------------
+# Как fill_fat_rows из dbas/mysql/bash/generate_base.sql: на каждую таблицу процедура, которая
+# пачками по рекурсивному CTE делает INSERT ... SELECT и COMMIT. Клиент только вызывает CALL,
+# строки не ходят по сети. Выражения — SQL-приближения gen_*: те же списки значений и
+# диапазоны, JSON той же формы; текст и base64 режутся из небольших таблиц-пулов, которые
+# клиент один раз заливает из TEXT_POOL и BlobSource (иначе FULLTEXT и сжатие были бы не те).
+
+def s_int(a, b):
+    return f"({a} + FLOOR(RAND() * {b - a + 1}))"
+
+def s_uniform(a, b):
+    return f"ROUND({a} + RAND() * {b - a}, 4)"
+
+def s_choice(items):
+    return f"ELT(1 + FLOOR(RAND() * {len(items)}), " + ", ".join(f"'{v}'" for v in items) + ")"
+
+def s_text(min_len, max_len):
+    # кусок строки пула со случайного места; tp — строка gen_text_pool, выбранная для этой строки
+    return f"SUBSTRING(tp.txt, 1 + FLOOR(RAND() * {TEXT_POOL_ROW - max_len}), {s_int(min_len, max_len)})"
+
+def s_string(min_len, max_len):
+    if max_len > 64:
+        return s_text(min_len, max_len)
+    return f"LEFT(CONCAT(MD5(RAND()), MD5(RAND())), {s_int(min_len, max_len)})"
+
+def s_json(n, depth):
+    """JSON_OBJECT той же формы, что rnd_json_kv: k0..k{n-1}, с вероятностью 0.3 вложенный объект."""
+    parts = []
+    for i in range(n):
+        leaf = s_string(3, 20)
+        if depth > 0:
+            # IF() вернёт текст — и объекта, и строки-в-кавычках; CAST обратно делает из него JSON
+            leaf = f"CAST(IF(RAND() < 0.3, {s_json(3, depth - 1)}, JSON_QUOTE({leaf})) AS JSON)"
+        parts.append(f"'k{i}', {leaf}")
+    return "JSON_OBJECT(" + ", ".join(parts) + ")"
+
+def s_days_ago(max_days):
+    return f"(NOW() - INTERVAL FLOOR(RAND() * {max_days + 1}) DAY)"
+
+def s_seconds_ago(max_seconds):
+    return f"(NOW() - INTERVAL FLOOR(RAND() * {max_seconds + 1}) SECOND)"
+
+S_IDX = "(first_id + done + seq.n)"     # индекс строки, как idx в gen_rows
+
+def server_spec(table):
+    """
+    (вычисляемые заранее поля [(имя, выражение)], [(колонка, выражение)]). Заранее — то, что
+    нужно в нескольких колонках (created для last_login, размер файла и т.п.): их считает
+    подзапрос s, выражения колонок ссылаются на s.<имя>.
+    """
+    if table == "users":
+        pre = [("uname", f"CONCAT('user', {S_IDX}, '_', {s_string(4, 8)})"), ("created", s_days_ago(3650))]
+        cols = [("username", "s.uname"), ("email", "CONCAT(s.uname, '@example.com')"),
+                ("full_name", s_string(10, 40)), ("profile", s_json(6, 2)), ("bio", s_text(200, 1200)),
+                ("country", s_choice(COUNTRIES)), ("created_at", "s.created"),
+                ("last_login", f"s.created + INTERVAL {s_int(0, 3000)} DAY"), ("flags", s_int(0, 255))]
+    elif table == "products":
+        pre = [("sku", f"CONCAT('SKU-', LPAD({S_IDX}, 12, '0'))")]
+        cols = [("sku", "s.sku"), ("name", s_string(30, 80)),
+                ("category", s_choice(["electronics","books","clothing","home","garden","sports","auto","software"])),
+                ("attributes", s_json(10, 2)), ("description", s_text(400, 2000)),
+                ("price", s_uniform(0.5, 10000.0)), ("stock", s_int(0, 10000)), ("vendor", s_string(6, 40)),
+                ("created_at", s_days_ago(3650))]
+    elif table == "orders":
+        pre = [("qty", s_int(1, 20)), ("up", s_uniform(0.5, 5000.0)), ("ship", s_uniform(0, 50.0))]
+        cols = [("user_id", "(1 + FLOOR(RAND() * max_user))"), ("product_id", "(1 + FLOOR(RAND() * max_product))"),
+                ("qty", "s.qty"), ("unit_price", "s.up"), ("tax", "ROUND(s.up * 0.1, 4)"), ("shipping", "s.ship"),
+                ("total", "ROUND(s.up * s.qty + ROUND(s.up * 0.1, 4) + s.ship, 4)"),
+                ("status", s_choice(["new","processing","shipped","delivered","cancelled","failed"])),
+                ("created_at", s_days_ago(3650))]
+    elif table == "logs":
+        pre = []
+        cols = [("level", s_choice(["DEBUG","INFO","WARN","ERROR","CRITICAL"])), ("service", s_choice(SERVICES)),
+                ("host", f"CONCAT('host', {s_int(1, 200)})"), ("pid", s_int(100, 99999)),
+                ("thread", s_string(6, 20)), ("message", s_text(300, 2500)), ("context", s_json(6, 2)),
+                ("created_at", s_seconds_ago(60*60*24*365))]
+    elif table == "audit_trail":
+        pre = []
+        cols = [("user_id", s_int(1, 1000000)),
+                ("object_type", s_choice(["order","product","user","session","payment","file"])),
+                ("object_id", f"CAST({s_int(1, 1000000000)} AS CHAR)"),
+                ("action", s_choice(["create","update","delete","access","permission_change"])),
+                ("payload", s_json(10, 2)), ("old_value", s_text(50, 800)), ("new_value", s_text(50, 800)),
+                ("ip", f"CONCAT_WS('.', {s_int(1, 255)}, {s_int(0, 255)}, {s_int(0, 255)}, {s_int(0, 255)})"),
+                ("created_at", s_days_ago(3650))]
+    elif table == "files":
+        pre = [("sz", s_int(100*1024, 300*1024))]
+        # base64 окна из строки gen_blob_pool: начало кратно 4 символам = 3 байтам, как в BlobSource
+        cols = [("owner_id", s_int(1, 1000000)), ("filename", f"CONCAT('file_', s.idx, '_', {s_string(6, 20)}, '.dat')"),
+                ("mime", s_choice(["application/octet-stream","image/png","application/pdf","text/plain","application/zip"])),
+                ("size_bytes", "s.sz"),
+                ("content_base64", f"SUBSTRING(bp.b64, 1 + 4 * FLOOR(RAND() * {BLOB_ROW_SLACK}), 4 * CEIL(s.sz / 3))"),
+                ("metadata", s_json(6, 1)), ("created_at", s_days_ago(3650))]
+    elif table == "metrics":
+        pre = [("ts", s_seconds_ago(60*60*24*365))]
+        cols = [("metric_name", s_choice(["cpu.usage","mem.usage","disk.io","http.requests","db.connections","latency"])),
+                ("ts", "s.ts"), ("value", "RAND() * 1000.0"), ("tags", s_json(5, 1)),
+                ("sample_rate", f"ELT(1 + FLOOR(RAND() * 4), 1, 5, 10, 60)"), ("created_at", "s.ts")]
+    elif table == "messages":
+        pre = []
+        cols = [("from_user", "(1 + FLOOR(RAND() * max_user))"), ("to_user", "(1 + FLOOR(RAND() * max_user))"),
+                ("subject", s_text(20, 200)), ("body", s_text(200, 3000)), ("attachments", s_json(3, 1)),
+                ("is_read", s_int(0, 1)), ("created_at", s_days_ago(3650))]
+    elif table == "sessions":
+        pre = [("created", s_days_ago(3650))]
+        cols = [("id", f"CONCAT(LOWER(LPAD(HEX(s.idx), {SESSION_ID_HEX}, '0')), '-', "
+                       f"LEFT(CONCAT(MD5(RAND()), MD5(RAND())), {35 - SESSION_ID_HEX}))"),
+                ("user_id", "(1 + FLOOR(RAND() * max_user))"),
+                ("token", "LEFT(CONCAT(MD5(RAND()), MD5(RAND()), MD5(RAND()), MD5(RAND())), 120)"),
+                ("data", s_json(8, 2)), ("created_at", "s.created"),
+                ("expires_at", f"s.created + INTERVAL {s_int(1, 365)} DAY")]
+    elif table == "payments":
+        pre = []
+        cols = [("order_id", s_int(1, 20000000)), ("user_id", "(1 + FLOOR(RAND() * max_user))"),
+                ("amount", s_uniform(0.1, 20000.0)), ("currency", s_choice(["USD","EUR","RUB","CNY","GBP"])),
+                ("method", s_choice(["card","paypal","bank","crypto","apple_pay"])),
+                ("status", s_choice(["ok","failed","pending","refunded"])), ("details", s_text(50, 400)),
+                ("created_at", s_days_ago(3650))]
+    else:
+        raise ValueError(f"no server-side spec for {table}")
+    if table in EXPLICIT_ID:
+        cols = [("id", "s.idx")] + cols
+    return pre, cols
+
+def server_batch_rows(table):
+    return max(1, min(SERVER_BATCH_MAX_ROWS, int(SERVER_BATCH_BYTES / EST_ROW_BYTES.get(table, 500))))
+
+def server_procedure_sql(table):
+    """CREATE PROCEDURE gen_fill_<table>(first_id, cnt, batch, max_user, max_product)."""
+    pre, cols = server_spec(table)
+    inner = ", ".join(["seq.n", f"{S_IDX} AS idx"] + [f"{expr} AS {name}" for name, expr in pre])
+    exprs = " ".join(expr for _, expr in cols)
+    joins = []
+    if re.search(r"\btp\.", exprs):
+        joins.append(f"JOIN gen_text_pool tp ON tp.id = (s.n + text_off) % {TEXT_POOL_ROWS}")
+    if re.search(r"\bbp\.", exprs):
+        joins.append(f"JOIN gen_blob_pool bp ON bp.id = (s.n + blob_off) % {BLOB_POOL_ROWS}")
+    return f"""
+CREATE PROCEDURE gen_fill_{table}(IN first_id BIGINT, IN cnt BIGINT, IN batch INT,
+                                  IN max_user BIGINT, IN max_product BIGINT)
+BEGIN
+  DECLARE done BIGINT DEFAULT 0;
+  DECLARE k INT;
+  DECLARE text_off INT;
+  DECLARE blob_off INT;
+  SET SESSION cte_max_recursion_depth = GREATEST(@@cte_max_recursion_depth, batch);
+  WHILE done < cnt DO
+    SET k = LEAST(batch, cnt - done);
+    SET text_off = FLOOR(RAND() * {TEXT_POOL_ROWS});
+    SET blob_off = FLOOR(RAND() * {BLOB_POOL_ROWS});
+    INSERT INTO `{table}` ({", ".join(name for name, _ in cols)})
+    WITH RECURSIVE seq (n) AS (
+      SELECT 1
+      UNION ALL
+      SELECT n + 1 FROM seq WHERE n < k
+    )
+    SELECT /*+ NO_MERGE(s) */ {", ".join(expr for _, expr in cols)}
+    FROM (SELECT {inner} FROM seq) s{"".join(chr(10) + "    " + j for j in joins)};
+    COMMIT;
+    SET done = done + k;
+  END WHILE;
+END"""
+
+def install_server_side(conn, tables=tuple(TABLE_SQL)):
+    """Пулы gen_text_pool/gen_blob_pool и процедуры gen_fill_<table> (пересоздаются каждый запуск)."""
+    cur = conn.cursor()
+    cur.execute("DROP TABLE IF EXISTS gen_text_pool")
+    cur.execute("CREATE TABLE gen_text_pool (id INT NOT NULL PRIMARY KEY, txt TEXT NOT NULL) "
+                "ENGINE=InnoDB DEFAULT CHARSET=utf8mb4")
+    rows = ((i, rnd_text(TEXT_POOL_ROW, TEXT_POOL_ROW)) for i in range(TEXT_POOL_ROWS))
+    for q, _ in extended_inserts(conn, "gen_text_pool", rows, min(INSERT_MAX_BYTES, packet_limit(conn)), "id,txt"):
+        cur.execute(q)
+    cur.execute("DROP TABLE IF EXISTS gen_blob_pool")
+    if "files" in tables:
+        cur.execute("CREATE TABLE gen_blob_pool (id INT NOT NULL PRIMARY KEY, b64 MEDIUMTEXT NOT NULL) "
+                    "ENGINE=InnoDB DEFAULT CHARSET=ascii")
+        blob = blob_source()
+        # строка пула должна вместить самое дальнее окно: BLOB_ROW_SLACK * 3 байт сдвига + 300 KB
+        row_bytes = (BLOB_ROW_SLACK + 100 * 1024) * 3
+        for i in range(BLOB_POOL_ROWS):
+            cur.execute("INSERT INTO gen_blob_pool (id, b64) VALUES (%s, %s)", (i, blob.window_b64(row_bytes)))
+    for t in tables:
+        cur.execute(f"DROP PROCEDURE IF EXISTS gen_fill_{t}")
+        cur.execute(server_procedure_sql(t))
+    conn.commit()
+
+def drop_server_side(conn, tables=tuple(TABLE_SQL)):
+    cur = conn.cursor()
+    for t in tables:
+        cur.execute(f"DROP PROCEDURE IF EXISTS gen_fill_{t}")
+    cur.execute("DROP TABLE IF EXISTS gen_text_pool")
+    cur.execute("DROP TABLE IF EXISTS gen_blob_pool")
+    conn.commit()
+
+def server_insert(conn, table, count, start_index=0, max_user_id_hint=1000000, max_product_id_hint=1000000, seed=None):
+    """
+    Диапазон индексов start_index+1 .. start_index+count одной процедурой. seed на сервер не
+    передаётся (RAND() там свой), но id те же, так что --resume и догрузка при обрыве работают.
+    """
+    t0 = time.time()
+    cur = conn.cursor()
+    cur.execute(f"CALL gen_fill_{table}(%s, %s, %s, %s, %s)",
+                (start_index, count, server_batch_rows(table), max_user_id_hint, max_product_id_hint))
+    conn.commit()
+    if VERBOSE:
+        elapsed = max(time.time() - t0, 1e-9)
+        print(f"[{table}] server-side {start_index:,}+{count:,} rows in {elapsed:.1f}s ({count / elapsed:.0f} rows/s)")
+    return count
+
+# -----------------------
+# Сравнение insert / load_data
+# -----------------------
+def benchmark(conn, tables=BENCH_TABLES, rows=BENCH_ROWS):
+    """
+    Одни и те же заранее сгенерированные строки грузятся в bench_<table> (схема из TABLE_SQL —
+    исходные таблицы на свежей базе ещё не созданы)
+    через executemany, multi-row INSERT по байтам и LOAD DATA. Генерация в замер не входит,
+    MB — объём TSV.
+    """
+    gens = {t: fn for t, (_, fn) in INSERT_SQL.items()}
+    cur = conn.cursor()
+    results = []
+    for t in tables:
+        n = max(1, rows // 50) if t == "files" else rows
+        data = list(gen_rows(t, n, gens[t]))
+        mb = sum(len(tsv_line(r).encode("utf-8")) for r in data) / 1024**2
+        bench = f"bench_{t}"
+        cur.execute(f"DROP TABLE IF EXISTS `{bench}`")
+        cur.execute(TABLE_SQL[t].replace(f"CREATE TABLE IF NOT EXISTS {t} (", f"CREATE TABLE `{bench}` (", 1))
+        sql = f"INSERT INTO `{bench}` ({TABLE_COLUMNS[t]}) VALUES ({','.join(['%s'] * len(data[0]))})"
+        batch_size = 200 if t == "files" else BATCH_SIZE
+
+        t0 = time.time()
+        for i in range(0, n, batch_size):
+            cur.executemany(sql, data[i:i + batch_size])
+        conn.commit()
+        t_insert = time.time() - t0
+
+        cur.execute(f"TRUNCATE TABLE `{bench}`")
+        t0 = time.time()
+        for q, _ in extended_inserts(conn, bench, data, min(INSERT_MAX_BYTES, packet_limit(conn)), TABLE_COLUMNS[t]):
+            cur.execute(q)
+        conn.commit()
+        t_extended = time.time() - t0
+
+        cur.execute(f"TRUNCATE TABLE `{bench}`")
+        t0 = time.time()
+        it = iter(data)
+        loaded = 0
+        while loaded < n:
+            k, _ = load_data_chunk(conn, bench, TABLE_COLUMNS[t], it)
+            if k == 0:
+                break
+            loaded += k
+        conn.commit()
+        t_load = time.time() - t0
+
+        cur.execute(f"DROP TABLE `{bench}`")
+        results.append((t, n, mb, t_insert, t_extended, t_load))
+        print(f"[bench] {t}: {n} rows, {mb:.1f} MB")
+
+    print(f"\n{'table':12s} {'rows':>8s} {'MB':>8s} | {'executemany rows/s':>18s} {'MB/s':>7s} | "
+          f"{'multi-row rows/s':>16s} {'MB/s':>7s} | {'load_data rows/s':>16s} {'MB/s':>7s}")
+    for t, n, mb, *times in results:
+        t_insert, t_extended, t_load = (max(x, 1e-9) for x in times)
+        print(f"{t:12s} {n:8d} {mb:8.1f} | {n / t_insert:18.0f} {mb / t_insert:7.1f} | "
+              f"{n / t_extended:16.0f} {mb / t_extended:7.1f} | {n / t_load:16.0f} {mb / t_load:7.1f}")
+    return results
+
+# -----------------------
+# Микробенчмарк генераторов строк
+# -----------------------
+GEN_BENCH_ROWS = 2000
+
+@contextmanager
+def text_kernel(kernel):
+    """
+    На время блока gen_* берут rnd_string/rnd_text/rnd_json из kernel (они ищут их в globals
+    модуля). Прежние функции возвращаются в finally — исключение или Ctrl+C посреди замера
+    не оставит модуль на эталонном ядре.
+    """
+    g = globals()
+    saved = {name: g[name] for name in kernel}
+    g.update(kernel)
+    try:
+        yield
+    finally:
+        g.update(saved)
+
+def bench_generators(rows=GEN_BENCH_ROWS):
+    """rows/s каждого gen_* на быстром ядре и на исходном (rnd_*_ref), без обращения к БД."""
+    fast = {"rnd_string": rnd_string, "rnd_text": rnd_text, "rnd_json": rnd_json}
+    ref = {"rnd_string": rnd_string_ref, "rnd_text": rnd_text_ref, "rnd_json": rnd_json_ref}
+    print(f"{'generator':14s} {'ref rows/s':>12s} {'fast rows/s':>12s} {'x':>6s}")
+    for t, (_, gen_fn) in INSERT_SQL.items():
+        n = max(1, rows // 20) if t == "files" else rows
+        timings = []
+        for kernel in (ref, fast):
+            with text_kernel(kernel):
+                t0 = time.perf_counter()
+                for _ in gen_rows(t, n, gen_fn):
+                    pass
+                timings.append(max(time.perf_counter() - t0, 1e-9))
+        print(f"{gen_fn.__name__:14s} {n / timings[0]:12.0f} {n / timings[1]:12.0f} {timings[0] / timings[1]:6.1f}")
+    n = rows * 10
+    t0 = time.perf_counter()
+    for _ in range(n):
+        (datetime.now() - timedelta(days=random.randint(0, 3650))).strftime("%Y-%m-%d %H:%M:%S")
+    t_ref = max(time.perf_counter() - t0, 1e-9)
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fmt_ts(days_ago(3650))
+    t_fast = max(time.perf_counter() - t0, 1e-9)
+    print(f"{'timestamp':14s} {n / t_ref:12.0f} {n / t_fast:12.0f} {t_ref / t_fast:6.1f}")
+
+# -----------------------
+# Параллельная загрузка
+# -----------------------
+# users/products первыми — от них зависят остальные; дальше независимые таблицы
+LOAD_ORDER = ["users", "products", "files", "logs", "audit_trail", "metrics",
+              "orders", "messages", "sessions", "payments"]
+DEPENDS = {
+    "orders": ["users", "products"],
+    "messages": ["users"],
+    "sessions": ["users"],
+    "payments": ["users"],
+}
+
+def max_id(conn, table):
+    cur = conn.cursor()
+    cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM `{table}`")
+    value = int(cur.fetchone()[0])
+    # закрываем транзакцию, иначе следующий SELECT увидит старый снимок
+    conn.commit()
+    return value
+
+def load_table(conn, mode, table, count, start_index=0, seed=None, **hints):
+    gen_fn = INSERT_SQL[table][1]
+    if mode == "server":
+        return server_insert(conn, table, count, start_index=start_index, seed=seed, **hints)
+    if mode == "load_data":
+        return load_data_insert(conn, table, count, gen_fn, start_index=start_index, seed=seed, **hints)
+    return batched_insert(conn, table, count, gen_fn, start_index=start_index, seed=seed, **hints)
+
+def has_rows(conn, table):
+    cur = conn.cursor()
+    cur.execute(f"SELECT EXISTS(SELECT 1 FROM `{table}`)")
+    value = bool(cur.fetchone()[0])
+    conn.commit()
+    return value
+
+def index_of_id(table, value):
+    """Индекс строки по её id (у sessions — hex-префикс)."""
+    return int(value) if table in EXPLICIT_ID else int(value[:SESSION_ID_HEX], 16)
+
+def index_range_sql(table, lo, hi):
+    """Условие на PK для строк с индексами lo+1 .. hi — range scan по первичному ключу."""
+    if table in EXPLICIT_ID:
+        return "id > %s AND id <= %s", (lo, hi)
+    return "id >= %s AND id < %s", (f"{lo + 1:0{SESSION_ID_HEX}x}", f"{hi + 1:0{SESSION_ID_HEX}x}")
+
+def missing_ranges(conn, table, lo, hi):
+    """
+    Каких индексов из lo+1 .. hi нет в таблице: [(start_index, count)]. Воркер пишет диапазон по
+    порядку и коммитит по порядку, так что обычно это готовый префикс + хвост (COUNT(*) совпадает
+    с MAX(id) - lo); если нет — например, диапазоны прошлого запуска легли иначе — делим пополам.
+    """
+    if hi <= lo:
+        return []
+    cond, params = index_range_sql(table, lo, hi)
+    cur = conn.cursor()
+    cur.execute(f"SELECT COUNT(*), MAX(id) FROM `{table}` WHERE {cond}", params)
+    count, top = cur.fetchone()
+    conn.commit()
+    if not count:
+        return [(lo, hi - lo)]
+    top = index_of_id(table, top)
+    if count == top - lo:
+        return [(top, hi - top)] if top < hi else []
+    mid = (lo + hi) // 2
+    return missing_ranges(conn, table, lo, mid) + missing_ranges(conn, table, mid, hi)
+
+def resume_state(conn, table, planned, per_range):
+    """
+    Для --resume: (недогруженные куски [(start_index, count)], первый индекс за ними,
+    сколько строк уже есть). Проверяются все диапазоны до max(план, MAX(id)).
+    """
+    cur = conn.cursor()
+    cur.execute(f"SELECT MAX(id) FROM `{table}`")
+    top = cur.fetchone()[0]
+    conn.commit()
+    upper = max(planned, index_of_id(table, top) if top is not None else 0)
+    pending = []
+    for lo in range(0, upper, per_range):
+        pending += missing_ranges(conn, table, lo, min(lo + per_range, upper))
+    return pending, upper, upper - sum(n for _, n in pending)
+
+_worker = {}
+
+def worker_init(mode, blob_compress=BLOB_COMPRESSIBILITY, fast_load=False):
+    global BLOB_COMPRESSIBILITY
+    # после fork у всех процессов одинаковое состояние random — пересеиваем
+    random.seed()
+    BLOB_COMPRESSIBILITY = blob_compress
+    _worker["mode"] = mode
+    _worker["fast_load"] = fast_load
+    _worker["conn"] = connect()
+    if fast_load:
+        apply_fast_load_session(_worker["conn"])
+
+def worker_reconnect():
+    try:
+        _worker["conn"].close()
+    except Exception:
+        pass
+    _worker["conn"] = connect()
+    if _worker["fast_load"]:
+        apply_fast_load_session(_worker["conn"])
+
+def worker_add_indexes(table):
+    return table, add_indexes(_worker["conn"], table)
+
+def worker_load(table, start_index, count, hints, seed=None):
+    """
+    Загрузить индексы start_index+1 .. start_index+count. При обрыве соединения — переподключиться
+    и догрузить только то, чего в таблице нет: с seed строки те же, дублей и дыр не будет.
+    """
+    t0 = time.time()
+    end = start_index + count
+    pending = [(start_index, count)]
+    inserted = 0
+    for attempt in range(LOAD_RETRIES + 1):
+        try:
+            while pending:
+                start, n = pending[0]
+                inserted += load_table(_worker["conn"], _worker["mode"], table, n, start_index=start, seed=seed, **hints)
+                pending.pop(0)
+            break
+        except (pymysql.OperationalError, pymysql.InterfaceError) as e:
+            if attempt == LOAD_RETRIES or seed is None:
+                raise
+            print(f"[{table}] range {start_index:,}+{count:,}: {e}; reconnecting ({attempt + 1}/{LOAD_RETRIES})")
+            time.sleep(min(30, 2 ** attempt))
+            worker_reconnect()
+            pending = missing_ranges(_worker["conn"], table, start_index, end)
+            inserted = count - sum(n for _, n in pending)
+    return table, start_index, inserted, time.time() - t0
+
+def table_sizes(conn):
+    """{table: data_length + index_length} по information_schema.TABLES текущей базы."""
+    cur = conn.cursor()
+    cur.execute("SELECT table_name, data_length, index_length FROM information_schema.TABLES "
+                "WHERE table_schema = DATABASE()")
+    sizes = {name: int(data or 0) + int(index or 0) for name, data, index in cur.fetchall()}
+    conn.commit()
+    return sizes
+
+def needed_rows(sizes, table, target_bytes, rows):
+    """
+    Сколько всего строк нужно таблице, чтобы занять свою долю SPLIT, по фактическому байт/строку.
+    rows — точный счёт вставленных строк из планировщика: table_rows в information_schema
+    у InnoDB — выборочная оценка, часто мимо на 20–50%, и план прыгал бы вместе с ней.
+    """
+    size = sizes.get(table, 0)
+    if rows < FEEDBACK_MIN_ROWS or size <= 0:
+        return None
+    return int(target_bytes * SPLIT[table] / (size / rows))
+
+def parallel_load(conn, mode, rows_plan, workers=WORKERS, fast_load=False, target_bytes=None, seed=None, resume=False):
+    """
+    Раздать диапазоны всех таблиц пулу процессов с учётом DEPENDS. При fast_load догруженной
+    таблице тут же ставится задача на ALTER TABLE ... ADD INDEX. Возвращает ({table: rows},
+    {table: {"load": сумма секунд по диапазонам, "index": секунд на индексы}}).
+
+    Если задан target_bytes — обратная связь по реальному размеру: раз в SIZE_POLL_SECONDS и
+    перед тем как объявить таблицу догруженной, читаем information_schema.TABLES и пересчитываем
+    план строк таблицы под её долю SPLIT; как только сумма достигла target_bytes, новые диапазоны
+    больше не выдаются. Поэтому диапазоны выдаются по мере освобождения воркеров, а не все сразу.
+
+    resume — сначала выдаются недогруженные куски прошлого запуска (resume_state), потом новые
+    диапазоны с первого индекса за ними; уже готовые таблицы сразу считаются догруженными.
+    """
+    plan = dict(rows_plan)
+    per_range = {t: max(1, int(TASK_BYTES / EST_ROW_BYTES.get(t, 500))) for t in LOAD_ORDER}
+    next_start = {t: 0 for t in LOAD_ORDER}
+    in_flight = {t: 0 for t in LOAD_ORDER}
+    inserted = {t: 0 for t in LOAD_ORDER}
+    pending = {t: [] for t in LOAD_ORDER}
+    timings = {t: {"load": 0.0, "index": 0.0} for t in LOAD_ORDER}
+    if resume:
+        for t in LOAD_ORDER:
+            pending[t], next_start[t], inserted[t] = resume_state(conn, t, plan.get(t, 0), per_range[t])
+            print(f"[resume] {t}: {inserted[t]:,} rows present, {sum(n for _, n in pending[t]):,} missing "
+                  f"in {len(pending[t])} ranges, new rows from index {next_start[t]:,}")
+    hints = {}
+    finished = set()
+    running = set()
+    stop = False
+    t0 = time.time()
+    last_poll = t0
+
+    def hints_for(table):
+        deps = DEPENDS.get(table, [])
+        h = {}
+        if "users" in deps:
+            h["max_user_id_hint"] = max(1, max_id(conn, "users"))
+        if "products" in deps:
+            h["max_product_id_hint"] = max(1, max_id(conn, "products"))
+        return h
+
+    def next_range():
+        for t in LOAD_ORDER:
+            if t in finished or any(d not in finished for d in DEPENDS.get(t, [])):
+                continue
+            if pending[t]:
+                return (t,) + pending[t].pop(0)
+            if next_start[t] < plan.get(t, 0):
+                start = next_start[t]
+                return t, start, min(per_range[t], plan[t] - start)
+        return None
+
+    def adjust(sizes, table, only_grow=False):
+        need = needed_rows(sizes, table, target_bytes, inserted[table])
+        if need is None:
+            return False
+        need = max(need, next_start[table])
+        if need == plan[table] or (only_grow and need <= plan[table]):
+            return False
+        if abs(need - plan[table]) > 0.02 * max(1, plan[table]):
+            print(f"[size] {table}: {sizes[table] / 1024**2:.0f} MB at {inserted[table]:,} rows, "
+                  f"plan {plan[table]:,} -> {need:,} rows")
+        plan[table] = need
+        return True
+
+    if plan.get("files", 0) > next_start["files"] or pending["files"]:
+        # буфер files строится один раз здесь: форкнутые воркеры делят его copy-on-write,
+        # а не собирают каждый свои ~150 MB (буфер + base64) — иначе это ×WORKERS памяти
+        blob_source()
+    fork = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=workers, initializer=worker_init, mp_context=fork,
+                             initargs=(mode, BLOB_COMPRESSIBILITY, fast_load)) as ex:
+        def fill():
+            while not stop and len(running) < workers:
+                task = next_range()
+                if task is None:
+                    return
+                table, start, count = task
+                if table not in hints:
+                    hints[table] = hints_for(table)
+                    print(f"[sched] {table}: ~{plan[table]:,} rows, ranges of {per_range[table]:,}")
+                running.add(ex.submit(worker_load, table, start, count, hints[table], seed))
+                next_start[table] = max(next_start[table], start + count)
+                in_flight[table] += 1
+
+        def check_finished():
+            sizes = None
+            for t in LOAD_ORDER:
+                if t in finished or in_flight[t] or any(d not in finished for d in DEPENDS.get(t, [])):
+                    continue
+                # закрываем и так и не начатые таблицы: с пустым планом (или уже догруженные при
+                # --resume) — сразу, после stop — все; иначе при --fast_load они и зависящие от них
+                # остались бы без вторичных индексов
+                if not stop and (pending[t] or next_start[t] < plan.get(t, 0)):
+                    continue
+                if target_bytes and not stop:
+                    # прежде чем закрыть таблицу — не нужно ли ей ещё строк до своей доли
+                    sizes = sizes or table_sizes(conn)
+                    if adjust(sizes, t, only_grow=True) and next_start[t] < plan[t]:
+                        continue
+                finished.add(t)
+                print(f"[sched] {t} finished: {inserted[t]:,} rows, {time.time() - t0:.1f}s since start")
+                if fast_load:
+                    running.add(ex.submit(worker_add_indexes, t))
+
+        check_finished()
+        fill()
+        while running:
+            done, _ = wait(running, timeout=SIZE_POLL_SECONDS if target_bytes else None,
+                           return_when=FIRST_COMPLETED)
+            for fut in done:
+                running.discard(fut)
+                result = fut.result()
+                if len(result) == 2:
+                    table, elapsed = result
+                    timings[table]["index"] = elapsed
+                    print(f"[sched] {table} indexes built in {elapsed:.1f}s")
+                    continue
+                table, start, n, elapsed = result
+                inserted[table] += n
+                timings[table]["load"] += elapsed
+                in_flight[table] -= 1
+            if target_bytes and not stop and time.time() - last_poll >= SIZE_POLL_SECONDS:
+                last_poll = time.time()
+                sizes = table_sizes(conn)
+                total = sum(sizes.get(t, 0) for t in SPLIT)
+                print(f"[size] total {total / 1024**3:.2f} / {target_bytes / 1024**3:.2f} GB")
+                if total >= target_bytes:
+                    stop = True
+                    print("[size] target reached, no new ranges")
+                else:
+                    for t in LOAD_ORDER:
+                        if t in hints and t not in finished:
+                            adjust(sizes, t)
+            check_finished()
+            fill()
+    # страховка: незакрытая таблица при --fast_load осталась бы только с PK
+    for t in LOAD_ORDER:
+        if t not in finished:
+            print(f"[sched] WARNING: {t} was never finished ({inserted[t]:,} rows)"
+                  + (", adding its indexes now" if fast_load else ""))
+            if fast_load:
+                timings[t]["index"] = add_indexes(conn, t)
+    return inserted, timings
+
+def probe_index_cost(conn, rows=FAST_LOAD_PROBE_ROWS):
+    """
+    Во сколько раз вставка в таблицу со всеми индексами медленнее, чем только с PK:
+    одни и те же строки multi-row INSERT'ами в probe_<t>_idx и probe_<t>_pk. {table: ratio}.
+    На маленьких таблицах индексы помещаются в buffer pool, так что оценка скорее занижена.
+    """
+    cur = conn.cursor()
+    max_bytes = min(INSERT_MAX_BYTES, packet_limit(conn))
+    ratios = {}
+    for t, ddl in TABLE_SQL.items():
+        n = max(1, rows // 50) if t == "files" else rows
+        data = list(gen_rows(t, n, INSERT_SQL[t][1]))
+        elapsed = {}
+        for kind, sql in (("idx", ddl), ("pk", split_table_sql(ddl)[0])):
+            probe = f"probe_{t}_{kind}"
+            cur.execute(f"DROP TABLE IF EXISTS `{probe}`")
+            cur.execute(sql.replace(f"CREATE TABLE IF NOT EXISTS {t} (", f"CREATE TABLE `{probe}` (", 1))
+            t0 = time.time()
+            for q, _ in extended_inserts(conn, probe, data, max_bytes, TABLE_COLUMNS[t]):
+                cur.execute(q)
+            conn.commit()
+            elapsed[kind] = max(time.time() - t0, 1e-9)
+            cur.execute(f"DROP TABLE `{probe}`")
+        ratios[t] = elapsed["idx"] / elapsed["pk"]
+    return ratios
+
+def report_fast_load(timings, ratios):
+    print(f"\n{'table':12s} {'load s':>9s} {'index s':>9s} {'idx/pk':>7s} {'est. with idx s':>16s} {'saved s':>9s}")
+    total_saved = 0.0
+    for t in LOAD_ORDER:
+        load, index = timings[t]["load"], timings[t]["index"]
+        ratio = ratios.get(t, 1.0)
+        with_idx = load * ratio
+        saved = with_idx - (load + index)
+        total_saved += saved
+        print(f"{t:12s} {load:9.1f} {index:9.1f} {ratio:7.2f} {with_idx:16.1f} {saved:9.1f}")
+    # времена — суммы по всем воркерам, т.е. «процессорные», а не настенные
+    print(f"Estimated time saved by --fast_load: {total_saved:.1f}s of worker time")
+
+def parse_args():
+    ap = argparse.ArgumentParser(description="Generate heavy MySQL tables")
+    ap.add_argument("--mode", choices=["insert", "load_data"], default=MODE)
+    ap.add_argument("--server_side", "--server-side", action="store_true",
+                    help="generate rows inside MySQL with per-table recursive-CTE procedures")
+    ap.add_argument("--bench", action="store_true", help="compare insert vs load_data and exit")
+    ap.add_argument("--bench_rows", type=int, default=BENCH_ROWS)
+    ap.add_argument("--workers", type=int, default=WORKERS)
+    ap.add_argument("--bench_gen", action="store_true", help="micro-benchmark row generators and exit")
+    ap.add_argument("--blob_compress", type=float, default=BLOB_COMPRESSIBILITY)
+    ap.add_argument("--fast_load", action="store_true", help="PK-only tables, bulk session settings, indexes after load")
+    ap.add_argument("--no_feedback", action="store_true", help="load exactly the estimated rows, ignore real table sizes")
+    ap.add_argument("--resume", action="store_true", help="continue an interrupted run: fill only the missing id ranges")
+    ap.add_argument("--seed", type=int, default=SEED, help="row seed; must match the run being resumed")
+    return ap.parse_args()
+
 # -----------------------
 # Основной поток
 # -----------------------
 def main():
-    print(f"Target ~= {TARGET_GB} GB; mode={MODE}; batch_size={BATCH_SIZE}")
+    global BLOB_COMPRESSIBILITY
+    args = parse_args()
+    mode = "server" if args.server_side else args.mode
+    BLOB_COMPRESSIBILITY = args.blob_compress
+    if args.bench_gen:
+        bench_generators()
+        return
+    if args.bench:
+        conn = connect()
+        try:
+            benchmark(conn, rows=args.bench_rows)
+        finally:
+            conn.close()
+        return
+
+    print(f"Target ~= {TARGET_GB} GB; mode={mode}; workers={args.workers}")
     rows_plan = estimate_rows_per_table(TARGET_GB)
     print("Estimated rows per table (approx):")
     for k,v in rows_plan.items():
         print(f"  {k:12s}: {v:,}")
 
     conn = connect()
+    old_flush = None
     try:
-        create_tables(conn)
-        # We will insert tables in an order so that orders/messages refer to users/products counts
-        # Keep track of max id hints (we assume autoincrement starts at 1)
-        max_ids = {}
-
-        # users
-        t = "users"
-        cnt = rows_plan[t]
-        print(f"\nInserting {cnt:,} rows into {t} ...")
-        inserted = batched_insert(conn, t, cnt, gen_user)
-        max_ids["users"] = inserted
-
-        # products
-        t = "products"
-        cnt = rows_plan[t]
-        print(f"\nInserting {cnt:,} rows into {t} ...")
-        inserted = batched_insert(conn, t, cnt, gen_product)
-        max_ids["products"] = inserted
-
-        # orders (referencing users/products)
-        t = "orders"
-        cnt = rows_plan[t]
-        print(f"\nInserting {cnt:,} rows into {t} ...")
-        inserted = batched_insert(conn, t, cnt, gen_order, max_user_id_hint=max_ids["users"], max_product_id_hint=max_ids["products"])
-        max_ids["orders"] = inserted
-
-        # logs
-        t = "logs"
-        cnt = rows_plan[t]
-        print(f"\nInserting {cnt:,} rows into {t} ...")
-        inserted = batched_insert(conn, t, cnt, gen_log)
-        max_ids["logs"] = inserted
-
-        # audit_trail
-        t = "audit_trail"
-        cnt = rows_plan[t]
-        print(f"\nInserting {cnt:,} rows into {t} ...")
-        inserted = batched_insert(conn, t, cnt, gen_audit)
-        max_ids["audit_trail"] = inserted
-
-        # files (heavy - base64 content)
-        t = "files"
-        cnt = rows_plan[t]
-        # reduce batch for large rows to avoid memory spikes
-        file_batch_size = max(1, min(BATCH_SIZE, 200))
-        print(f"\nInserting {cnt:,} rows into {t} (large blobs) ...")
-        inserted = batched_insert(conn, t, cnt, gen_file, batch_size=file_batch_size)
-        max_ids["files"] = inserted
-
-        # metrics
-        t = "metrics"
-        cnt = rows_plan[t]
-        print(f"\nInserting {cnt:,} rows into {t} ...")
-        inserted = batched_insert(conn, t, cnt, gen_metric, batch_size=2000)
-        max_ids["metrics"] = inserted
-
-        # messages
-        t = "messages"
-        cnt = rows_plan[t]
-        print(f"\nInserting {cnt:,} rows into {t} ...")
-        inserted = batched_insert(conn, t, cnt, gen_message, max_user_id_hint=max_ids["users"])
-        max_ids["messages"] = inserted
-
-        # sessions
-        t = "sessions"
-        cnt = rows_plan[t]
-        print(f"\nInserting {cnt:,} rows into {t} ...")
-        inserted = batched_insert(conn, t, cnt, gen_session, max_user_id_hint=max_ids["users"])
-        max_ids["sessions"] = inserted
-
-        # payments
-        t = "payments"
-        cnt = rows_plan[t]
-        print(f"\nInserting {cnt:,} rows into {t} ...")
-        inserted = batched_insert(conn, t, cnt, gen_payment, max_user_id_hint=max_ids["users"])
-        max_ids["payments"] = inserted
-
+        ratios = {}
+        if args.fast_load:
+            print("Probing index maintenance cost ...")
+            ratios = probe_index_cost(conn)
+            old_flush = set_global_flush(conn, 2)
+        create_tables(conn, fast_load=args.fast_load)
+        if mode == "server":
+            print("Installing server-side pools and gen_fill_* procedures ...")
+            install_server_side(conn)
+        if not args.resume:
+            busy = [t for t in LOAD_ORDER if has_rows(conn, t)]
+            if busy:
+                raise SystemExit(f"Tables already contain rows: {', '.join(busy)}. "
+                                 f"Use --resume to continue, or drop them.")
+        t0 = time.time()
+        feedback = SIZE_FEEDBACK and not args.no_feedback
+        if feedback:
+            try:
+                # иначе MySQL 8 отдаёт размеры из кэша статистики (по умолчанию на сутки)
+                conn.cursor().execute("SET SESSION information_schema_stats_expiry = 0")
+            except pymysql.MySQLError:
+                pass
+        inserted, timings = parallel_load(conn, mode, rows_plan, workers=max(1, args.workers),
+                                          fast_load=args.fast_load,
+                                          target_bytes=TARGET_GB * 1024**3 if feedback else None,
+                                          seed=args.seed, resume=args.resume)
+        if mode == "server":
+            drop_server_side(conn)
+        print(f"\nLoaded {sum(inserted.values()):,} rows into {len(inserted)} tables in {time.time() - t0:.1f}s "
+              f"with {args.workers} workers")
+        if args.fast_load:
+            report_fast_load(timings, ratios)
+        if feedback:
+            sizes = table_sizes(conn)
+            print(f"\n{'table':12s} {'target MB':>10s} {'actual MB':>10s} {'rows':>12s}")
+            for t in LOAD_ORDER:
+                print(f"{t:12s} {TARGET_GB * 1024 * SPLIT[t]:10.0f} {sizes.get(t, 0) / 1024**2:10.0f} {inserted[t]:12,}")
         print("\nGeneration finished. Verify disk usage and consider running OPTIMIZE TABLE if needed.")
     finally:
+        if old_flush is not None:
+            set_global_flush(conn, old_flush)
         conn.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,1127 @@
+#!/usr/bin/env python3
+"""
+load_test_mysql.py
+Симулятор продовой нагрузки для MySQL поверх схемы generate_mysql.py (users, products, orders,
+logs, audit_trail, metrics, messages, ...). То же устройство, что у dbas/postgres/py/load_test_prod.py:
+взвешенная смесь операций, клиенты-потоки или корутины, ограничение скорости с профилями,
+поинтервальные p50/p95/p99 по гистограмме задержек, разбивка на фазы, экспорт в CSV/JSON lines.
+
+Зависимости:
+    pip install pymysql            # --engine thread
+    pip install aiomysql           # --engine async
+
+Скрипт самостоятельный: статистика, отчёты, профили скорости, KeyIndex и OpRunner — копии
+из load_test_prod.py (без того, что нужно только ему: --processes, --write_batch, --workload).
+Меняя их, правьте оба файла.
+
+Таблицы и данные создаёт generate_mysql.py — этот скрипт схему не трогает, только проверяет,
+что нужные таблицы есть.
+
+Операции (--ratios, по умолчанию DEFAULT_RATIO):
+  point_lookup — SELECT по первичному ключу из users/products/orders/messages/payments;
+    id выбирается по --key_dist из границ min/max(id), которые держатся в памяти
+    (обновляются раз в --key_refresh сек);
+  range_created — окно RANGE_WINDOW_SEC по created_at из logs/audit_trail (idx_created_at),
+    ORDER BY created_at LIMIT 100;
+  fulltext — MATCH(subject, body) AGAINST (...) по messages (ft_subject_body); слова для поиска
+    при старте берутся из body FT_SAMPLE_ROWS случайных сообщений;
+  json_path — JSON_EXTRACT(profile, '$.kN[.kM]') по окну из JSON_SCAN_ROWS id users:
+    путь без функционального индекса, поэтому окно по PK ограничивает число разобранных JSON;
+  insert_log — одна строка в logs, COMMIT;
+  insert_metrics — --batch_insert строк в metrics одним multi-row INSERT, COMMIT (в ops — одна операция).
+  Пример: --ratios point_lookup=0.5,fulltext=0.2,insert_log=0.3
+
+--engine thread|async — thread: поток на клиента, общий пул pymysql-соединений (ConnectionPool);
+  async: одна asyncio-петля и --concurrency корутин поверх aiomysql.create_pool.
+--pool_size размер пула (0 = concurrency + 2). --connect_per_op — без пула, новое соединение
+  на каждую операцию (в отчёте connects/s и среднее время connect).
+
+--ops_per_sec — общая целевая скорость, делится на клиентов; --profile const|ramp|steps|spike
+  меняет её по времени так же, как в load_test_prod.py (--profile_start, --step_size,
+  --step_hold, --spike_every, --spike_len, --spike_rate).
+--key_dist uniform|zipfian|hotspot, --zipf_theta, --hot_fraction, --hot_ops — распределение id
+  для point_lookup (горячие — самые свежие id).
+--metrics_out FILE — поинтервальные метрики в *.csv или JSON lines, интервал --report_interval.
+
+Фазы операции: acquire (ожидание пула или connect), execute (запросы вместе с fetch) и commit;
+  остаток — клиентская сторона.
+
+python3 load_test_mysql.py --concurrency 16 --ops_per_sec 2000 --duration 300
+python3 load_test_mysql.py --engine async --concurrency 500 --ops_per_sec 5000 --duration 600 --metrics_out mysql.csv
+"""
+
+import argparse
+import asyncio
+import bisect
+import csv
+import json
+import multiprocessing
+import random
+import re
+import signal
+import string
+import sys
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from collections import defaultdict
+from datetime import datetime
+
+try:
+    import pymysql
+except Exception:
+    print("Please install pymysql: pip install pymysql")
+    raise
+
+try:
+    # aiomysql нужен только для --engine async
+    import aiomysql
+except ImportError:
+    aiomysql = None
+
+
+# Настройки подключения по умолчанию — те же, что в generate_mysql.py
+DB = {
+    "host": "localhost",
+    "port": 3306,
+    "user": "gen_user",
+    "password": "Passwd123",
+    "database": "default_db",
+}
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_OPS_PER_SEC = 200
+DEFAULT_DURATION = 300
+DEFAULT_BATCH_INSERT = 50
+POOL_WAIT_STEP = 0.5        # сек: как часто ждущий getconn() перепроверяет STOP
+DEFAULT_RATIO = {
+    'point_lookup': 0.35,
+    'range_created': 0.15,
+    'fulltext': 0.10,
+    'json_path': 0.10,
+    'insert_log': 0.20,
+    'insert_metrics': 0.10,
+}
+ENGINES = ('thread', 'async')
+PROFILES = ('const', 'ramp', 'steps', 'spike')
+KEY_DISTS = ('uniform', 'zipfian', 'hotspot')
+
+POINT_TABLES = ['users', 'products', 'orders', 'messages', 'payments']
+# таблица с idx_created_at -> за сколько дней назад generate_mysql.py раскидывает created_at
+RANGE_TABLES = {'logs': 365, 'audit_trail': 3650}
+RANGE_WINDOW_SEC = 600
+JSON_SCAN_ROWS = 100
+# profile = rnd_json(6, depth=2): ключи k0..k5, вложенные объекты — k0..k2
+JSON_PATHS = [f"$.k{i}" for i in range(6)] + [f"$.k{i}.k{j}" for i in range(6) for j in range(3)]
+FT_SAMPLE_ROWS = 20
+FT_MIN_WORD = 3             # innodb_ft_min_token_size по умолчанию
+REQUIRED_TABLES = sorted(set(POINT_TABLES) | set(RANGE_TABLES) | {'metrics'})
+
+LEVELS = ["DEBUG", "INFO", "WARN", "ERROR", "CRITICAL"]
+SERVICES = ["auth", "payments", "worker", "api", "cron", "scheduler", "ui", "db"]
+METRIC_NAMES = ["cpu.usage", "mem.usage", "disk.io", "http.requests", "db.connections", "latency"]
+
+OP_SQL = {
+    'bounds': "SELECT MIN(id), MAX(id) FROM `{tbl}`",
+    'point_lookup': "SELECT * FROM `{tbl}` WHERE id = %s",
+    'range_created': "SELECT id, created_at FROM `{tbl}` WHERE created_at BETWEEN %s AND %s ORDER BY created_at LIMIT 100",
+    'fulltext': "SELECT id, subject FROM messages WHERE MATCH(subject, body) AGAINST (%s IN NATURAL LANGUAGE MODE) LIMIT 20",
+    'json_path': "SELECT id, JSON_UNQUOTE(JSON_EXTRACT(profile, %s)) FROM users "
+                 "WHERE id BETWEEN %s AND %s AND JSON_EXTRACT(profile, %s) IS NOT NULL",
+    'insert_log': "INSERT INTO logs (level,service,host,pid,thread,message,context,created_at) "
+                  "VALUES (%s,%s,%s,%s,%s,%s,%s,%s)",
+    'insert_metrics': "INSERT INTO metrics (metric_name,ts,value,tags,sample_rate,created_at) VALUES ",
+    'sample_body': "SELECT body FROM messages WHERE id >= %s ORDER BY id LIMIT 1",
+}
+METRICS_ROW = "(%s,%s,%s,%s,%s,%s)"
+
+STOP = threading.Event()
+
+# Границы корзин гистограммы задержек (мс): геометрическая сетка 0.05 мс .. ~60 с с шагом 15%,
+# как в load_test_prod.py.
+HIST_BOUNDS_MS = []
+_b = 0.05
+while _b < 60000:
+    HIST_BOUNDS_MS.append(_b)
+    _b *= 1.15
+del _b
+REPORT_EVERY = 5
+PHASES = ('execute', 'commit')
+
+# ключ из --ratios -> метод DBWorker/AsyncDBWorker
+OP_METHODS = {
+    'point_lookup': 'op_point_lookup',
+    'range_created': 'op_range_created',
+    'fulltext': 'op_fulltext',
+    'json_path': 'op_json_path',
+    'insert_log': 'op_insert_log',
+    'insert_metrics': 'op_insert_metrics',
+}
+
+
+def now_ts():
+    return datetime.utcnow().isoformat()
+
+
+def rand_string(n=12):
+    return ''.join(random.choices(string.ascii_letters + string.digits, k=n))
+
+
+def rand_words(n):
+    return ' '.join(''.join(random.choices(string.ascii_lowercase, k=random.randint(3, 12))) for _ in range(n))
+
+
+def ts_ago(max_seconds):
+    return datetime.fromtimestamp(time.time() - random.randint(0, max_seconds)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def log_params():
+    return (random.choice(LEVELS), random.choice(SERVICES), f"host{random.randint(1, 200)}",
+            random.randint(100, 99999), rand_string(12), rand_words(random.randint(20, 200)),
+            json.dumps({f"k{i}": rand_string(10) for i in range(6)}), ts_ago(60))
+
+
+def metric_params():
+    ts = ts_ago(60)
+    return (random.choice(METRIC_NAMES), ts, random.random() * 1000.0,
+            json.dumps({f"k{i}": rand_string(8) for i in range(5)}), random.choice([1, 5, 10, 60]), ts)
+
+
+def range_params():
+    t = random.choice(list(RANGE_TABLES))
+    end = time.time() - random.randint(0, RANGE_TABLES[t] * 86400)
+    fmt = "%Y-%m-%d %H:%M:%S"
+    return t, (datetime.fromtimestamp(end - RANGE_WINDOW_SEC).strftime(fmt), datetime.fromtimestamp(end).strftime(fmt))
+
+
+def hist_percentile(hist, q):
+    """Верхняя граница корзины (мс), в которую попадает квантиль q (0..1)."""
+    total = sum(hist)
+    if total <= 0:
+        return 0.0
+    rank = q * total
+    acc = 0
+    for i, c in enumerate(hist):
+        acc += c
+        if acc >= rank:
+            return HIST_BOUNDS_MS[i] if i < len(HIST_BOUNDS_MS) else float('inf')
+    return float('inf')
+
+
+class SafeStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = defaultdict(int)
+        self.by_type = defaultdict(int)
+        self.errors_by_type = defaultdict(int)
+        self.timers = defaultdict(float)
+        self.time_total = 0.0
+        self.hist = [0] * (len(HIST_BOUNDS_MS) + 1)
+
+    def incr(self, key, n=1):
+        with self.lock:
+            self.data[key] += n
+
+    def add_time(self, t):
+        idx = bisect.bisect_left(HIST_BOUNDS_MS, t * 1000.0)
+        with self.lock:
+            self.time_total += t
+            self.hist[idx] += 1
+
+    def incr_type(self, opname, n=1):
+        with self.lock:
+            self.by_type[opname] += n
+
+    def incr_error(self, opname):
+        with self.lock:
+            self.data['errors'] += 1
+            self.errors_by_type[opname] += 1
+
+    def add_timer(self, name, t):
+        """Суммарное время фазы (например, ожидание пула) + число замеров в data[name + '_count']."""
+        with self.lock:
+            self.timers[name] += t
+            self.data[name + '_count'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            # shallow copy for reporting
+            return dict(self.data), dict(self.by_type), float(self.time_total)
+
+    def hist_snapshot(self):
+        with self.lock:
+            return list(self.hist)
+
+    def extra_snapshot(self):
+        with self.lock:
+            return dict(self.errors_by_type), dict(self.timers)
+
+
+class IntervalReporter:
+    """Считает метрики за интервал между двумя вызовами tick() по накопительной SafeStats."""
+
+    def __init__(self, stats, start_time, rate=None):
+        self.stats = stats
+        self.rate = rate
+        self.start_time = start_time
+        self.prev_time = start_time
+        self.prev_data, self.prev_by_type, self.prev_time_total = {}, {}, 0.0
+        self.prev_errors, self.prev_timers = {}, {}
+        self.prev_hist = stats.hist_snapshot()
+
+    def tick(self, now):
+        data, by_type, time_total = self.stats.snapshot()
+        errors_by_type, timers = self.stats.extra_snapshot()
+        hist = self.stats.hist_snapshot()
+        interval_hist = [c - p for c, p in zip(hist, self.prev_hist)]
+        dt = max(1e-9, now - self.prev_time)
+        ops = data.get('ops', 0) - self.prev_data.get('ops', 0)
+        calls = sum(interval_hist)
+        acquires = data.get('pool_wait_count', 0) - self.prev_data.get('pool_wait_count', 0)
+        pool_wait = timers.get('pool_wait', 0.0) - self.prev_timers.get('pool_wait', 0.0)
+        connects = data.get('connect_count', 0) - self.prev_data.get('connect_count', 0)
+        connect = timers.get('connect', 0.0) - self.prev_timers.get('connect', 0.0)
+        phase = {name: timers.get(name, 0.0) - self.prev_timers.get(name, 0.0) for name in PHASES}
+        record = {
+            'ts': now_ts(),
+            'elapsed': round(now - self.start_time, 3),
+            'interval': round(dt, 3),
+            'ops': ops,
+            'ops_per_sec': round(ops / dt, 2),
+            'target_ops_per_sec': round(self.rate.total(), 2) if self.rate is not None else 0.0,
+            'total_ops': data.get('ops', 0),
+            'errors': data.get('errors', 0) - self.prev_data.get('errors', 0),
+            'total_errors': data.get('errors', 0),
+            'avg_latency_ms': round((time_total - self.prev_time_total) / calls * 1000.0, 3) if calls else 0.0,
+            'p50_ms': round(hist_percentile(interval_hist, 0.50), 3),
+            'p95_ms': round(hist_percentile(interval_hist, 0.95), 3),
+            'p99_ms': round(hist_percentile(interval_hist, 0.99), 3),
+            'pool_wait_ms_avg': round(pool_wait / acquires * 1000.0, 3) if acquires else 0.0,
+            'connects_per_sec': round(connects / dt, 2),
+            'connect_ms_avg': round(connect / connects * 1000.0, 3) if connects else 0.0,
+            # среднее время фазы на одну операцию: в сумме с client_ms даёт avg_latency_ms
+            'acquire_ms_per_op': round((pool_wait + connect) / calls * 1000.0, 3) if calls else 0.0,
+            'execute_ms_per_op': round(phase['execute'] / calls * 1000.0, 3) if calls else 0.0,
+            'commit_ms_per_op': round(phase['commit'] / calls * 1000.0, 3) if calls else 0.0,
+            'ops_by_type': {k: v - self.prev_by_type.get(k, 0) for k, v in by_type.items()},
+            'errors_by_type': {k: v - self.prev_errors.get(k, 0) for k, v in errors_by_type.items()},
+        }
+        record['client_ms_per_op'] = round(max(0.0, record['avg_latency_ms'] - record['acquire_ms_per_op']
+                                               - record['execute_ms_per_op'] - record['commit_ms_per_op']), 3)
+        self.prev_time = now
+        self.prev_data, self.prev_by_type, self.prev_time_total = data, by_type, time_total
+        self.prev_errors, self.prev_timers = errors_by_type, timers
+        self.prev_hist = hist
+        return record
+
+
+class MetricsWriter:
+    """Пишет записи IntervalReporter в CSV (по расширению .csv) или JSON lines."""
+
+    BASE_FIELDS = ['ts', 'elapsed', 'interval', 'ops', 'ops_per_sec', 'target_ops_per_sec', 'total_ops', 'errors', 'total_errors',
+                   'avg_latency_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'pool_wait_ms_avg',
+                   'connects_per_sec', 'connect_ms_avg', 'acquire_ms_per_op', 'execute_ms_per_op',
+                   'commit_ms_per_op', 'client_ms_per_op']
+
+    def __init__(self, path, op_names=None):
+        self.path = path
+        # метка колонки -> имя операции в статистике
+        self.op_names = op_names or OP_METHODS
+        self.f = open(path, 'a', newline='')
+        self.csv = None
+        if path.lower().endswith('.csv'):
+            fields = self.BASE_FIELDS + [f"ops_{k}" for k in self.op_names] + [f"errors_{k}" for k in self.op_names]
+            self.csv = csv.DictWriter(self.f, fieldnames=fields)
+            if self.f.tell() == 0:
+                self.csv.writeheader()
+
+    def write(self, record):
+        if self.csv is not None:
+            row = {k: record[k] for k in self.BASE_FIELDS}
+            for k, method in self.op_names.items():
+                row[f"ops_{k}"] = record['ops_by_type'].get(method, 0)
+                row[f"errors_{k}"] = record['errors_by_type'].get(method, 0)
+            self.csv.writerow(row)
+        else:
+            self.f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class RateTarget:
+    """
+    Общая целевая скорость (ops/s на все процессы и всех клиентов). Лежит в общей памяти,
+    чтобы координатор мог менять её по профилю нагрузки на лету, а клиенты — читать без блокировок.
+    """
+
+    def __init__(self, total, clients):
+        self.value = multiprocessing.RawValue('d', float(total))
+        self.clients = max(1, clients)
+
+    def set(self, total):
+        self.value.value = float(total)
+
+    def total(self):
+        return self.value.value
+
+    def per_client(self):
+        return self.value.value / self.clients
+
+
+class LoadProfile:
+    """Целевая скорость как функция от времени с начала прогона (для ramp/steps/spike/const)."""
+
+    def __init__(self, kind, target, duration, start=0.0, step_size=0.0, step_hold=30.0,
+                 spike_every=60.0, spike_len=10.0, spike_rate=0.0):
+        self.kind = kind
+        self.target = float(target)
+        self.duration = duration
+        self.start = start or self.target / 10.0
+        self.step_size = step_size or self.target / 10.0 or self.start
+        self.step_hold = max(1.0, step_hold)
+        self.spike_every = max(1.0, spike_every)
+        self.spike_len = spike_len
+        self.spike_rate = spike_rate or self.target * 3.0
+
+    def rate(self, elapsed):
+        if self.kind == 'ramp':
+            if self.duration <= 0:
+                return self.target
+            frac = min(1.0, elapsed / self.duration)
+            return max(1.0, self.start + (self.target - self.start) * frac)
+        if self.kind == 'steps':
+            return max(1.0, min(self.target, self.start + int(elapsed // self.step_hold) * self.step_size))
+        if self.kind == 'spike':
+            return self.spike_rate if (elapsed % self.spike_every) < self.spike_len else self.target
+        return self.target
+
+
+class KeyIndex:
+    """
+    Границы id по таблицам в памяти процесса. Даёт id для point-операций по выбранному
+    распределению, чтобы они шли по первичному ключу, а не через ORDER BY random().
+    """
+
+    def __init__(self, table_names, dist='uniform', zipf_theta=0.99, hot_fraction=0.2, hot_ops=0.8, refresh_every=10.0):
+        if dist not in KEY_DISTS:
+            raise ValueError(f"Unknown key distribution: {dist}")
+        self.lock = threading.Lock()
+        self.dist = dist
+        self.zipf_theta = zipf_theta
+        self.hot_fraction = min(1.0, max(0.0, hot_fraction))
+        self.hot_ops = min(1.0, max(0.0, hot_ops))
+        self.refresh_every = refresh_every
+        self.bounds = {t: (1, 0) for t in table_names}
+        self.refreshed_at = {t: 0.0 for t in table_names}
+
+    def stale(self, table):
+        return time.time() - self.refreshed_at[table] >= self.refresh_every
+
+    def set_bounds(self, table, min_id, max_id):
+        with self.lock:
+            self.bounds[table] = (min_id or 1, max_id or 0)
+            self.refreshed_at[table] = time.time()
+
+    def _rank(self, n):
+        # ранг 1..n, ранг 1 — самый горячий ключ
+        if self.dist == 'zipfian':
+            u = random.random()
+            theta = self.zipf_theta
+            # обратная функция непрерывного степенного закона на [1, n] — приближение Zipf без zeta(n)
+            if abs(theta - 1.0) < 1e-9:
+                r = n ** u
+            else:
+                r = ((n ** (1.0 - theta) - 1.0) * u + 1.0) ** (1.0 / (1.0 - theta))
+            return min(n, max(1, int(r)))
+        if self.dist == 'hotspot':
+            hot_n = max(1, int(n * self.hot_fraction))
+            if hot_n >= n or random.random() < self.hot_ops:
+                return random.randint(1, hot_n)
+            return random.randint(hot_n + 1, n)
+        return random.randint(1, n)
+
+    def pick(self, table):
+        """id из текущих границ или None, если таблица пуста."""
+        lo, hi = self.bounds[table]
+        if hi < lo:
+            return None
+        # горячими считаем самые свежие строки
+        return hi - self._rank(hi - lo + 1) + 1
+
+
+def connect_kwargs_for(args):
+    return dict(host=args.host, port=args.port, user=args.user, password=args.password,
+                database=args.dbname, charset="utf8mb4", autocommit=False)
+
+
+class PoolStopped(Exception):
+    """getconn() прерван остановкой теста (STOP), пока ждал свободное соединение."""
+
+
+class ConnectionPool:
+    """
+    Пул pymysql-соединений для потоков (у pymysql своего нет): соединения создаются лениво до
+    size, getconn() ждёт свободное. Сломанное соединение закрывается и место в пуле освобождается.
+    Ожидание — на Condition с таймаутом: возврат соединения и освобождение места будят ждущих,
+    а после STOP ждущие выходят с PoolStopped, не дожидаясь join-таймаута.
+    """
+
+    def __init__(self, conn_kwargs, size):
+        self.conn_kwargs = conn_kwargs
+        self.size = max(1, size)
+        self.idle = []
+        self.cond = threading.Condition()
+        self.created = 0
+
+    def getconn(self):
+        with self.cond:
+            while True:
+                if self.idle:
+                    return self.idle.pop()
+                if self.created < self.size:
+                    self.created += 1
+                    break
+                if STOP.is_set():
+                    raise PoolStopped("load test stopped")
+                self.cond.wait(POOL_WAIT_STEP)
+        try:
+            return pymysql.connect(**self.conn_kwargs)
+        except Exception:
+            self._release_slot()
+            raise
+
+    def _release_slot(self):
+        with self.cond:
+            self.created -= 1
+            self.cond.notify()
+
+    def putconn(self, conn, close=False):
+        if close:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            self._release_slot()
+            return
+        with self.cond:
+            self.idle.append(conn)
+            self.cond.notify()
+
+    def closeall(self):
+        with self.cond:
+            idle, self.idle = self.idle, []
+            self.created -= len(idle)
+            self.cond.notify_all()
+        for conn in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+class ConnectPerOpPool:
+    """Тот же интерфейс, что у ConnectionPool, но getconn() каждый раз открывает новое соединение."""
+
+    acquire_timer = 'connect'
+
+    def __init__(self, conn_kwargs):
+        self.conn_kwargs = conn_kwargs
+
+    def getconn(self):
+        return pymysql.connect(**self.conn_kwargs)
+
+    def putconn(self, conn, close=False):
+        conn.close()
+
+    def closeall(self):
+        pass
+
+
+class AsyncConnectPerOpPool:
+    """--connect_per_op для --engine async: интерфейс aiomysql-пула без пула."""
+
+    acquire_timer = 'connect'
+
+    def __init__(self, conn_kwargs):
+        self.conn_kwargs = aiomysql_kwargs(conn_kwargs)
+
+    @asynccontextmanager
+    async def acquire(self):
+        conn = await aiomysql.connect(**self.conn_kwargs)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+def aiomysql_kwargs(conn_kwargs):
+    # у aiomysql база называется db
+    kw = dict(conn_kwargs)
+    kw['db'] = kw.pop('database')
+    return kw
+
+
+def sample_words(conn_kwargs, keys, rows=FT_SAMPLE_ROWS):
+    """Слова для fulltext: из body нескольких случайных сообщений (тексты generate_mysql — из словаря)."""
+    conn = pymysql.connect(**conn_kwargs)
+    try:
+        cur = conn.cursor()
+        cur.execute(OP_SQL['bounds'].format(tbl='messages'))
+        lo, hi = cur.fetchone()
+        keys.set_bounds('messages', lo, hi)
+        words = set()
+        if hi is not None:
+            for _ in range(rows):
+                cur.execute(OP_SQL['sample_body'], (random.randint(lo, hi),))
+                row = cur.fetchone()
+                if row and row[0]:
+                    words.update(w for w in re.findall(r"[a-z]+", row[0].lower()) if len(w) >= FT_MIN_WORD)
+        conn.commit()
+    finally:
+        conn.close()
+    return sorted(words) or [rand_words(1) for _ in range(100)]
+
+
+class DBWorker:
+    def __init__(self, pool, keys, words, batch_insert=DEFAULT_BATCH_INSERT, stats=None):
+        self.pool = pool
+        self.keys = keys
+        self.words = words
+        self.batch_insert = batch_insert
+        self.stats = stats
+
+    @contextmanager
+    def timed(self, phase):
+        """Время блока — в SafeStats.timers[phase] (фазы execute/commit в отчёте)."""
+        t0 = time.time()
+        try:
+            yield
+        finally:
+            if self.stats is not None:
+                self.stats.add_timer(phase, time.time() - t0)
+
+    def run(self, cur, query, params=None):
+        with self.timed('execute'):
+            cur.execute(query, params)
+            return cur.fetchall()
+
+    def commit(self, conn):
+        with self.timed('commit'):
+            conn.commit()
+
+    @contextmanager
+    def conn(self):
+        t0 = time.time()
+        conn = self.pool.getconn()
+        if self.stats is not None:
+            self.stats.add_timer(getattr(self.pool, 'acquire_timer', 'pool_wait'), time.time() - t0)
+        broken = False
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            self.pool.putconn(conn, close=broken)
+
+    def pick_id(self, cur, t):
+        if self.keys.stale(t):
+            lo, hi = self.run(cur, OP_SQL['bounds'].format(tbl=t))[0]
+            self.keys.set_bounds(t, lo, hi)
+        return self.keys.pick(t)
+
+    # Operation implementations
+    def op_point_lookup(self):
+        t = random.choice(POINT_TABLES)
+        with self.conn() as conn:
+            cur = conn.cursor()
+            row_id = self.pick_id(cur, t)
+            if row_id is not None:
+                self.run(cur, OP_SQL['point_lookup'].format(tbl=t), (row_id,))
+            self.commit(conn)
+            cur.close()
+
+    def op_range_created(self):
+        t, params = range_params()
+        with self.conn() as conn:
+            cur = conn.cursor()
+            self.run(cur, OP_SQL['range_created'].format(tbl=t), params)
+            self.commit(conn)
+            cur.close()
+
+    def op_fulltext(self):
+        with self.conn() as conn:
+            cur = conn.cursor()
+            self.run(cur, OP_SQL['fulltext'], (' '.join(random.sample(self.words, min(2, len(self.words)))),))
+            self.commit(conn)
+            cur.close()
+
+    def op_json_path(self):
+        path = random.choice(JSON_PATHS)
+        with self.conn() as conn:
+            cur = conn.cursor()
+            start = self.pick_id(cur, 'users')
+            if start is not None:
+                self.run(cur, OP_SQL['json_path'], (path, start, start + JSON_SCAN_ROWS - 1, path))
+            self.commit(conn)
+            cur.close()
+
+    def op_insert_log(self):
+        with self.conn() as conn:
+            cur = conn.cursor()
+            self.run(cur, OP_SQL['insert_log'], log_params())
+            self.commit(conn)
+            cur.close()
+
+    def op_insert_metrics(self):
+        n = self.batch_insert
+        params = [v for _ in range(n) for v in metric_params()]
+        with self.conn() as conn:
+            cur = conn.cursor()
+            self.run(cur, OP_SQL['insert_metrics'] + ",".join([METRICS_ROW] * n), params)
+            self.commit(conn)
+            cur.close()
+
+
+def build_ops_map(dbworker):
+    # одинаковые имена op_* у DBWorker и AsyncDBWorker, поэтому карта общая
+    return {k: getattr(dbworker, method) for k, method in OP_METHODS.items()}
+
+
+def build_cdf(ratios):
+    keys = list(ratios.keys())
+    weights = [ratios[k] for k in keys]
+    total = sum(weights)
+    if total <= 0:
+        raise ValueError("Ratios sum must be > 0")
+    cdf = []
+    acc = 0.0
+    for k in keys:
+        acc += ratios[k] / total
+        cdf.append((acc, k))
+    return cdf
+
+
+def pick_op(ops_map, cdf):
+    r = random.random()
+    for thresh, k in cdf:
+        if r <= thresh:
+            return ops_map[k]
+    return ops_map[cdf[-1][1]]
+
+
+class OpRunner(threading.Thread):
+    def __init__(self, name, dbworker, ratios, rate, stats, ops_map=None):
+        super().__init__(daemon=True)
+        self.name = name
+        self.dbworker = dbworker
+        self.ratios = ratios
+        self.rate = rate
+        self.stats = stats
+        self.ops_map = ops_map or build_ops_map(dbworker)
+        self.cdf = build_cdf(ratios)
+
+    def choose_op(self):
+        return pick_op(self.ops_map, self.cdf)
+
+    def run(self):
+        last = time.time()
+        while not STOP.is_set():
+            # скорость может меняться по профилю нагрузки — перечитываем каждый цикл
+            per_client = self.rate.per_client()
+            sleep_interval = 1.0 / per_client if per_client > 0 else 0.0
+            op = self.choose_op()
+            n = 1
+            try:
+                start = time.time()
+                # операции с --write_batch возвращают число записанных строк
+                n = op() or 1
+                dur = time.time() - start
+                self.stats.incr('ops', n)
+                self.stats.incr_type(op.__name__, n)
+                self.stats.add_time(dur)
+            except PoolStopped:
+                break
+            except Exception as e:
+                self.stats.incr_error(op.__name__)
+                # print occasional errors
+                if self.stats.data['errors'] % 10 == 1:
+                    print(f"[{now_ts()}] Worker {self.name} error: {repr(e)}", file=sys.stderr)
+            # pacing: вызов на n строк «стоит» n интервалов — иначе с --write_batch K
+            # строк/с было бы до K·ops_per_sec, мимо цели RateTarget/KneeFinder
+            if sleep_interval > 0:
+                end = last + sleep_interval * n
+                to_sleep = end - time.time()
+                if to_sleep > 0:
+                    STOP.wait(to_sleep)
+                last = time.time()
+            else:
+                STOP.wait(0.001)
+
+
+class AsyncDBWorker:
+    """Те же операции, что и в DBWorker, но поверх aiomysql."""
+
+    def __init__(self, pool, keys, words, batch_insert=DEFAULT_BATCH_INSERT, stats=None):
+        self.pool = pool
+        self.keys = keys
+        self.words = words
+        self.batch_insert = batch_insert
+        self.stats = stats
+
+    @asynccontextmanager
+    async def conn(self):
+        t0 = time.time()
+        async with self.pool.acquire() as conn:
+            if self.stats is not None:
+                self.stats.add_timer(getattr(self.pool, 'acquire_timer', 'pool_wait'), time.time() - t0)
+            try:
+                yield conn
+            except Exception:
+                # aiomysql закрывает соединение, которое вернули в пул посреди транзакции
+                try:
+                    await conn.rollback()
+                except Exception:
+                    pass
+                raise
+
+    def add_phase(self, phase, t0):
+        if self.stats is not None:
+            self.stats.add_timer(phase, time.time() - t0)
+
+    async def run(self, cur, query, params=None):
+        t0 = time.time()
+        try:
+            await cur.execute(query, params)
+            return await cur.fetchall()
+        finally:
+            self.add_phase('execute', t0)
+
+    async def commit(self, conn):
+        t0 = time.time()
+        try:
+            await conn.commit()
+        finally:
+            self.add_phase('commit', t0)
+
+    async def pick_id(self, cur, t):
+        if self.keys.stale(t):
+            lo, hi = (await self.run(cur, OP_SQL['bounds'].format(tbl=t)))[0]
+            self.keys.set_bounds(t, lo, hi)
+        return self.keys.pick(t)
+
+    async def op_point_lookup(self):
+        t = random.choice(POINT_TABLES)
+        async with self.conn() as conn:
+            async with conn.cursor() as cur:
+                row_id = await self.pick_id(cur, t)
+                if row_id is not None:
+                    await self.run(cur, OP_SQL['point_lookup'].format(tbl=t), (row_id,))
+            await self.commit(conn)
+
+    async def op_range_created(self):
+        t, params = range_params()
+        async with self.conn() as conn:
+            async with conn.cursor() as cur:
+                await self.run(cur, OP_SQL['range_created'].format(tbl=t), params)
+            await self.commit(conn)
+
+    async def op_fulltext(self):
+        async with self.conn() as conn:
+            async with conn.cursor() as cur:
+                await self.run(cur, OP_SQL['fulltext'], (' '.join(random.sample(self.words, min(2, len(self.words)))),))
+            await self.commit(conn)
+
+    async def op_json_path(self):
+        path = random.choice(JSON_PATHS)
+        async with self.conn() as conn:
+            async with conn.cursor() as cur:
+                start = await self.pick_id(cur, 'users')
+                if start is not None:
+                    await self.run(cur, OP_SQL['json_path'], (path, start, start + JSON_SCAN_ROWS - 1, path))
+            await self.commit(conn)
+
+    async def op_insert_log(self):
+        async with self.conn() as conn:
+            async with conn.cursor() as cur:
+                await self.run(cur, OP_SQL['insert_log'], log_params())
+            await self.commit(conn)
+
+    async def op_insert_metrics(self):
+        n = self.batch_insert
+        params = [v for _ in range(n) for v in metric_params()]
+        async with self.conn() as conn:
+            async with conn.cursor() as cur:
+                await self.run(cur, OP_SQL['insert_metrics'] + ",".join([METRICS_ROW] * n), params)
+            await self.commit(conn)
+
+
+class AsyncEngine(threading.Thread):
+    """
+    Крутит asyncio-петлю в отдельном потоке: concurrency корутин делят один aiomysql-пул.
+    Для main() выглядит как ещё один runner — отчёты и остановка через STOP те же.
+    """
+
+    def __init__(self, conn_kwargs, keys, words, ratios, rate, stats, concurrency, pool_size,
+                 batch_insert=DEFAULT_BATCH_INSERT, connect_per_op=False):
+        super().__init__(daemon=True)
+        self.name = "async"
+        self.conn_kwargs = conn_kwargs
+        self.keys = keys
+        self.words = words
+        self.cdf = build_cdf(ratios)
+        self.rate = rate
+        self.stats = stats
+        self.concurrency = concurrency
+        self.pool_size = pool_size
+        self.batch_insert = batch_insert
+        self.connect_per_op = connect_per_op
+
+    def run(self):
+        asyncio.run(self._main())
+
+    async def _main(self):
+        if self.connect_per_op:
+            pool = AsyncConnectPerOpPool(self.conn_kwargs)
+        else:
+            pool = await aiomysql.create_pool(minsize=1, maxsize=self.pool_size, **aiomysql_kwargs(self.conn_kwargs))
+        try:
+            dbworker = AsyncDBWorker(pool, self.keys, self.words, batch_insert=self.batch_insert, stats=self.stats)
+            ops_map = build_ops_map(dbworker)
+            await asyncio.gather(*(self._client(f"c{i+1}", ops_map) for i in range(self.concurrency)))
+        finally:
+            pool.close()
+            await pool.wait_closed()
+
+    async def _client(self, name, ops_map):
+        per_client = self.rate.per_client()
+        # разносим старт корутин, чтобы не было залпа из тысяч одновременных запросов
+        await asyncio.sleep(random.random() * (1.0 / per_client if per_client > 0 else 0.01))
+        last = time.time()
+        while not STOP.is_set():
+            per_client = self.rate.per_client()
+            sleep_interval = 1.0 / per_client if per_client > 0 else 0.0
+            op = pick_op(ops_map, self.cdf)
+            try:
+                start = time.time()
+                n = await op() or 1
+                dur = time.time() - start
+                self.stats.incr('ops', n)
+                self.stats.incr_type(op.__name__, n)
+                self.stats.add_time(dur)
+            except Exception as e:
+                self.stats.incr_error(op.__name__)
+                if self.stats.data['errors'] % 10 == 1:
+                    print(f"[{now_ts()}] Client {name} error: {repr(e)}", file=sys.stderr)
+            if sleep_interval > 0:
+                end = last + sleep_interval
+                to_sleep = end - time.time()
+                if to_sleep > 0:
+                    await asyncio.sleep(to_sleep)
+                last = time.time()
+            else:
+                await asyncio.sleep(0)
+
+
+def start_runners(args, ratios, stats, conn_kwargs, keys, words, rate):
+    """Создать пул и запустить клиентов выбранного движка. Возвращает (runners, pool или None)."""
+    pool_size = args.pool_size or max(2, args.concurrency + 2)
+    runners = []
+    pool = None
+    if args.engine == 'async':
+        runners.append(AsyncEngine(conn_kwargs, keys, words, ratios, rate, stats,
+                                   concurrency=args.concurrency, pool_size=pool_size,
+                                   batch_insert=args.batch_insert, connect_per_op=args.connect_per_op))
+    else:
+        pool = ConnectPerOpPool(conn_kwargs) if args.connect_per_op else ConnectionPool(conn_kwargs, pool_size)
+        dbworker = DBWorker(pool, keys, words, batch_insert=args.batch_insert, stats=stats)
+        for i in range(args.concurrency):
+            runners.append(OpRunner(f"w{i+1}", dbworker, ratios, rate, stats))
+    for r in runners:
+        r.start()
+    return runners, pool
+
+
+def stop_runners(runners, pool, engine):
+    STOP.set()
+    for r in runners:
+        # async-петле нужно время, чтобы дождаться корутин и закрыть пул
+        r.join(timeout=30 if engine == 'async' else 5)
+    if pool is not None:
+        pool.closeall()
+
+
+def check_tables(conn_kwargs):
+    conn = pymysql.connect(**conn_kwargs)
+    try:
+        cur = conn.cursor()
+        cur.execute("SHOW TABLES")
+        present = {r[0] for r in cur.fetchall()}
+    finally:
+        conn.close()
+    return [t for t in REQUIRED_TABLES if t not in present]
+
+
+def parse_ratios(ratios_str):
+    ratios = DEFAULT_RATIO.copy()
+    if not ratios_str:
+        return ratios
+    for part in ratios_str.split(','):
+        if not part.strip():
+            continue
+        if '=' not in part:
+            continue
+        k, v = part.split('=', 1)
+        k = k.strip()
+        try:
+            v = float(v)
+        except Exception:
+            continue
+        if k in ratios:
+            ratios[k] = v
+    return ratios
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MySQL workload simulator for the generate_mysql.py schema")
+    parser.add_argument("--host", default=DB["host"])
+    parser.add_argument("--port", type=int, default=DB["port"])
+    parser.add_argument("--user", default=DB["user"])
+    parser.add_argument("--password", default=DB["password"])
+    parser.add_argument("--dbname", default=DB["database"])
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--engine", choices=ENGINES, default="thread")
+    parser.add_argument("--pool_size", type=int, default=0)
+    parser.add_argument("--connect_per_op", action="store_true")
+    parser.add_argument("--ops_per_sec", type=int, default=DEFAULT_OPS_PER_SEC)
+    parser.add_argument("--duration", type=int, default=DEFAULT_DURATION)
+    parser.add_argument("--profile", choices=PROFILES, default="const")
+    parser.add_argument("--profile_start", type=float, default=0.0)
+    parser.add_argument("--step_size", type=float, default=0.0)
+    parser.add_argument("--step_hold", type=float, default=30.0)
+    parser.add_argument("--spike_every", type=float, default=60.0)
+    parser.add_argument("--spike_len", type=float, default=10.0)
+    parser.add_argument("--spike_rate", type=float, default=0.0)
+    parser.add_argument("--batch_insert", type=int, default=DEFAULT_BATCH_INSERT)
+    parser.add_argument("--ratios", default="")
+    parser.add_argument("--report_interval", type=float, default=REPORT_EVERY)
+    parser.add_argument("--metrics_out", default="")
+    parser.add_argument("--key_dist", choices=KEY_DISTS, default="uniform")
+    parser.add_argument("--zipf_theta", type=float, default=0.99)
+    parser.add_argument("--hot_fraction", type=float, default=0.2)
+    parser.add_argument("--hot_ops", type=float, default=0.8)
+    parser.add_argument("--key_refresh", type=float, default=10.0)
+    args = parser.parse_args()
+
+    if args.engine == 'async' and aiomysql is None:
+        parser.error('--engine async requires aiomysql: pip install aiomysql')
+    if args.profile != 'const' and args.ops_per_sec <= 0:
+        parser.error(f"--profile {args.profile} needs --ops_per_sec > 0")
+    args.batch_insert = max(1, args.batch_insert)
+
+    ratios = parse_ratios(args.ratios)
+    profile = LoadProfile(args.profile, args.ops_per_sec, args.duration, start=args.profile_start,
+                          step_size=args.step_size, step_hold=args.step_hold, spike_every=args.spike_every,
+                          spike_len=args.spike_len, spike_rate=args.spike_rate)
+    rate = RateTarget(profile.start if args.profile in ('ramp', 'steps') else args.ops_per_sec, args.concurrency)
+    conn_kwargs = connect_kwargs_for(args)
+
+    missing = check_tables(conn_kwargs)
+    if missing:
+        parser.error(f"tables not found in {args.dbname}: {', '.join(missing)} — run generate_mysql.py first")
+    keys = KeyIndex(POINT_TABLES, dist=args.key_dist, zipf_theta=args.zipf_theta,
+                    hot_fraction=args.hot_fraction, hot_ops=args.hot_ops, refresh_every=args.key_refresh)
+    words = sample_words(conn_kwargs, keys) if ratios.get('fulltext', 0) > 0 else []
+    if words:
+        print(f"[{now_ts()}] Fulltext vocabulary: {len(words)} words sampled from messages")
+
+    stats = SafeStats()
+
+    def sigint_handler(signum, frame):
+        print(f"\n[{now_ts()}] Received stop signal, shutting down gracefully...")
+        STOP.set()
+
+    signal.signal(signal.SIGINT, sigint_handler)
+    signal.signal(signal.SIGTERM, sigint_handler)
+
+    print(f"[{now_ts()}] Starting {args.concurrency} {args.engine} workers, profile={args.profile}, "
+          f"target total ops/sec ~= {rate.total():.0f}")
+    runners, pool = start_runners(args, ratios, stats, conn_kwargs, keys, words, rate)
+    writer = MetricsWriter(args.metrics_out) if args.metrics_out else None
+
+    def report(record):
+        print(f"[{record['ts']}] elapsed={int(record['elapsed'])}s total_ops={record['total_ops']} ops/s={record['ops_per_sec']:.2f} "
+              f"avg_latency={record['avg_latency_ms']:.2f}ms p50={record['p50_ms']:.2f}ms p95={record['p95_ms']:.2f}ms "
+              f"p99={record['p99_ms']:.2f}ms pool_wait={record['pool_wait_ms_avg']:.2f}ms errors={record['total_errors']}")
+        line = (f"   phases/op: acquire={record['acquire_ms_per_op']:.2f}ms execute={record['execute_ms_per_op']:.2f}ms "
+                f"commit={record['commit_ms_per_op']:.2f}ms client={record['client_ms_per_op']:.2f}ms")
+        if args.connect_per_op:
+            line += f" connects/s={record['connects_per_sec']:.2f} connect_avg={record['connect_ms_avg']:.2f}ms"
+        print(line)
+        for k, v in sorted(record['ops_by_type'].items(), key=lambda x: -x[1]):
+            errs = record['errors_by_type'].get(k, 0)
+            if not v and not errs:
+                continue
+            print(f"   {k}: {v}" + (f" (errors {errs})" if errs else ""))
+        if writer is not None:
+            writer.write(record)
+
+    start_time = time.time()
+    reporter = IntervalReporter(stats, start_time, rate)
+    next_report = start_time + args.report_interval
+    end_time = start_time + args.duration if args.duration > 0 else float('inf')
+
+    try:
+        while time.time() < end_time and not STOP.is_set():
+            now = time.time()
+            if args.profile != 'const':
+                rate.set(profile.rate(now - start_time))
+            if now >= next_report:
+                report(reporter.tick(now))
+                next_report = now + args.report_interval
+            time.sleep(min(0.5, args.report_interval))
+    except KeyboardInterrupt:
+        STOP.set()
+
+    STOP.set()
+    print(f"[{now_ts()}] Waiting for workers to finish...")
+    stop_runners(runners, pool, args.engine)
+    # хвост после последнего отчёта, чтобы во временном ряду не терялись последние секунды
+    report(reporter.tick(time.time()))
+    if writer is not None:
+        writer.close()
+
+    total_elapsed = time.time() - start_time
+    data_snap, _, time_total = stats.snapshot()
+    hist = stats.hist_snapshot()
+    total_ops = data_snap.get('ops', 0)
+    errors = data_snap.get('errors', 0)
+    print(f"[{now_ts()}] Finished. elapsed={int(total_elapsed)}s total_ops={total_ops} ops/s={(total_ops/total_elapsed if total_elapsed>0 else 0):.2f} "
+          f"p50={hist_percentile(hist, 0.50):.2f}ms p95={hist_percentile(hist, 0.95):.2f}ms p99={hist_percentile(hist, 0.99):.2f}ms errors={errors}")
+    _, timers = stats.extra_snapshot()
+    calls = sum(hist)
+    if calls:
+        acquire = timers.get('pool_wait', 0.0) + timers.get('connect', 0.0)
+        print(f"[{now_ts()}] Phases per op: acquire={acquire / calls * 1000.0:.2f}ms "
+              f"execute={timers.get('execute', 0.0) / calls * 1000.0:.2f}ms "
+              f"commit={timers.get('commit', 0.0) / calls * 1000.0:.2f}ms "
+              f"total={time_total / calls * 1000.0:.2f}ms")
+    if args.connect_per_op and total_elapsed > 0:
+        connects = data_snap.get('connect_count', 0)
+        print(f"[{now_ts()}] Connects: {connects} ({connects / total_elapsed:.2f}/s), "
+              f"avg connect={(timers.get('connect', 0.0) / connects * 1000.0 if connects else 0.0):.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
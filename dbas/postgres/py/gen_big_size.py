@@ -20,6 +20,10 @@
   * Запускайте на пустой схеме: скрипт может TRUNCATE + RESTART IDENTITY.
   * Индексы создаются ПОСЛЕ загрузки — это быстрее.
   * Можно параллелить несколько скриптов по «самостоятельным» таблицам (логи/метрики/нотификации), если есть свободные CPU/IO.
+  * Для удалённых DBaaS и объёмов в сотни ГБ — --server_side: строки генерирует сам сервер
+    (INSERT ... SELECT FROM generate_series) параллельно по --jobs соединениям, скрипт лишь
+    раздаёт id-диапазоны. Распределения приближённые (md5-текст вместо Faker). Схема должна быть пустой:
+      python3 gen_big_size.py --dsn "..." --truncate --server_side --jobs 16 --logs 1000000000
 """
 
 from __future__ import annotations
@@ -30,6 +34,10 @@ import math
 import os
 import random
 import string
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from typing import Iterable, Iterator, List, Tuple
 
@@ -645,6 +653,239 @@ def load_all(conn: PGConnection, args):
     copy_iter(conn, "audit", ["table_name","row_id","action","changed_at","user_id"], audit_rows(n_audit, n_users))
 
 
+# -----------------------------
+# Серверная генерация (generate_series)
+# -----------------------------
+# Строки собирает сам PostgreSQL: INSERT ... SELECT ... FROM generate_series(lo, hi).
+# Python только режет диапазоны id на чанки и раздаёт их по соединениям — по сети
+# идут короткие SQL-команды вместо гигабайт CSV. Выражения приближают распределения
+# генераторов выше; если одно случайное значение нужно в нескольких колонках,
+# оно считается во вложенном подзапросе (с volatile-функциями он не «схлопывается»).
+
+# Таблицы, на чьи id ссылаются FK: id задаём явно (= g), после загрузки двигаем sequence
+SERVER_EXPLICIT_ID = ["roles", "users", "categories", "products", "orders", "chats"]
+
+
+def s_int(lo: int, hi: int) -> str:
+    return f"({lo} + floor(random() * {hi - lo + 1})::bigint)"
+
+
+def s_uniform(lo: float, hi: float, digits: int = 2) -> str:
+    return f"round(({lo} + random() * {hi - lo})::numeric, {digits})"
+
+
+def s_choice(values: List[str]) -> str:
+    items = ", ".join(f"'{v}'" for v in values)
+    return f"(ARRAY[{items}])[1 + floor(random() * {len(values)})::int]"
+
+
+def s_ts() -> str:
+    """Аналог rand_ts(): равномерно между START_DATE и NOW."""
+    secs = int((NOW - START_DATE).total_seconds())
+    return f"(TIMESTAMP '{START_DATE:%Y-%m-%d %H:%M:%S}' + random() * INTERVAL '{secs} seconds')"
+
+
+def s_word(lo: int = 4, hi: int = 10) -> str:
+    return f"initcap(substr(md5(random()::text), 1, {lo} + floor(random() * {hi - lo + 1})::int))"
+
+
+def s_text(max_chars: int) -> str:
+    """Аналог fake.text(max_nb_chars): 1..N md5-«слов», обрезанных до max_chars.
+    Подзапрос ссылается на g, поэтому выполняется на каждую строку, а не один раз."""
+    words = max(1, max_chars // 33)
+    return (f"(SELECT left(string_agg(md5(random()::text), ' '), {max_chars}) "
+            f"FROM generate_series(1, 1 + floor(random() * {words})::int + 0 * g))")
+
+
+def s_bytes(lo: int, hi: int) -> str:
+    """Аналог hex_bytes(randint(lo, hi)): склейка md5 по 16 байт."""
+    return (f"(SELECT decode(string_agg(md5(random()::text), ''), 'hex') "
+            f"FROM generate_series(1, {lo // 16} + floor(random() * {(hi - lo) // 16 + 1})::int + 0 * g))")
+
+
+def s_ip() -> str:
+    return "('0.0.0.0'::inet + floor(random() * 4294967296)::bigint)"
+
+
+GS = "generate_series(%(lo)s, %(hi)s) g"
+
+
+def server_tables(args) -> List[Tuple[int, str, int, str]]:
+    """(фаза, таблица, число «ведущих» строк, SQL с %(lo)s/%(hi)s).
+    Фазы учитывают FK: 0 — независимые, 1 — ссылаются на фазу 0, 2 — на orders."""
+    nu, nc, npr, no, nch = args.users, args.categories, args.products, args.orders, args.chats
+    audit_tables = [
+        "users", "profiles", "products", "orders", "order_items", "payments",
+        "shipments", "invoices", "messages", "notifications", "chats", "chat_messages"
+    ]
+    return [
+        (0, "roles", len(ROLE_NAMES), f"""
+            INSERT INTO roles (id, name)
+            SELECT g, (ARRAY[{", ".join(f"'{r}'" for r in ROLE_NAMES)}])[g] FROM {GS}"""),
+        (0, "users", nu, f"""
+            INSERT INTO users (id, username, email, created_at)
+            SELECT g, left(md5(g::text), 8) || g, 'user' || g || '@example.com', {s_ts()}
+            FROM {GS}"""),
+        (0, "categories", nc, f"""
+            INSERT INTO categories (id, name) SELECT g, {s_word(3, 12)} FROM {GS}"""),
+        (0, "products", npr, f"""
+            INSERT INTO products (id, name, description, price, stock, created_at)
+            SELECT g, {s_word()} || ' ' || {s_word()}, {s_text(2000)},
+                   {s_uniform(3, 5000)}, {s_int(0, 10000)}, {s_ts()}
+            FROM {GS}"""),
+        (0, "chats", nch, f"""
+            INSERT INTO chats (id, title, created_at)
+            SELECT g, {s_word()} || ' ' || {s_word()}, {s_ts()} FROM {GS}"""),
+        (0, "metrics", args.metrics, f"""
+            INSERT INTO metrics (name, value, collected_at)
+            SELECT 'metric_' || {s_choice(["latency", "qps", "errors", "apdex", "cpu", "io"])},
+                   {s_uniform(0, 1000000, 4)}, {s_ts()}
+            FROM {GS}"""),
+
+        (1, "profiles", nu, f"""
+            INSERT INTO profiles (user_id, first_name, last_name, bio, birth_date, country, city)
+            SELECT g, {s_word(3, 10)}, {s_word(4, 12)}, {s_text(500)},
+                   current_date - {s_int(18 * 365, 80 * 365)}::int, {s_word(4, 12)}, {s_word(4, 12)}
+            FROM {GS}"""),
+        # + 0 * g в фильтре: иначе он уедет в скан VALUES и random() посчитается один раз
+        (1, "user_roles", nu, f"""
+            INSERT INTO user_roles (user_id, role_id)
+            SELECT g, v.role_id
+            FROM {GS} CROSS JOIN (VALUES (3, 1.0), (2, 0.05), (1, 0.01)) v(role_id, p)
+            WHERE random() + 0 * g < v.p"""),
+        (1, "product_categories", npr, f"""
+            INSERT INTO product_categories (product_id, category_id)
+            SELECT DISTINCT g, c FROM (
+                SELECT g, {s_int(1, nc)} AS c
+                FROM {GS} CROSS JOIN LATERAL
+                     generate_series(1, 1 + floor(random() * {min(3, nc)})::int + 0 * g) k
+            ) s"""),
+        (1, "orders", no, f"""
+            INSERT INTO orders (id, user_id, status, total, created_at)
+            SELECT g, {s_int(1, nu)}, {s_choice(ORDER_STATUSES)}, {s_uniform(5, 20000)}, {s_ts()}
+            FROM {GS}"""),
+        (1, "transactions", args.transactions, f"""
+            INSERT INTO transactions (user_id, amount, currency, status, created_at)
+            SELECT {s_int(1, nu)}, {s_uniform(-5000, 5000)}, {s_choice(CURRENCIES)},
+                   {s_choice(["ok", "hold", "reverted", "failed"])}, {s_ts()}
+            FROM {GS}"""),
+        # получатель ≠ отправитель: сдвиг на 1..nu-1 по кольцу
+        (1, "messages", args.messages, f"""
+            INSERT INTO messages (sender_id, receiver_id, body, created_at)
+            SELECT s, 1 + mod(s + floor(random() * {max(1, nu - 1)})::bigint, {nu}), {s_text(1000)}, {s_ts()}
+            FROM (SELECT g, {s_int(1, nu)} AS s FROM {GS}) x"""),
+        (1, "notifications", args.notifications, f"""
+            INSERT INTO notifications (user_id, type, content, seen, created_at)
+            SELECT {s_int(1, nu)}, {s_choice(NOTIFY_TYPES)}, {s_text(600)}, random() < 0.7, {s_ts()}
+            FROM {GS}"""),
+        (1, "chat_messages", args.chat_messages, f"""
+            INSERT INTO chat_messages (chat_id, user_id, body, created_at)
+            SELECT {s_int(1, nch)}, {s_int(1, nu)}, {s_text(800)}, {s_ts()}
+            FROM {GS}"""),
+        (1, "logs", args.logs, f"""
+            INSERT INTO logs (user_id, action, details, ip, created_at)
+            SELECT {s_int(1, nu)}, {s_choice(ACTIONS)}, {s_text(2000)}, {s_ip()}, {s_ts()}
+            FROM {GS}"""),
+        (1, "audit", args.audit, f"""
+            INSERT INTO audit (table_name, row_id, action, changed_at, user_id)
+            SELECT {s_choice(audit_tables)}, {s_int(1, 10_000_000)},
+                   {s_choice(["INSERT", "UPDATE", "DELETE"])}, {s_ts()}, {s_int(1, nu)}
+            FROM {GS}"""),
+
+        (2, "order_items", no, f"""
+            INSERT INTO order_items (order_id, product_id, quantity, price)
+            SELECT g, {s_int(1, npr)}, {s_int(1, 10)}, {s_uniform(3, 5000)}
+            FROM {GS} CROSS JOIN LATERAL generate_series(1, 1 + floor(random() * 6)::int + 0 * g) k"""),
+        (2, "payments", no, f"""
+            INSERT INTO payments (order_id, amount, method, status, paid_at)
+            SELECT g, {s_uniform(5, 20000)}, {s_choice(PAY_METHODS)}, status,
+                   CASE WHEN status IN ('authorized', 'captured', 'refunded') THEN {s_ts()} END
+            FROM (SELECT g, {s_choice(PAY_STATUSES)} AS status FROM {GS} WHERE random() < 0.95) x"""),
+        (2, "shipments", no, f"""
+            INSERT INTO shipments (order_id, address, status, shipped_at)
+            SELECT g, {s_int(1, 9999)} || ' ' || {s_word()} || ' St, ' || {s_word()} || ', ' || {s_word()},
+                   status, CASE WHEN status NOT IN ('pending', 'packing') THEN {s_ts()} END
+            FROM (SELECT g, {s_choice(SHIP_STATUSES)} AS status FROM {GS} WHERE random() < 0.8) x"""),
+        (2, "invoices", no, f"""
+            INSERT INTO invoices (order_id, pdf, issued_at)
+            SELECT g, CASE WHEN random() < 0.2 THEN {s_bytes(256, 2048)} END, {s_ts()}
+            FROM {GS} WHERE random() < 0.7"""),
+    ]
+
+
+_server_local = threading.local()
+_server_conns: List[PGConnection] = []
+_server_lock = threading.Lock()
+
+
+def server_conn(dsn: str) -> PGConnection:
+    """Одно соединение на поток пула — без переподключения на каждый чанк."""
+    conn = getattr(_server_local, "conn", None)
+    if conn is None:
+        conn = psycopg2.connect(dsn)
+        with conn.cursor() as cur:
+            cur.execute("SET synchronous_commit = OFF;")
+        conn.commit()
+        _server_local.conn = conn
+        with _server_lock:
+            _server_conns.append(conn)
+    return conn
+
+
+def server_chunk(dsn: str, sql: str, lo: int, hi: int, seed: float):
+    conn = server_conn(dsn)
+    try:
+        with conn.cursor() as cur:
+            # setseed на чанк: тот же --seed даёт те же данные при любом --jobs
+            cur.execute("SELECT setseed(%s)", (seed,))
+            cur.execute(sql, {"lo": lo, "hi": hi})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def reset_sequences(conn: PGConnection):
+    for table in SERVER_EXPLICIT_ID:
+        exec_sql(conn, f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                       f"COALESCE((SELECT max(id) FROM {table}), 0) + 1, false);")
+
+
+def load_server_side(conn: PGConnection, args):
+    tables = server_tables(args)
+    try:
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            for phase in sorted({t[0] for t in tables}):
+                futures = {}
+                started = time.time()
+                for ph, table, total, sql in tables:
+                    if ph != phase:
+                        continue
+                    for lo in range(1, total + 1, args.chunk_rows):
+                        hi = min(lo + args.chunk_rows - 1, total)
+                        seed = random.Random(f"{args.seed}:{table}:{lo}").uniform(-1, 1)
+                        futures[pool.submit(server_chunk, args.dsn, sql, lo, hi, seed)] = table
+                left = Counter(futures.values())
+                try:
+                    for fut in as_completed(futures):
+                        fut.result()
+                        table = futures[fut]
+                        left[table] -= 1
+                        if not left[table]:
+                            print(f"→ {table} (server-side, фаза {phase}, {time.time() - started:.1f}s)")
+                except BaseException:
+                    for fut in futures:
+                        fut.cancel()
+                    raise
+    finally:
+        with _server_lock:
+            for c in _server_conns:
+                c.close()
+            _server_conns.clear()
+
+    reset_sequences(conn)
+
+
 # -----------------------------
 # CLI
 # -----------------------------
@@ -654,6 +895,12 @@ def parse_args():
     p.add_argument("--dsn", required=True, help="Строка подключения libpq, напр.: host=127.0.0.1 port=5432 dbname=default_db user=gen_user password=Passwd123")
     p.add_argument("--seed", type=int, default=42, help="Seed для воспроизводимости")
     p.add_argument("--truncate", action="store_true", help="Очистить все таблицы (TRUNCATE ... RESTART IDENTITY)")
+    p.add_argument("--server_side", "--server-side", action="store_true",
+                   help="Генерировать строки на сервере (INSERT ... SELECT FROM generate_series) вместо COPY из Python")
+    p.add_argument("--jobs", type=int, default=min(8, os.cpu_count() or 1),
+                   help="Параллельных соединений для --server_side")
+    p.add_argument("--chunk_rows", type=int, default=1_000_000,
+                   help="Размер id-диапазона одного INSERT в --server_side")
 
     # Объёмы данных
     p.add_argument("--users", type=int, default=1_000_000)
@@ -687,8 +934,12 @@ def main():
     print("Создание схемы и таблиц…")
     create_schema(conn)
 
-    print("Загрузка данных COPY…")
-    load_all(conn, args)
+    if args.server_side:
+        print(f"Серверная генерация generate_series ({args.jobs} соединений)…")
+        load_server_side(conn, args)
+    else:
+        print("Загрузка данных COPY…")
+        load_all(conn, args)
 
     print("Создание индексов…")
     build_indexes(conn)
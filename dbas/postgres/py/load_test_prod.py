@@ -28,33 +28,118 @@ pg_prod_simulator_fixed.py
 --ratios позволяет тонко настроить распределение операций: пример --ratios select_point=0.4,insert=0.2,update=0.2,transaction=0.2
 
 --seed создаёт начальные данные (можно долго выполняться при больших объёмах) — для быстроты уменьшите --rows_per_table.
+  Догружает каждую таблицу ровно до --rows_per_table строк через COPY, все таблицы параллельно
+  (по соединению на таблицу). Ключи детерминированные и уникальные: seed000000000001, ... —
+  нумерация продолжается после уже существующих seed-ключей, поэтому повторный --seed безопасен.
+  Индекс по value на время загрузки удаляется и строится заново после COPY.
 
 --duration продолжительность.
 
---concurrency потоки
+--concurrency потоки (или корутины для --engine async)
+
+--engine thread|async — thread: поток на клиента (psycopg2 + блокирующий ConnectionPool);
+  async: одна asyncio-петля и тысячи корутин поверх psycopg 3 (AsyncConnectionPool).
+  Для async нужен: pip install "psycopg[binary]" psycopg_pool
+
+--pool_size размер пула соединений (0 = concurrency + 2). Для async обычно = concurrency,
+  чтобы эмулировать N прикладных соединений. Если пул меньше --concurrency, клиенты ждут
+  свободное соединение (время ожидания — pool_wait/acquire в отчёте), а не получают ошибку.
+
+--key_dist uniform|zipfian|hotspot — как point-операции (select_point/update/delete/transaction)
+  выбирают id. Границы id каждой таблицы держатся в памяти (min/max(id) раз в --key_refresh сек
+  + id, которые вернули собственные INSERT ... RETURNING), так что вместо ORDER BY random()
+  идёт обычный поиск по первичному ключу. Горячие ключи — самые свежие id.
+  --zipf_theta — перекос для zipfian; --hot_fraction/--hot_ops — доля горячих ключей и доля
+  операций по ним для hotspot (по умолчанию 80% операций в 20% ключей).
+
+--protocol simple|prepared — simple: текст запроса каждый раз (parse/plan на сервере на каждый вызов);
+  prepared: каждое соединение один раз делает PREPARE на запрос x таблицу и дальше EXECUTE по имени
+  (для --engine async — серверные prepared statements psycopg 3). Удобно сравнивать throughput.
+
+--write_batch K — insert и upsert пишут K строк за один вызов и один COMMIT.
+  thread: K запросов в одной транзакции (экономим коммиты/fsync, но не round trip);
+  async: K запросов в pipeline mode libpq + COMMIT — один round trip на всю пачку.
+  ops/s считает строки, задержка в отчёте — на весь вызов. K=1 — старое поведение.
+  Пауза между вызовами тоже растёт в K раз, так что --ops_per_sec остаётся целью в строках/с.
+
+--metrics_out FILE — писать поинтервальные метрики (ops/s, p50/p95/p99, ошибки и операции по типам,
+  ожидание пула) в файл: *.csv — CSV, иначе JSON lines. Интервал — --report_interval (сек).
+--prometheus_port PORT — отдавать те же метрики на http://127.0.0.1:PORT/metrics (формат Prometheus).
+  --prometheus_addr ADDR — другой адрес для listen (0.0.0.0 — все интерфейсы, метрики увидит вся сеть).
+
+--workload FILE.yaml — вместо девяти встроенных op_* крутить операции из файла: именованные
+  параметризованные SQL-шаблоны, их веса, пространства ключей со своими распределениями и
+  транзакции из нескольких шагов. Движки, пул, статистика и экспорт — те же. Встроенная схема
+  prod_sim_N и --seed в этом режиме не трогаются. Пример: workloads/synth_prod.yaml (схема
+  synth_prod_db.py). Нужен pip install pyyaml.
+
+--profile const|ramp|steps|spike|knee — как меняется целевая скорость за --duration:
+  ramp: линейно от --profile_start до --ops_per_sec за весь --duration;
+  steps: от --profile_start ступенями +--step_size каждые --step_hold сек, не выше --ops_per_sec;
+  spike: --ops_per_sec, но каждые --spike_every сек на --spike_len сек поднимается до --spike_rate;
+  knee: ступени как у steps, но без потолка; после каждой ступени смотрим p99 и фактическую скорость.
+    Как только p99 > --p99_threshold_ms, есть ошибки или сервер не дотягивает до 90% цели —
+    останавливаемся и печатаем максимальную устойчивую скорость (последняя прошедшая ступень).
+
+Фазы операции: в отчёте для каждой операции время раскладывается на acquire (ожидание пула
+  или установка соединения), execute (запросы, включая PREPARE) и commit; остаток — клиентская
+  сторона (генерация параметров, fetch, GIL). Если acquire растёт, а execute нет — упираемся в пул.
+--connect_per_op — без пула: на каждую операцию новое соединение, после неё close(). Так видно
+  стоимость установки соединения (TCP + auth + backend fork) у клиентов без PgBouncer;
+  в отчёте появляются connects/s и среднее время connect.
+
+--processes N — форкнуть N процессов-симуляторов (у каждого свой пул и свои OpRunner/корутины),
+  координатор сводит их поинтервальные счётчики и гистограммы задержек в один отчёт.
+  --concurrency задаётся на процесс (всего клиентов = processes * concurrency), --ops_per_sec — общий.
 
 pip install psycopg2-binary
 python3 load_test_prod.py --host 185.185.142.217 --port 5432 --user gen_user --password Passwd123 --dbname default_db --concurrency 8 --ops_per_sec 600 --duration 600 --seed
+python3 load_test_prod.py --host 185.185.142.217 --port 5432 --user gen_user --password Passwd123 --dbname default_db --engine async --concurrency 2000 --ops_per_sec 5000 --duration 600
 
 
 """
 
 import argparse
+import asyncio
+import re
+import bisect
+import csv
+import io
+import json
+import multiprocessing
+import queue
 import random
 import string
 import time
 import threading
 import signal
 import sys
-from contextlib import contextmanager
+import uuid
+import weakref
+from contextlib import asynccontextmanager, contextmanager
 from collections import defaultdict
-from datetime import datetime
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 import psycopg2
 from psycopg2 import sql
-from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 from psycopg2.extras import execute_values
 
+try:
+    # PyYAML нужен только для --workload
+    import yaml
+except ImportError:
+    yaml = None
+
+try:
+    # psycopg 3 нужен только для --engine async
+    import psycopg as psycopg3
+    from psycopg import sql as sql3
+    from psycopg_pool import AsyncConnectionPool
+except ImportError:
+    psycopg3 = None
+
 
 # Defaults
 DEFAULT_TABLE_COUNT = 3
@@ -63,6 +148,7 @@ DEFAULT_BATCH_INSERT = 100
 DEFAULT_CONCURRENCY = 4
 DEFAULT_OPS_PER_SEC = 100
 DEFAULT_DURATION = 300
+POOL_WAIT_STEP = 0.5        # сек: как часто ждущий getconn() перепроверяет STOP
 DEFAULT_RATIO = {
     'select_point': 0.35,
     'select_range': 0.10,
@@ -74,9 +160,89 @@ DEFAULT_RATIO = {
     'transaction': 0.03,
     'join': 0.05
 }
+ENGINES = ('thread', 'async')
+PROFILES = ('const', 'ramp', 'steps', 'spike', 'knee')
+KEY_DISTS = ('uniform', 'zipfian', 'hotspot')
+PROTOCOLS = ('simple', 'prepared')
+
+# Запросы операций: {tbl} — имя таблицы, %s — параметры. Из них один раз собираются
+# тексты на каждую таблицу (и PREPARE с $1..$n для --protocol prepared).
+OP_SQL = {
+    'bounds': "SELECT min(id), max(id) FROM {tbl}",
+    'select_point': "SELECT id, key_text, data, value FROM {tbl} WHERE id = %s",
+    'select_range': "SELECT id,key_text,value FROM {tbl} WHERE value BETWEEN %s AND %s LIMIT 200",
+    'insert': "INSERT INTO {tbl} (key_text, data, value) VALUES (%s,%s,%s) RETURNING id",
+    'update': "UPDATE {tbl} SET data = %s, value = %s WHERE id = %s",
+    'delete': "DELETE FROM {tbl} WHERE id = %s",
+    'upsert': """
+        INSERT INTO {tbl} (key_text, data, value) VALUES (%s,%s,%s)
+        ON CONFLICT (key_text) DO UPDATE SET data = EXCLUDED.data, value = EXCLUDED.value
+        RETURNING id
+    """,
+    # для --write_batch > 1: конфликт ключа не должен ронять всю пачку
+    'insert_group': "INSERT INTO {tbl} (key_text, data, value) VALUES (%s,%s,%s) ON CONFLICT (key_text) DO NOTHING RETURNING id",
+    'tx_lock': "SELECT id, value FROM {tbl} WHERE id = %s FOR UPDATE",
+    'tx_update': "UPDATE {tbl} SET value = value + 1 WHERE id = %s",
+    'tx_insert': "INSERT INTO {tbl} (key_text, data, value) VALUES (%s,%s,%s)",
+    'join': """
+        SELECT m.id, m.key_text, l.name, l.meta
+        FROM {tbl} m
+        JOIN lookup_table l ON (l.id = (m.id %% 200) + 1)
+        WHERE m.value BETWEEN %s AND %s
+        LIMIT 100
+    """,
+}
+
+
+def named_to_dollar_params(query):
+    """%(name)s -> $1, $2, ... по порядку первого появления. Возвращает (текст, имена параметров)."""
+    names = []
+
+    def sub(m):
+        if m.group(0) == '%%':
+            return '%'
+        if m.group(1) not in names:
+            names.append(m.group(1))
+        return f"${names.index(m.group(1)) + 1}"
+
+    return re.sub(r'%%|%\((\w+)\)s', sub, query), names
+
+
+def to_dollar_params(query):
+    """%s -> $1, $2, ... (и %% -> %) — текст для PREPARE."""
+    counter = iter(range(1, 1000))
+    return re.sub(r'%[s%]', lambda m: '%' if m.group(0) == '%%' else f"${next(counter)}", query)
+
 
 STOP = threading.Event()
 
+# Границы корзин гистограммы задержек (мс): геометрическая сетка 0.05 мс .. ~60 с с шагом 15%.
+# Фиксированная сетка позволяет складывать гистограммы разных процессов поэлементно.
+HIST_BOUNDS_MS = []
+_b = 0.05
+while _b < 60000:
+    HIST_BOUNDS_MS.append(_b)
+    _b *= 1.15
+del _b
+REPORT_EVERY = 5
+DEFAULT_PROMETHEUS_ADDR = '127.0.0.1'   # /metrics только локально; наружу — явным --prometheus_addr
+# фазы операции, которые DBWorker/AsyncDBWorker замеряют через SafeStats.add_timer
+# (acquire пишется как pool_wait или connect — в зависимости от пула)
+PHASES = ('execute', 'commit')
+
+# ключ из --ratios -> метод DBWorker/AsyncDBWorker
+OP_METHODS = {
+    'select_point': 'op_select_point',
+    'select_range': 'op_select_range',
+    'insert': 'op_insert_single',
+    'batch_insert': 'op_batch_insert',
+    'update': 'op_update',
+    'delete': 'op_delete',
+    'upsert': 'op_upsert',
+    'transaction': 'op_transaction',
+    'join': 'op_join',
+}
+
 
 def now_ts():
     return datetime.utcnow().isoformat()
@@ -86,40 +252,636 @@ def rand_string(n=12):
     return ''.join(random.choices(string.ascii_letters + string.digits, k=n))
 
 
+class IterableIO(io.TextIOBase):
+    """Итератор строк как file-like объект для COPY FROM STDIN (как в gen_big_size.py)."""
+
+    def __init__(self, iterator):
+        self.iterator = iterator
+
+    def readable(self):
+        return True
+
+    def read(self, n=-1):
+        try:
+            return next(self.iterator)
+        except StopIteration:
+            return ""
+
+    def readline(self, limit=-1):
+        return self.read()
+
+
+SEED_KEY_PREFIX = 'seed'
+SEED_CHUNK_ROWS = 10000
+
+
+def seed_rows(t, first, count, rows_per_table):
+    """
+    Строки для COPY пачками по SEED_CHUNK_ROWS. Ключи seed{first..first+count-1} с нулями слева,
+    чтобы лексикографический порядок совпадал с числовым; data/value — от генератора с
+    фиксированным seed, так что одинаковый прогон даёт одинаковые данные.
+    """
+    rng = random.Random(f"{t}:{first}")
+    hi = max(1, rows_per_table * 10)
+    end = first + count
+    for start in range(first, end, SEED_CHUNK_ROWS):
+        yield "".join(f"{SEED_KEY_PREFIX}{n:012d}\t{rng.randbytes(32).hex()}\t{rng.randint(1, hi)}\n"
+                      for n in range(start, min(end, start + SEED_CHUNK_ROWS)))
+
+
+def hist_percentile(hist, q):
+    """Верхняя граница корзины (мс), в которую попадает квантиль q (0..1)."""
+    total = sum(hist)
+    if total <= 0:
+        return 0.0
+    rank = q * total
+    acc = 0
+    for i, c in enumerate(hist):
+        acc += c
+        if acc >= rank:
+            return HIST_BOUNDS_MS[i] if i < len(HIST_BOUNDS_MS) else float('inf')
+    return float('inf')
+
+
 class SafeStats:
     def __init__(self):
         self.lock = threading.Lock()
         self.data = defaultdict(int)
         self.by_type = defaultdict(int)
+        self.errors_by_type = defaultdict(int)
+        self.timers = defaultdict(float)
         self.time_total = 0.0
+        self.hist = [0] * (len(HIST_BOUNDS_MS) + 1)
 
     def incr(self, key, n=1):
         with self.lock:
             self.data[key] += n
 
     def add_time(self, t):
+        idx = bisect.bisect_left(HIST_BOUNDS_MS, t * 1000.0)
         with self.lock:
             self.time_total += t
+            self.hist[idx] += 1
+
+    def incr_type(self, opname, n=1):
+        with self.lock:
+            self.by_type[opname] += n
+
+    def incr_error(self, opname):
+        with self.lock:
+            self.data['errors'] += 1
+            self.errors_by_type[opname] += 1
 
-    def incr_type(self, opname):
+    def add_timer(self, name, t):
+        """Суммарное время фазы (например, ожидание пула) + число замеров в data[name + '_count']."""
         with self.lock:
-            self.by_type[opname] += 1
+            self.timers[name] += t
+            self.data[name + '_count'] += 1
 
     def snapshot(self):
         with self.lock:
             # shallow copy for reporting
             return dict(self.data), dict(self.by_type), float(self.time_total)
 
+    def hist_snapshot(self):
+        with self.lock:
+            return list(self.hist)
+
+    def extra_snapshot(self):
+        with self.lock:
+            return dict(self.errors_by_type), dict(self.timers)
+
+    def drain(self):
+        """Забрать накопленное с момента прошлого drain() (дельта для координатора) и обнулить."""
+        with self.lock:
+            delta = {
+                'data': dict(self.data),
+                'by_type': dict(self.by_type),
+                'errors_by_type': dict(self.errors_by_type),
+                'timers': dict(self.timers),
+                'time_total': self.time_total,
+                'hist': self.hist,
+            }
+            self.data = defaultdict(int)
+            self.by_type = defaultdict(int)
+            self.errors_by_type = defaultdict(int)
+            self.timers = defaultdict(float)
+            self.time_total = 0.0
+            self.hist = [0] * (len(HIST_BOUNDS_MS) + 1)
+        return delta
+
+    def merge(self, delta):
+        with self.lock:
+            for k, v in delta['data'].items():
+                self.data[k] += v
+            for k, v in delta['by_type'].items():
+                self.by_type[k] += v
+            for k, v in delta['errors_by_type'].items():
+                self.errors_by_type[k] += v
+            for k, v in delta['timers'].items():
+                self.timers[k] += v
+            self.time_total += delta['time_total']
+            for i, c in enumerate(delta['hist']):
+                self.hist[i] += c
+
+
+class IntervalReporter:
+    """Считает метрики за интервал между двумя вызовами tick() по накопительной SafeStats."""
+
+    def __init__(self, stats, start_time, rate=None):
+        self.stats = stats
+        self.rate = rate
+        self.start_time = start_time
+        self.prev_time = start_time
+        self.prev_data, self.prev_by_type, self.prev_time_total = {}, {}, 0.0
+        self.prev_errors, self.prev_timers = {}, {}
+        self.prev_hist = stats.hist_snapshot()
+
+    def tick(self, now):
+        data, by_type, time_total = self.stats.snapshot()
+        errors_by_type, timers = self.stats.extra_snapshot()
+        hist = self.stats.hist_snapshot()
+        interval_hist = [c - p for c, p in zip(hist, self.prev_hist)]
+        dt = max(1e-9, now - self.prev_time)
+        ops = data.get('ops', 0) - self.prev_data.get('ops', 0)
+        calls = sum(interval_hist)
+        acquires = data.get('pool_wait_count', 0) - self.prev_data.get('pool_wait_count', 0)
+        pool_wait = timers.get('pool_wait', 0.0) - self.prev_timers.get('pool_wait', 0.0)
+        connects = data.get('connect_count', 0) - self.prev_data.get('connect_count', 0)
+        connect = timers.get('connect', 0.0) - self.prev_timers.get('connect', 0.0)
+        phase = {name: timers.get(name, 0.0) - self.prev_timers.get(name, 0.0) for name in PHASES}
+        record = {
+            'ts': now_ts(),
+            'elapsed': round(now - self.start_time, 3),
+            'interval': round(dt, 3),
+            'ops': ops,
+            'ops_per_sec': round(ops / dt, 2),
+            'target_ops_per_sec': round(self.rate.total(), 2) if self.rate is not None else 0.0,
+            'total_ops': data.get('ops', 0),
+            'errors': data.get('errors', 0) - self.prev_data.get('errors', 0),
+            'total_errors': data.get('errors', 0),
+            'avg_latency_ms': round((time_total - self.prev_time_total) / calls * 1000.0, 3) if calls else 0.0,
+            'p50_ms': round(hist_percentile(interval_hist, 0.50), 3),
+            'p95_ms': round(hist_percentile(interval_hist, 0.95), 3),
+            'p99_ms': round(hist_percentile(interval_hist, 0.99), 3),
+            'pool_wait_ms_avg': round(pool_wait / acquires * 1000.0, 3) if acquires else 0.0,
+            'connects_per_sec': round(connects / dt, 2),
+            'connect_ms_avg': round(connect / connects * 1000.0, 3) if connects else 0.0,
+            # среднее время фазы на одну операцию: в сумме с client_ms даёт avg_latency_ms
+            'acquire_ms_per_op': round((pool_wait + connect) / calls * 1000.0, 3) if calls else 0.0,
+            'execute_ms_per_op': round(phase['execute'] / calls * 1000.0, 3) if calls else 0.0,
+            'commit_ms_per_op': round(phase['commit'] / calls * 1000.0, 3) if calls else 0.0,
+            'ops_by_type': {k: v - self.prev_by_type.get(k, 0) for k, v in by_type.items()},
+            'errors_by_type': {k: v - self.prev_errors.get(k, 0) for k, v in errors_by_type.items()},
+        }
+        record['client_ms_per_op'] = round(max(0.0, record['avg_latency_ms'] - record['acquire_ms_per_op']
+                                               - record['execute_ms_per_op'] - record['commit_ms_per_op']), 3)
+        self.prev_time = now
+        self.prev_data, self.prev_by_type, self.prev_time_total = data, by_type, time_total
+        self.prev_errors, self.prev_timers = errors_by_type, timers
+        self.prev_hist = hist
+        return record
+
+
+class MetricsWriter:
+    """Пишет записи IntervalReporter в CSV (по расширению .csv) или JSON lines."""
+
+    BASE_FIELDS = ['ts', 'elapsed', 'interval', 'ops', 'ops_per_sec', 'target_ops_per_sec', 'total_ops', 'errors', 'total_errors',
+                   'avg_latency_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'pool_wait_ms_avg',
+                   'connects_per_sec', 'connect_ms_avg', 'acquire_ms_per_op', 'execute_ms_per_op',
+                   'commit_ms_per_op', 'client_ms_per_op']
+
+    def __init__(self, path, op_names=None):
+        self.path = path
+        # метка колонки -> имя операции в статистике
+        self.op_names = op_names or OP_METHODS
+        self.f = open(path, 'a', newline='')
+        self.csv = None
+        if path.lower().endswith('.csv'):
+            fields = self.BASE_FIELDS + [f"ops_{k}" for k in self.op_names] + [f"errors_{k}" for k in self.op_names]
+            self.csv = csv.DictWriter(self.f, fieldnames=fields)
+            if self.f.tell() == 0:
+                self.csv.writeheader()
+
+    def write(self, record):
+        if self.csv is not None:
+            row = {k: record[k] for k in self.BASE_FIELDS}
+            for k, method in self.op_names.items():
+                row[f"ops_{k}"] = record['ops_by_type'].get(method, 0)
+                row[f"errors_{k}"] = record['errors_by_type'].get(method, 0)
+            self.csv.writerow(row)
+        else:
+            self.f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+class PrometheusExporter:
+    """Минимальный /metrics без prometheus_client: последний интервал + накопительные счётчики."""
+
+    def __init__(self, port, addr=DEFAULT_PROMETHEUS_ADDR):
+        self.lock = threading.Lock()
+        self.body = b""
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                with exporter.lock:
+                    body = exporter.body
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *a):
+                pass
+
+        self.server = ThreadingHTTPServer((addr, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def update(self, record, stats):
+        _, by_type, _ = stats.snapshot()
+        errors_by_type, timers = stats.extra_snapshot()
+        lines = [
+            "# TYPE pgsim_ops_total counter",
+            f"pgsim_ops_total {record['total_ops']}",
+            "# TYPE pgsim_errors_total counter",
+            f"pgsim_errors_total {record['total_errors']}",
+            "# TYPE pgsim_ops_per_second gauge",
+            f"pgsim_ops_per_second {record['ops_per_sec']}",
+            "# TYPE pgsim_target_ops_per_second gauge",
+            f"pgsim_target_ops_per_second {record['target_ops_per_sec']}",
+            "# TYPE pgsim_latency_ms gauge",
+            f'pgsim_latency_ms{{quantile="0.5"}} {record["p50_ms"]}',
+            f'pgsim_latency_ms{{quantile="0.95"}} {record["p95_ms"]}',
+            f'pgsim_latency_ms{{quantile="0.99"}} {record["p99_ms"]}',
+            "# TYPE pgsim_pool_wait_seconds_total counter",
+            f"pgsim_pool_wait_seconds_total {timers.get('pool_wait', 0.0):.6f}",
+            "# TYPE pgsim_connects_total counter",
+            f"pgsim_connects_total {stats.snapshot()[0].get('connect_count', 0)}",
+            "# TYPE pgsim_phase_seconds_total counter",
+            f'pgsim_phase_seconds_total{{phase="acquire"}} {timers.get("pool_wait", 0.0) + timers.get("connect", 0.0):.6f}',
+            f'pgsim_phase_seconds_total{{phase="execute"}} {timers.get("execute", 0.0):.6f}',
+            f'pgsim_phase_seconds_total{{phase="commit"}} {timers.get("commit", 0.0):.6f}',
+            "# TYPE pgsim_op_total counter",
+        ]
+        lines += [f'pgsim_op_total{{op="{k}"}} {v}' for k, v in sorted(by_type.items())]
+        lines.append("# TYPE pgsim_op_errors_total counter")
+        lines += [f'pgsim_op_errors_total{{op="{k}"}} {v}' for k, v in sorted(errors_by_type.items())]
+        with self.lock:
+            self.body = ("\n".join(lines) + "\n").encode()
+
+    def close(self):
+        self.server.shutdown()
+
+
+class RateTarget:
+    """
+    Общая целевая скорость (ops/s на все процессы и всех клиентов). Лежит в общей памяти,
+    чтобы координатор мог менять её по профилю нагрузки на лету, а клиенты — читать без блокировок.
+    """
+
+    def __init__(self, total, clients):
+        self.value = multiprocessing.RawValue('d', float(total))
+        self.clients = max(1, clients)
+
+    def set(self, total):
+        self.value.value = float(total)
+
+    def total(self):
+        return self.value.value
+
+    def per_client(self):
+        return self.value.value / self.clients
+
+
+class LoadProfile:
+    """Целевая скорость как функция от времени с начала прогона (для ramp/steps/spike/const)."""
+
+    def __init__(self, kind, target, duration, start=0.0, step_size=0.0, step_hold=30.0,
+                 spike_every=60.0, spike_len=10.0, spike_rate=0.0):
+        self.kind = kind
+        self.target = float(target)
+        self.duration = duration
+        self.start = start or self.target / 10.0
+        self.step_size = step_size or self.target / 10.0 or self.start
+        self.step_hold = max(1.0, step_hold)
+        self.spike_every = max(1.0, spike_every)
+        self.spike_len = spike_len
+        self.spike_rate = spike_rate or self.target * 3.0
+
+    def rate(self, elapsed):
+        if self.kind == 'ramp':
+            if self.duration <= 0:
+                return self.target
+            frac = min(1.0, elapsed / self.duration)
+            return max(1.0, self.start + (self.target - self.start) * frac)
+        if self.kind == 'steps':
+            return max(1.0, min(self.target, self.start + int(elapsed // self.step_hold) * self.step_size))
+        if self.kind == 'spike':
+            return self.spike_rate if (elapsed % self.spike_every) < self.spike_len else self.target
+        return self.target
+
+
+class KneeFinder:
+    """
+    Режим --profile knee: повышаем скорость ступенями и после каждой ступени проверяем её p99,
+    ошибки и фактическую скорость. Первая не прошедшая ступень — «колено».
+    """
+
+    def __init__(self, stats, rate, start, step_size, step_hold, p99_threshold_ms, now):
+        self.stats = stats
+        self.rate = rate
+        self.step_size = step_size
+        self.step_hold = max(2.0, step_hold)
+        # первые 20% ступени — прогрев после смены скорости, в оценку не идут
+        self.warmup = min(5.0, self.step_hold * 0.2)
+        self.p99_threshold_ms = p99_threshold_ms
+        self.best = None
+        self.done = False
+        self.steps = []
+        self._begin_step(start, now)
+
+    def _begin_step(self, target, now):
+        self.rate.set(target)
+        self.step_target = target
+        self.step_started = now
+        self.window = None
+
+    def tick(self, now):
+        """Вызывается из цикла координатора. Возвращает True, когда колено найдено."""
+        if self.done:
+            return True
+        if self.window is None and now - self.step_started >= self.warmup:
+            data, _, _ = self.stats.snapshot()
+            self.window = (now, data.get('ops', 0), data.get('errors', 0), self.stats.hist_snapshot())
+        if now - self.step_started < self.step_hold or self.window is None:
+            return False
+        w_start, ops0, errors0, hist0 = self.window
+        data, _, _ = self.stats.snapshot()
+        hist = [c - p for c, p in zip(self.stats.hist_snapshot(), hist0)]
+        achieved = (data.get('ops', 0) - ops0) / max(1e-9, now - w_start)
+        errors = data.get('errors', 0) - errors0
+        p99 = hist_percentile(hist, 0.99)
+        ok = p99 <= self.p99_threshold_ms and errors == 0 and achieved >= 0.9 * self.step_target
+        self.steps.append({'target': self.step_target, 'achieved': round(achieved, 2), 'p99_ms': round(p99, 3),
+                           'errors': errors, 'ok': ok})
+        print(f"[{now_ts()}] knee step target={self.step_target:.0f} achieved={achieved:.2f} ops/s "
+              f"p99={p99:.2f}ms errors={errors} -> {'ok' if ok else 'KNEE'}")
+        if not ok:
+            self.done = True
+            return True
+        self.best = self.steps[-1]
+        self._begin_step(self.step_target + self.step_size, now)
+        return False
+
+
+class KeyIndex:
+    """
+    Границы id по таблицам в памяти процесса. Даёт id для point-операций по выбранному
+    распределению, чтобы они шли по первичному ключу, а не через ORDER BY random().
+    """
+
+    def __init__(self, table_names, dist='uniform', zipf_theta=0.99, hot_fraction=0.2, hot_ops=0.8, refresh_every=10.0):
+        if dist not in KEY_DISTS:
+            raise ValueError(f"Unknown key distribution: {dist}")
+        self.lock = threading.Lock()
+        self.dist = dist
+        self.zipf_theta = zipf_theta
+        self.hot_fraction = min(1.0, max(0.0, hot_fraction))
+        self.hot_ops = min(1.0, max(0.0, hot_ops))
+        self.refresh_every = refresh_every
+        self.bounds = {t: (1, 0) for t in table_names}
+        self.refreshed_at = {t: 0.0 for t in table_names}
+
+    def __getstate__(self):
+        # Lock не пиклится — нужно, когда Workload уезжает в дочерний процесс не через fork
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def stale(self, table):
+        return time.time() - self.refreshed_at[table] >= self.refresh_every
+
+    def set_bounds(self, table, min_id, max_id):
+        with self.lock:
+            self.bounds[table] = (min_id or 1, max_id or 0)
+            self.refreshed_at[table] = time.time()
+
+    def note_insert(self, table, new_id):
+        with self.lock:
+            lo, hi = self.bounds[table]
+            if new_id > hi:
+                self.bounds[table] = (lo, new_id)
+
+    def _rank(self, n):
+        # ранг 1..n, ранг 1 — самый горячий ключ
+        if self.dist == 'zipfian':
+            u = random.random()
+            theta = self.zipf_theta
+            # обратная функция непрерывного степенного закона на [1, n] — приближение Zipf без zeta(n)
+            if abs(theta - 1.0) < 1e-9:
+                r = n ** u
+            else:
+                r = ((n ** (1.0 - theta) - 1.0) * u + 1.0) ** (1.0 / (1.0 - theta))
+            return min(n, max(1, int(r)))
+        if self.dist == 'hotspot':
+            hot_n = max(1, int(n * self.hot_fraction))
+            if hot_n >= n or random.random() < self.hot_ops:
+                return random.randint(1, hot_n)
+            return random.randint(hot_n + 1, n)
+        return random.randint(1, n)
+
+    def pick(self, table):
+        """id из текущих границ или None, если таблица пуста."""
+        lo, hi = self.bounds[table]
+        if hi < lo:
+            return None
+        # горячими считаем самые свежие строки
+        return hi - self._rank(hi - lo + 1) + 1
+
+
+class PoolStopped(Exception):
+    """getconn() прерван остановкой теста (STOP), пока ждал свободное соединение."""
+
+
+class ConnectionPool:
+    """
+    Пул psycopg2-соединений для потоков. В отличие от ThreadedConnectionPool, который при
+    исчерпании сразу бросает PoolError, getconn() ждёт свободное соединение — это ожидание
+    и есть pool_wait в отчёте. Соединения создаются лениво до size; вернувшееся посреди
+    транзакции откатывается, сломанное закрывается и освобождает место. Ожидание — на
+    Condition с таймаутом: после STOP ждущие выходят с PoolStopped.
+    """
+
+    def __init__(self, conn_kwargs, size):
+        self.conn_kwargs = conn_kwargs
+        self.size = max(1, size)
+        self.idle = []
+        self.cond = threading.Condition()
+        self.created = 0
+
+    def getconn(self):
+        with self.cond:
+            while True:
+                if self.idle:
+                    return self.idle.pop()
+                if self.created < self.size:
+                    self.created += 1
+                    break
+                if STOP.is_set():
+                    raise PoolStopped("load test stopped")
+                self.cond.wait(POOL_WAIT_STEP)
+        try:
+            return psycopg2.connect(**self.conn_kwargs)
+        except Exception:
+            self._release_slot()
+            raise
+
+    def _release_slot(self):
+        with self.cond:
+            self.created -= 1
+            self.cond.notify()
+
+    def putconn(self, conn):
+        try:
+            if not conn.closed and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except Exception:
+            pass
+        if conn.closed or conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            self._release_slot()
+            return
+        with self.cond:
+            self.idle.append(conn)
+            self.cond.notify()
+
+    def closeall(self):
+        with self.cond:
+            idle, self.idle = self.idle, []
+            self.created -= len(idle)
+            self.cond.notify_all()
+        for conn in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+class ConnectPerOpPool:
+    """Тот же интерфейс, что у ConnectionPool, но getconn() каждый раз открывает новое соединение."""
+
+    # DBWorker.conn() пишет время получения соединения в этот таймер вместо pool_wait
+    acquire_timer = 'connect'
+
+    def __init__(self, conn_kwargs):
+        self.conn_kwargs = conn_kwargs
+
+    def getconn(self):
+        return psycopg2.connect(**self.conn_kwargs)
+
+    def putconn(self, conn):
+        conn.close()
+
+    def closeall(self):
+        pass
+
+
+class AsyncConnectPerOpPool:
+    """--connect_per_op для --engine async: интерфейс AsyncConnectionPool без пула."""
+
+    acquire_timer = 'connect'
+
+    def __init__(self, conn_kwargs):
+        self.conn_kwargs = conn_kwargs
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    @asynccontextmanager
+    async def connection(self):
+        conn = await psycopg3.AsyncConnection.connect(**self.conn_kwargs)
+        try:
+            yield conn
+        finally:
+            await conn.close()
+
 
 class DBWorker:
-    def __init__(self, pool, table_names, batch_insert=100):
+    def __init__(self, pool, table_names, batch_insert=100, keys=None, protocol='simple', write_batch=1, stats=None):
         self.pool = pool
         self.table_names = table_names
         self.batch_insert = batch_insert
+        self.keys = keys or KeyIndex(table_names)
+        self.protocol = protocol
+        self.write_batch = max(1, write_batch)
+        self.stats = stats
+        self.queries = {}
+        # соединение -> имена уже подготовленных на нём statement'ов
+        self.prepared = weakref.WeakKeyDictionary()
+        self.prepared_lock = threading.Lock()
+
+    def query(self, cur, name, t):
+        """Текст запроса OP_SQL[name] для таблицы t; собирается один раз и кэшируется."""
+        q = self.queries.get((name, t))
+        if q is None:
+            q = sql.SQL(OP_SQL[name]).format(tbl=sql.Identifier(t)).as_string(cur)
+            self.queries[(name, t)] = q
+        return q
+
+    @contextmanager
+    def timed(self, phase):
+        """Время блока — в SafeStats.timers[phase] (фазы execute/commit в отчёте)."""
+        t0 = time.time()
+        try:
+            yield
+        finally:
+            if self.stats is not None:
+                self.stats.add_timer(phase, time.time() - t0)
+
+    def run(self, cur, name, t, params=()):
+        with self.timed('execute'):
+            if self.protocol != 'prepared':
+                cur.execute(self.query(cur, name, t), params)
+                return
+            stmt = f"{name}_{t}"
+            with self.prepared_lock:
+                done = self.prepared.setdefault(cur.connection, set())
+            if stmt not in done:
+                cur.execute(f"PREPARE {stmt} AS {to_dollar_params(self.query(cur, name, t))}")
+                done.add(stmt)
+            if params:
+                cur.execute(f"EXECUTE {stmt} ({','.join(['%s'] * len(params))})", params)
+            else:
+                cur.execute(f"EXECUTE {stmt}")
+
+    def commit(self, conn):
+        with self.timed('commit'):
+            conn.commit()
 
     @contextmanager
     def conn(self):
+        t0 = time.time()
         conn = self.pool.getconn()
+        if self.stats is not None:
+            self.stats.add_timer(getattr(self.pool, 'acquire_timer', 'pool_wait'), time.time() - t0)
         try:
             yield conn
         finally:
@@ -169,36 +931,76 @@ class DBWorker:
             if cnt < 200:
                 vals = [(f"name_{i}", f"meta_{rand_string(8)}") for i in range(1, 401)]
                 execute_values(cur, "INSERT INTO lookup_table (name, meta) VALUES %s ON CONFLICT (name) DO NOTHING;", vals)
+            conn.commit()
+            cur.close()
 
-            # seed main tables using execute_values
-            for t in self.table_names:
-                cur.execute(sql.SQL("SELECT count(*) FROM {tbl};").format(tbl=sql.Identifier(t)))
-                existing = cur.fetchone()[0]
-                to_insert = max(0, rows_per_table - existing)
-                if to_insert <= 0:
-                    continue
-                batch_size = 500
-                while to_insert > 0:
-                    cur_batch = min(batch_size, to_insert)
-                    vals = [(f"k_{random.randint(1, rows_per_table*10)}", rand_string(64), random.randint(1, rows_per_table*10)) for _ in range(cur_batch)]
-                    q = sql.SQL("INSERT INTO {tbl} (key_text, data, value) VALUES %s ON CONFLICT (key_text) DO NOTHING;")
-                    cur.execute(sql.SQL("SELECT 1"))  # noop to ensure cursor is alive for execute_values
-                    execute_values(cur, q.as_string(cur), vals, template=None, page_size=100)
-                    to_insert -= cur_batch
+        # основные таблицы — параллельно, по соединению из пула на таблицу
+        errors = []
+
+        def seed_one(t):
+            try:
+                self.seed_table(t, rows_per_table)
+            except Exception as e:
+                errors.append((t, e))
+
+        threads = [threading.Thread(target=seed_one, args=(t,), name=f"seed_{t}") for t in self.table_names]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        if errors:
+            t, e = errors[0]
+            raise RuntimeError(f"seeding {t} failed: {e!r}") from e
+
+    def seed_table(self, t, rows_per_table):
+        """Догрузить таблицу t ровно до rows_per_table строк одним COPY, индекс по value — после."""
+        tbl = sql.Identifier(t)
+        idx = sql.Identifier(f"{t}_value_idx")
+        with self.conn() as conn:
+            cur = conn.cursor()
+            cur.execute(sql.SQL("SELECT count(*) FROM {tbl};").format(tbl=tbl))
+            existing = cur.fetchone()[0]
+            to_insert = max(0, rows_per_table - existing)
+            if to_insert <= 0:
+                cur.close()
+                return 0
+            # последний seed-ключ: диапазонное условие идёт по UNIQUE-индексу key_text, без LIKE
+            cur.execute(sql.SQL("SELECT key_text FROM {tbl} WHERE key_text BETWEEN %s AND %s "
+                                "ORDER BY key_text DESC LIMIT 1;").format(tbl=tbl),
+                        (SEED_KEY_PREFIX + '0' * 12, SEED_KEY_PREFIX + '9' * 12))
+            row = cur.fetchone()
+            first = int(row[0][len(SEED_KEY_PREFIX):]) + 1 if row else 1
+            t0 = time.time()
+            cur.execute(sql.SQL("DROP INDEX IF EXISTS {idx};").format(idx=idx))
+            copy_sql = sql.SQL("COPY {tbl} (key_text, data, value) FROM STDIN").format(tbl=tbl)
+            cur.copy_expert(copy_sql.as_string(cur), IterableIO(seed_rows(t, first, to_insert, rows_per_table)))
+            t_copy = time.time() - t0
+            cur.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {idx} ON {tbl} (value);").format(idx=idx, tbl=tbl))
             conn.commit()
             cur.close()
+        elapsed = time.time() - t0
+        print(f"[{now_ts()}] Seeded {t}: +{to_insert} rows (copy {t_copy:.1f}s, {to_insert / max(t_copy, 1e-9):.0f} rows/s; "
+              f"with value index {elapsed:.1f}s)")
+        return to_insert
+
+    def pick_id(self, cur, t):
+        if self.keys.stale(t):
+            # min/max по первичному ключу — два index-only прохода по краям, без сортировки
+            self.run(cur, 'bounds', t)
+            lo, hi = cur.fetchone()
+            self.keys.set_bounds(t, lo, hi)
+        return self.keys.pick(t)
 
     # Operation implementations
     def op_select_point(self):
         t = random.choice(self.table_names)
         with self.conn() as conn:
             cur = conn.cursor()
-            cur.execute(sql.SQL("SELECT id FROM {tbl} ORDER BY random() LIMIT 1").format(tbl=sql.Identifier(t)))
-            row = cur.fetchone()
-            if not row:
+            row_id = self.pick_id(cur, t)
+            if row_id is None:
                 cur.close()
                 return
-            cur.execute(sql.SQL("SELECT id, key_text, data, value FROM {tbl} WHERE id = %s").format(tbl=sql.Identifier(t)), (row[0],))
+            self.run(cur, 'select_point', t, (row_id,))
             _ = cur.fetchone()
             cur.close()
 
@@ -208,72 +1010,89 @@ class DBWorker:
             cur = conn.cursor()
             low = random.randint(1, 1000)
             high = low + random.randint(1, 200)
-            cur.execute(sql.SQL("SELECT id,key_text,value FROM {tbl} WHERE value BETWEEN %s AND %s LIMIT 200").format(tbl=sql.Identifier(t)), (low, high))
+            self.run(cur, 'select_range', t, (low, high))
             _ = cur.fetchall()
             cur.close()
 
+    def write_group(self, name, t, make_params):
+        """write_batch строк одной транзакцией и одним COMMIT. Возвращает число строк (для ops)."""
+        new_ids = []
+        with self.conn() as conn:
+            cur = conn.cursor()
+            for _ in range(self.write_batch):
+                self.run(cur, name, t, make_params())
+                row = cur.fetchone()
+                if row:
+                    new_ids.append(row[0])
+            self.commit(conn)
+            cur.close()
+        if new_ids:
+            self.keys.note_insert(t, max(new_ids))
+        return self.write_batch
+
     def op_insert_single(self):
         t = random.choice(self.table_names)
+        if self.write_batch > 1:
+            return self.write_group('insert_group', t, lambda: (f"k_{random.randint(1,1000000)}", rand_string(128), random.randint(1,1000000)))
         with self.conn() as conn:
             cur = conn.cursor()
-            cur.execute(sql.SQL("INSERT INTO {tbl} (key_text, data, value) VALUES (%s,%s,%s) RETURNING id").format(tbl=sql.Identifier(t)),
-                        (f"k_{random.randint(1,1000000)}", rand_string(128), random.randint(1,1000000)))
-            _ = cur.fetchone()
-            conn.commit()
+            self.run(cur, 'insert', t, (f"k_{random.randint(1,1000000)}", rand_string(128), random.randint(1,1000000)))
+            new_id = cur.fetchone()[0]
+            self.commit(conn)
+            self.keys.note_insert(t, new_id)
             cur.close()
 
     def op_batch_insert(self, batch_size=None):
+        # размер VALUES меняется от вызова к вызову — всегда простой протокол
         batch_size = batch_size or self.batch_insert
         t = random.choice(self.table_names)
         with self.conn() as conn:
             cur = conn.cursor()
             vals = [(f"k_{random.randint(1,1000000)}", rand_string(64), random.randint(1,1000000)) for _ in range(batch_size)]
             q = sql.SQL("INSERT INTO {tbl} (key_text, data, value) VALUES %s ON CONFLICT (key_text) DO NOTHING;").format(tbl=sql.Identifier(t))
-            execute_values(cur, q.as_string(cur), vals, template=None, page_size=100)
-            conn.commit()
+            with self.timed('execute'):
+                execute_values(cur, q.as_string(cur), vals, template=None, page_size=100)
+            self.commit(conn)
             cur.close()
 
     def op_update(self):
         t = random.choice(self.table_names)
         with self.conn() as conn:
             cur = conn.cursor()
-            cur.execute(sql.SQL("SELECT id FROM {tbl} ORDER BY random() LIMIT 1").format(tbl=sql.Identifier(t)))
-            row = cur.fetchone()
-            if not row:
+            row_id = self.pick_id(cur, t)
+            if row_id is None:
                 cur.close()
                 return
             new_data = rand_string(80)
             new_val = random.randint(1, 1000000)
-            cur.execute(sql.SQL("UPDATE {tbl} SET data = %s, value = %s WHERE id = %s").format(tbl=sql.Identifier(t)), (new_data, new_val, row[0]))
-            conn.commit()
+            self.run(cur, 'update', t, (new_data, new_val, row_id))
+            self.commit(conn)
             cur.close()
 
     def op_delete(self):
         t = random.choice(self.table_names)
         with self.conn() as conn:
             cur = conn.cursor()
-            cur.execute(sql.SQL("DELETE FROM {tbl} WHERE id IN (SELECT id FROM {tbl} ORDER BY random() LIMIT 1)").format(tbl=sql.Identifier(t)))
-            conn.commit()
+            row_id = self.pick_id(cur, t)
+            if row_id is None:
+                cur.close()
+                return
+            self.run(cur, 'delete', t, (row_id,))
+            self.commit(conn)
             cur.close()
 
     def op_upsert(self):
         t = random.choice(self.table_names)
+        if self.write_batch > 1:
+            return self.write_group('upsert', t, lambda: (f"unique_k_{random.randint(1,2000000)}", rand_string(64), random.randint(1,1000000)))
         key = f"unique_k_{random.randint(1,2000000)}"
         with self.conn() as conn:
             cur = conn.cursor()
-            cur.execute(
-                sql.SQL(
-                    """
-                    INSERT INTO {tbl} (key_text, data, value) VALUES (%s,%s,%s)
-                    ON CONFLICT (key_text) DO UPDATE SET data = EXCLUDED.data, value = EXCLUDED.value
-                    RETURNING id;
-                    """
-                ).format(tbl=sql.Identifier(t)),
-                (key, rand_string(64), random.randint(1,1000000))
-            )
-            _ = cur.fetchone()
-            conn.commit()
+            self.run(cur, 'upsert', t, (key, rand_string(64), random.randint(1,1000000)))
+            new_id = cur.fetchone()[0]
+            self.commit(conn)
             cur.close()
+            self.keys.note_insert(t, new_id)
 
     def op_transaction(self):
         t = random.choice(self.table_names)
@@ -281,14 +1100,17 @@ class DBWorker:
             cur = conn.cursor()
             try:
                 cur.execute("BEGIN;")
-                cur.execute(sql.SQL("SELECT id, value FROM {tbl} ORDER BY random() LIMIT 1 FOR UPDATE").format(tbl=sql.Identifier(t)))
-                r = cur.fetchone()
+                row_id = self.pick_id(cur, t)
+                r = None
+                if row_id is not None:
+                    self.run(cur, 'tx_lock', t, (row_id,))
+                    r = cur.fetchone()
                 if r:
-                    cur.execute(sql.SQL("UPDATE {tbl} SET value = value + 1 WHERE id = %s").format(tbl=sql.Identifier(t)), (r[0],))
+                    self.run(cur, 'tx_update', t, (r[0],))
                 else:
-                    cur.execute(sql.SQL("INSERT INTO {tbl} (key_text, data, value) VALUES (%s,%s,%s)").format(tbl=sql.Identifier(t)),
-                                (f"k_{random.randint(1,1000000)}", rand_string(40), 1))
-                cur.execute("COMMIT;")
+                    self.run(cur, 'tx_insert', t, (f"k_{random.randint(1,1000000)}", rand_string(40), 1))
+                with self.timed('commit'):
+                    cur.execute("COMMIT;")
             except Exception:
                 cur.execute("ROLLBACK;")
                 raise
@@ -299,78 +1121,79 @@ class DBWorker:
         t = random.choice(self.table_names)
         with self.conn() as conn:
             cur = conn.cursor()
-            cur.execute(sql.SQL(
-                """
-                SELECT m.id, m.key_text, l.name, l.meta
-                FROM {tbl} m
-                JOIN lookup_table l ON (l.id = (m.id % 200) + 1)
-                WHERE m.value BETWEEN %s AND %s
-                LIMIT 100;
-                """
-            ).format(tbl=sql.Identifier(t)), (random.randint(1,10000), random.randint(10001,20000)))
+            self.run(cur, 'join', t, (random.randint(1,10000), random.randint(10001,20000)))
             _ = cur.fetchall()
             cur.close()
 
 
+def build_ops_map(dbworker):
+    # одинаковые имена op_* у DBWorker и AsyncDBWorker, поэтому карта общая
+    return {k: getattr(dbworker, method) for k, method in OP_METHODS.items()}
+
+
+def build_cdf(ratios):
+    keys = list(ratios.keys())
+    weights = [ratios[k] for k in keys]
+    total = sum(weights)
+    if total <= 0:
+        raise ValueError("Ratios sum must be > 0")
+    cdf = []
+    acc = 0.0
+    for k in keys:
+        acc += ratios[k] / total
+        cdf.append((acc, k))
+    return cdf
+
+
+def pick_op(ops_map, cdf):
+    r = random.random()
+    for thresh, k in cdf:
+        if r <= thresh:
+            return ops_map[k]
+    return ops_map[cdf[-1][1]]
+
+
 class OpRunner(threading.Thread):
-    def __init__(self, name, dbworker, ratios, ops_per_sec, stats):
+    def __init__(self, name, dbworker, ratios, rate, stats, ops_map=None):
         super().__init__(daemon=True)
         self.name = name
         self.dbworker = dbworker
         self.ratios = ratios
-        self.ops_per_sec = ops_per_sec
+        self.rate = rate
         self.stats = stats
-        self.ops_map = {
-            'select_point': dbworker.op_select_point,
-            'select_range': dbworker.op_select_range,
-            'insert': dbworker.op_insert_single,
-            'batch_insert': dbworker.op_batch_insert,
-            'update': dbworker.op_update,
-            'delete': dbworker.op_delete,
-            'upsert': dbworker.op_upsert,
-            'transaction': dbworker.op_transaction,
-            'join': dbworker.op_join
-        }
-        keys = list(ratios.keys())
-        weights = [ratios[k] for k in keys]
-        total = sum(weights)
-        if total <= 0:
-            raise ValueError("Ratios sum must be > 0")
-        self.cdf = []
-        acc = 0.0
-        for k in keys:
-            acc += ratios[k] / total
-            self.cdf.append((acc, k))
+        self.ops_map = ops_map or build_ops_map(dbworker)
+        self.cdf = build_cdf(ratios)
 
     def choose_op(self):
-        r = random.random()
-        for thresh, k in self.cdf:
-            if r <= thresh:
-                return self.ops_map[k]
-        return self.ops_map[self.cdf[-1][1]]
+        return pick_op(self.ops_map, self.cdf)
 
     def run(self):
-        sleep_interval = 0.0
-        if self.ops_per_sec > 0:
-            sleep_interval = 1.0 / self.ops_per_sec
         last = time.time()
         while not STOP.is_set():
+            # скорость может меняться по профилю нагрузки — перечитываем каждый цикл
+            per_client = self.rate.per_client()
+            sleep_interval = 1.0 / per_client if per_client > 0 else 0.0
+            op = self.choose_op()
+            n = 1
             try:
-                op = self.choose_op()
                 start = time.time()
-                op()
+                # операции с --write_batch возвращают число записанных строк
+                n = op() or 1
                 dur = time.time() - start
-                self.stats.incr('ops', 1)
-                self.stats.incr_type(op.__name__)
+                self.stats.incr('ops', n)
+                self.stats.incr_type(op.__name__, n)
                 self.stats.add_time(dur)
+            except PoolStopped:
+                break
             except Exception as e:
-                self.stats.incr('errors', 1)
+                self.stats.incr_error(op.__name__)
                 # print occasional errors
                 if self.stats.data['errors'] % 10 == 1:
                     print(f"[{now_ts()}] Worker {self.name} error: {repr(e)}", file=sys.stderr)
-            # pacing
+            # pacing: вызов на n строк «стоит» n интервалов — иначе с --write_batch K
+            # строк/с было бы до K·ops_per_sec, мимо цели RateTarget/KneeFinder
             if sleep_interval > 0:
-                end = last + sleep_interval
+                end = last + sleep_interval * n
                 to_sleep = end - time.time()
                 if to_sleep > 0:
                     STOP.wait(to_sleep)
@@ -379,6 +1202,548 @@ class OpRunner(threading.Thread):
                 STOP.wait(0.001)
 
 
+class AsyncDBWorker:
+    """Те же операции, что и в DBWorker, но поверх psycopg 3 AsyncConnectionPool."""
+
+    def __init__(self, pool, table_names, batch_insert=100, keys=None, protocol='simple', write_batch=1, stats=None):
+        self.pool = pool
+        self.table_names = table_names
+        self.batch_insert = batch_insert
+        self.keys = keys or KeyIndex(table_names)
+        self.write_batch = max(1, write_batch)
+        self.stats = stats
+        # psycopg 3 сам готовит statement на сервере и кэширует его по тексту запроса
+        self.prepare = protocol == 'prepared'
+        self.queries = {}
+
+    @asynccontextmanager
+    async def conn(self):
+        t0 = time.time()
+        async with self.pool.connection() as conn:
+            if self.stats is not None:
+                self.stats.add_timer(getattr(self.pool, 'acquire_timer', 'pool_wait'), time.time() - t0)
+            yield conn
+
+    def add_phase(self, phase, t0):
+        if self.stats is not None:
+            self.stats.add_timer(phase, time.time() - t0)
+
+    async def execute(self, cur, query, params=None):
+        t0 = time.time()
+        try:
+            await cur.execute(query, params, prepare=self.prepare)
+        finally:
+            self.add_phase('execute', t0)
+
+    async def commit(self, conn):
+        t0 = time.time()
+        try:
+            await conn.commit()
+        finally:
+            self.add_phase('commit', t0)
+
+    async def run(self, cur, name, t, params=()):
+        q = self.queries.get((name, t))
+        if q is None:
+            q = sql3.SQL(OP_SQL[name]).format(tbl=sql3.Identifier(t)).as_string(cur)
+            self.queries[(name, t)] = q
+        await self.execute(cur, q, params or None)
+
+    async def pick_id(self, cur, t):
+        if self.keys.stale(t):
+            await self.run(cur, 'bounds', t)
+            lo, hi = await cur.fetchone()
+            self.keys.set_bounds(t, lo, hi)
+        return self.keys.pick(t)
+
+    async def op_select_point(self):
+        t = random.choice(self.table_names)
+        async with self.conn() as conn:
+            async with conn.cursor() as cur:
+                row_id = await self.pick_id(cur, t)
+                if row_id is None:
+                    return
+                await self.run(cur, 'select_point', t, (row_id,))
+                _ = await cur.fetchone()
+
+    async def op_select_range(self):
+        t = random.choice(self.table_names)
+        async with self.conn() as conn:
+            async with conn.cursor() as cur:
+                low = random.randint(1, 1000)
+                high = low + random.randint(1, 200)
+                await self.run(cur, 'select_range', t, (low, high))
+                _ = await cur.fetchall()
+
+    async def write_group(self, name, t, make_params):
+        """write_batch строк в pipeline mode: все запросы и COMMIT уходят одной пачкой."""
+        async with self.conn() as conn:
+            curs = []
+            async with conn.pipeline():
+                for _ in range(self.write_batch):
+                    cur = conn.cursor()
+                    await self.run(cur, name, t, make_params())
+                    curs.append(cur)
+                # в pipeline mode сюда попадает и ожидание результатов всей пачки
+                await self.commit(conn)
+            new_ids = []
+            for cur in curs:
+                row = await cur.fetchone()
+                if row:
+                    new_ids.append(row[0])
+                await cur.close()
+        if new_ids:
+            self.keys.note_insert(t, max(new_ids))
+        return self.write_batch
+
+    async def op_insert_single(self):
+        t = random.choice(self.table_names)
+        if self.write_batch > 1:
+            return await self.write_group('insert_group', t, lambda: (f"k_{random.randint(1,1000000)}", rand_string(128), random.randint(1,1000000)))
+        async with self.conn() as conn:
+            async with conn.cursor() as cur:
+                await self.run(cur, 'insert', t, (f"k_{random.randint(1,1000000)}", rand_string(128), random.randint(1,1000000)))
+                new_id = (await cur.fetchone())[0]
+            await self.commit(conn)
+            self.keys.note_insert(t, new_id)
+
+    async def op_batch_insert(self, batch_size=None):
+        batch_size = batch_size or self.batch_insert
+        t = random.choice(self.table_names)
+        async with self.conn() as conn:
+            async with conn.cursor() as cur:
+                vals = [(f"k_{random.randint(1,1000000)}", rand_string(64), random.randint(1,1000000)) for _ in range(batch_size)]
+                q = sql3.SQL("INSERT INTO {tbl} (key_text, data, value) VALUES (%s,%s,%s) ON CONFLICT (key_text) DO NOTHING").format(tbl=sql3.Identifier(t))
+                # executemany в psycopg 3 сам отправляет пачку через pipeline
+                t0 = time.time()
+                await cur.executemany(q, vals)
+                self.add_phase('execute', t0)
+            await self.commit(conn)
+
+    async def op_update(self):
+        t = random.choice(self.table_names)
+        async with self.conn() as conn:
+            async with conn.cursor() as cur:
+                row_id = await self.pick_id(cur, t)
+                if row_id is None:
+                    return
+                new_data = rand_string(80)
+                new_val = random.randint(1, 1000000)
+                await self.run(cur, 'update', t, (new_data, new_val, row_id))
+            await self.commit(conn)
+
+    async def op_delete(self):
+        t = random.choice(self.table_names)
+        async with self.conn() as conn:
+            async with conn.cursor() as cur:
+                row_id = await self.pick_id(cur, t)
+                if row_id is None:
+                    return
+                await self.run(cur, 'delete', t, (row_id,))
+            await self.commit(conn)
+
+    async def op_upsert(self):
+        t = random.choice(self.table_names)
+        if self.write_batch > 1:
+            return await self.write_group('upsert', t, lambda: (f"unique_k_{random.randint(1,2000000)}", rand_string(64), random.randint(1,1000000)))
+        key = f"unique_k_{random.randint(1,2000000)}"
+        async with self.conn() as conn:
+            async with conn.cursor() as cur:
+                await self.run(cur, 'upsert', t, (key, rand_string(64), random.randint(1,1000000)))
+                new_id = (await cur.fetchone())[0]
+            await self.commit(conn)
+            self.keys.note_insert(t, new_id)
+
+    async def op_transaction(self):
+        t = random.choice(self.table_names)
+        async with self.conn() as conn:
+            # COMMIT явно, а не через conn.transaction(), чтобы он попал в фазу commit
+            try:
+                async with conn.cursor() as cur:
+                    row_id = await self.pick_id(cur, t)
+                    r = None
+                    if row_id is not None:
+                        await self.run(cur, 'tx_lock', t, (row_id,))
+                        r = await cur.fetchone()
+                    if r:
+                        await self.run(cur, 'tx_update', t, (r[0],))
+                    else:
+                        await self.run(cur, 'tx_insert', t, (f"k_{random.randint(1,1000000)}", rand_string(40), 1))
+                await self.commit(conn)
+            except Exception:
+                await conn.rollback()
+                raise
+
+    async def op_join(self):
+        t = random.choice(self.table_names)
+        async with self.conn() as conn:
+            async with conn.cursor() as cur:
+                await self.run(cur, 'join', t, (random.randint(1,10000), random.randint(10001,20000)))
+                _ = await cur.fetchall()
+
+
+class AsyncEngine(threading.Thread):
+    """
+    Крутит asyncio-петлю в отдельном потоке: concurrency корутин делят один
+    AsyncConnectionPool. Для main() выглядит как ещё один runner — отчёты и
+    остановка через STOP работают так же, как для OpRunner.
+    """
+
+    def __init__(self, conn_kwargs, table_names, ratios, rate, stats,
+                 concurrency, pool_size, batch_insert=100, keys=None, protocol='simple', write_batch=1,
+                 workload=None, connect_per_op=False):
+        super().__init__(daemon=True)
+        self.name = "async"
+        self.conn_kwargs = conn_kwargs
+        self.table_names = table_names
+        self.cdf = build_cdf(ratios)
+        self.rate = rate
+        self.stats = stats
+        self.concurrency = concurrency
+        self.pool_size = pool_size
+        self.batch_insert = batch_insert
+        self.keys = keys
+        self.protocol = protocol
+        self.write_batch = write_batch
+        self.workload = workload
+        self.connect_per_op = connect_per_op
+
+    def run(self):
+        asyncio.run(self._main())
+
+    async def _main(self):
+        if self.connect_per_op:
+            pool = AsyncConnectPerOpPool(self.conn_kwargs)
+        else:
+            pool = AsyncConnectionPool(kwargs=self.conn_kwargs, min_size=1, max_size=self.pool_size, open=False)
+        await pool.open()
+        try:
+            if self.workload is not None:
+                dbworker = AsyncWorkloadWorker(pool, self.workload, protocol=self.protocol, stats=self.stats)
+                ops_map = dbworker.build_ops_map()
+            else:
+                dbworker = AsyncDBWorker(pool, self.table_names, batch_insert=self.batch_insert,
+                                         keys=self.keys, protocol=self.protocol, write_batch=self.write_batch,
+                                         stats=self.stats)
+                ops_map = build_ops_map(dbworker)
+            await asyncio.gather(*(self._client(f"c{i+1}", ops_map) for i in range(self.concurrency)))
+        finally:
+            await pool.close()
+
+    async def _client(self, name, ops_map):
+        per_client = self.rate.per_client()
+        # разносим старт корутин, чтобы не было залпа из тысяч одновременных запросов
+        await asyncio.sleep(random.random() * (1.0 / per_client if per_client > 0 else 0.01))
+        last = time.time()
+        while not STOP.is_set():
+            per_client = self.rate.per_client()
+            sleep_interval = 1.0 / per_client if per_client > 0 else 0.0
+            op = pick_op(ops_map, self.cdf)
+            n = 1
+            try:
+                start = time.time()
+                n = await op() or 1
+                dur = time.time() - start
+                self.stats.incr('ops', n)
+                self.stats.incr_type(op.__name__, n)
+                self.stats.add_time(dur)
+            except Exception as e:
+                self.stats.incr_error(op.__name__)
+                if self.stats.data['errors'] % 10 == 1:
+                    print(f"[{now_ts()}] Client {name} error: {repr(e)}", file=sys.stderr)
+            if sleep_interval > 0:
+                end = last + sleep_interval * n
+                to_sleep = end - time.time()
+                if to_sleep > 0:
+                    await asyncio.sleep(to_sleep)
+                last = time.time()
+            else:
+                await asyncio.sleep(0)
+
+
+class Workload:
+    """
+    Нагрузка из YAML-файла (--workload). Формат:
+
+        keys:                       # пространства ключей: границы min/max(column) таблицы
+          account: {table: accounts, column: id, dist: zipfian, theta: 1.1}
+        ops:
+          account_by_id:
+            weight: 30
+            params: {account_id: {key: account}}
+            sql: SELECT ... WHERE id = %(account_id)s
+          place_order:
+            weight: 5
+            params: {...}
+            transaction:            # шаги в одной транзакции
+              - sql: SELECT qty FROM inventory WHERE ... FOR UPDATE
+                save: stock         # первая колонка первой строки -> параметр stock
+              - sql: UPDATE ... %(stock)s ...
+
+    Генераторы параметров: key, int [lo, hi], float [lo, hi], choice [...], string N,
+    uuid, days_ago [lo, hi] (timestamp), value (константа).
+    """
+
+    PARAM_KINDS = ('key', 'int', 'float', 'choice', 'string', 'uuid', 'days_ago', 'value')
+
+    def __init__(self, path, key_defaults):
+        if yaml is None:
+            raise ValueError("--workload requires PyYAML: pip install pyyaml")
+        with open(path) as f:
+            try:
+                doc = yaml.safe_load(f) or {}
+            except yaml.YAMLError as e:
+                raise ValueError(f"{path}: {e}")
+        if not isinstance(doc, dict) or not isinstance(doc.get('ops'), dict) \
+                or not isinstance(doc.get('keys') or {}, dict):
+            raise ValueError(f"{path}: expected mappings 'ops' (and optional 'keys') at top level")
+        self.path = path
+        self.keys = {}
+        for name, spec in (doc.get('keys') or {}).items():
+            if not isinstance(spec, dict):
+                raise ValueError(f"key space '{name}': expected a mapping like {{table: ..., column: ...}}")
+            if 'table' not in spec:
+                raise ValueError(f"key space '{name}': 'table' is required")
+            opts = dict(key_defaults)
+            opts.update({k: spec[k] for k in ('dist', 'hot_fraction', 'hot_ops') if k in spec})
+            if 'theta' in spec:
+                opts['zipf_theta'] = spec['theta']
+            self.keys[name] = {
+                'table': spec['table'],
+                'column': spec.get('column', 'id'),
+                'index': KeyIndex([spec['table']], **opts),
+            }
+        self.ops = {}
+        self.ratios = {}
+        for name, spec in (doc.get('ops') or {}).items():
+            if not isinstance(spec, dict):
+                raise ValueError(f"op '{name}': expected a mapping with 'sql' or 'transaction'")
+            if ('sql' in spec) == ('transaction' in spec):
+                raise ValueError(f"op '{name}': exactly one of 'sql' or 'transaction' is required")
+            if 'transaction' in spec and not isinstance(spec['transaction'], list):
+                raise ValueError(f"op '{name}': 'transaction' must be a list of steps")
+            steps = [{'sql': spec['sql']}] if 'sql' in spec else list(spec['transaction'])
+            for step in steps:
+                if not isinstance(step, dict) or 'sql' not in step:
+                    raise ValueError(f"op '{name}': every transaction step needs 'sql'")
+            params = spec.get('params') or {}
+            if not isinstance(params, dict):
+                raise ValueError(f"op '{name}': 'params' must be a mapping")
+            for pname, pspec in params.items():
+                kind = next(iter(pspec)) if isinstance(pspec, dict) and len(pspec) == 1 else None
+                if kind not in self.PARAM_KINDS:
+                    raise ValueError(f"op '{name}': param '{pname}' must be one of {{{', '.join(self.PARAM_KINDS)}: ...}}")
+                if kind == 'key' and pspec['key'] not in self.keys:
+                    raise ValueError(f"op '{name}': unknown key space '{pspec['key']}'")
+            self.ops[name] = {'steps': steps, 'params': params}
+            try:
+                self.ratios[name] = float(spec.get('weight', 1))
+            except (TypeError, ValueError):
+                raise ValueError(f"op '{name}': 'weight' must be a number")
+            if not self.ratios[name] > 0:
+                raise ValueError(f"op '{name}': 'weight' must be > 0")
+        if not self.ops:
+            raise ValueError(f"{path}: no ops defined")
+        build_cdf(self.ratios)
+
+    def bounds_sql(self, key, sqlmod=sql):
+        """min/max колонки пространства ключей; sqlmod — psycopg2.sql или psycopg.sql (async)."""
+        ks = self.keys[key]
+        col = sqlmod.Identifier(ks['column'])
+        # "schema.table" -> "schema"."table"
+        return sqlmod.SQL("SELECT min({col}), max({col}) FROM {tbl}").format(
+            col=col, tbl=sqlmod.Identifier(*ks['table'].split('.')))
+
+    def param_value(self, pspec):
+        """Значение параметра, кроме key (его выбирает воркер, т.к. нужен курсор для обновления границ)."""
+        kind, arg = next(iter(pspec.items()))
+        if kind == 'int':
+            return random.randint(arg[0], arg[1])
+        if kind == 'float':
+            return random.uniform(arg[0], arg[1])
+        if kind == 'choice':
+            return random.choice(arg)
+        if kind == 'string':
+            return rand_string(int(arg))
+        if kind == 'uuid':
+            return str(uuid.uuid4())
+        if kind == 'days_ago':
+            return datetime.utcnow() - timedelta(seconds=random.randint(int(arg[0] * 86400), int(arg[1] * 86400)))
+        return arg
+
+
+class WorkloadWorker(DBWorker):
+    """Операции из Workload поверх того же пула/статистики/протокола, что и DBWorker."""
+
+    def __init__(self, pool, workload, protocol='simple', stats=None):
+        super().__init__(pool, [], protocol=protocol, stats=stats)
+        self.workload = workload
+
+    def key_value(self, cur, key):
+        ks = self.workload.keys[key]
+        index, table = ks['index'], ks['table']
+        if index.stale(table):
+            with self.timed('execute'):
+                cur.execute(self.workload.bounds_sql(key))
+            lo, hi = cur.fetchone()
+            index.set_bounds(table, lo, hi)
+        return index.pick(table)
+
+    def run_step(self, cur, opname, i, query, params):
+        with self.timed('execute'):
+            if self.protocol != 'prepared':
+                cur.execute(query, params)
+                return
+            stmt = f"wl_{opname}_{i}"
+            text, names = named_to_dollar_params(query)
+            with self.prepared_lock:
+                done = self.prepared.setdefault(cur.connection, set())
+            if stmt not in done:
+                cur.execute(f"PREPARE {stmt} AS {text}")
+                done.add(stmt)
+            if names:
+                cur.execute(f"EXECUTE {stmt} ({','.join(['%s'] * len(names))})", [params[n] for n in names])
+            else:
+                cur.execute(f"EXECUTE {stmt}")
+
+    def make_op(self, opname, op):
+        def run_op():
+            with self.conn() as conn:
+                cur = conn.cursor()
+                try:
+                    params = {}
+                    for pname, pspec in op['params'].items():
+                        if 'key' in pspec:
+                            params[pname] = self.key_value(cur, pspec['key'])
+                        else:
+                            params[pname] = self.workload.param_value(pspec)
+                    for i, step in enumerate(op['steps']):
+                        self.run_step(cur, opname, i, step['sql'], params)
+                        if step.get('save'):
+                            row = cur.fetchone()
+                            params[step['save']] = row[0] if row else None
+                    self.commit(conn)
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    cur.close()
+        run_op.__name__ = opname
+        return run_op
+
+    def build_ops_map(self):
+        return {name: self.make_op(name, op) for name, op in self.workload.ops.items()}
+
+
+class AsyncWorkloadWorker(AsyncDBWorker):
+    """То же для --engine async: psycopg 3 сам готовит statement при --protocol prepared."""
+
+    def __init__(self, pool, workload, protocol='simple', stats=None):
+        super().__init__(pool, [], protocol=protocol, stats=stats)
+        self.workload = workload
+
+    async def key_value(self, cur, key):
+        ks = self.workload.keys[key]
+        index, table = ks['index'], ks['table']
+        if index.stale(table):
+            await self.execute(cur, self.workload.bounds_sql(key, sql3))
+            lo, hi = await cur.fetchone()
+            index.set_bounds(table, lo, hi)
+        return index.pick(table)
+
+    def make_op(self, opname, op):
+        async def run_op():
+            async with self.conn() as conn:
+                try:
+                    async with conn.cursor() as cur:
+                        params = {}
+                        for pname, pspec in op['params'].items():
+                            if 'key' in pspec:
+                                params[pname] = await self.key_value(cur, pspec['key'])
+                            else:
+                                params[pname] = self.workload.param_value(pspec)
+                        for step in op['steps']:
+                            await self.execute(cur, step['sql'], params)
+                            if step.get('save'):
+                                row = await cur.fetchone()
+                                params[step['save']] = row[0] if row else None
+                    await self.commit(conn)
+                except Exception:
+                    await conn.rollback()
+                    raise
+        run_op.__name__ = opname
+        return run_op
+
+    def build_ops_map(self):
+        return {name: self.make_op(name, op) for name, op in self.workload.ops.items()}
+
+
+def start_runners(args, ratios, stats, conn_kwargs, table_names, rate, workload=None):
+    """Создать пул и запустить клиентов выбранного движка. Возвращает (runners, pool или None)."""
+    pool_size = args.pool_size or max(2, args.concurrency + 2)
+    keys = KeyIndex(table_names, dist=args.key_dist, zipf_theta=args.zipf_theta,
+                    hot_fraction=args.hot_fraction, hot_ops=args.hot_ops, refresh_every=args.key_refresh)
+    runners = []
+    pool = None
+    if args.engine == 'async':
+        runners.append(AsyncEngine(conn_kwargs, table_names, ratios, rate, stats,
+                                   concurrency=args.concurrency, pool_size=pool_size,
+                                   batch_insert=args.batch_insert, keys=keys, protocol=args.protocol,
+                                   write_batch=args.write_batch, workload=workload,
+                                   connect_per_op=args.connect_per_op))
+    else:
+        if args.connect_per_op:
+            pool = ConnectPerOpPool(conn_kwargs)
+        else:
+            pool = ConnectionPool(conn_kwargs, pool_size)
+        ops_map = None
+        if workload is not None:
+            dbworker = WorkloadWorker(pool, workload, protocol=args.protocol, stats=stats)
+            ops_map = dbworker.build_ops_map()
+        else:
+            dbworker = DBWorker(pool, table_names, batch_insert=args.batch_insert, keys=keys,
+                                protocol=args.protocol, write_batch=args.write_batch, stats=stats)
+        for i in range(args.concurrency):
+            runners.append(OpRunner(f"w{i+1}", dbworker, ratios, rate, stats, ops_map=ops_map))
+    for r in runners:
+        r.start()
+    return runners, pool
+
+
+def stop_runners(runners, pool, engine):
+    STOP.set()
+    for r in runners:
+        # async-петле нужно время, чтобы дождаться корутин и закрыть пул
+        r.join(timeout=30 if engine == 'async' else 5)
+    if pool is not None:
+        pool.closeall()
+
+
+def simulator_process(idx, args, ratios, conn_kwargs, table_names, rate, stats_queue, stop_event, workload=None):
+    """Тело дочернего процесса для --processes: свой пул и клиенты, раз в секунду шлёт дельту статистики."""
+    # Ctrl+C получает вся группа процессов — останавливаемся только по команде координатора
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    random.seed()
+    stats = SafeStats()
+    runners, pool = start_runners(args, ratios, stats, conn_kwargs, table_names, rate, workload)
+    try:
+        while not stop_event.wait(1.0):
+            stats_queue.put(stats.drain())
+    finally:
+        stop_runners(runners, pool, args.engine)
+        stats_queue.put(stats.drain())
+
+
+def pump_stats(stats, stats_queue):
+    while True:
+        try:
+            delta = stats_queue.get_nowait()
+        except queue.Empty:
+            return
+        stats.merge(delta)
+
+
 def parse_ratios(ratios_str):
     ratios = DEFAULT_RATIO.copy()
     if not ratios_str:
@@ -407,42 +1772,84 @@ def main():
     parser.add_argument("--password", required=True)
     parser.add_argument("--dbname", required=True)
     parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--engine", choices=ENGINES, default="thread")
+    parser.add_argument("--pool_size", type=int, default=0)
+    parser.add_argument("--connect_per_op", action="store_true")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--protocol", choices=PROTOCOLS, default="simple")
     parser.add_argument("--ops_per_sec", type=int, default=DEFAULT_OPS_PER_SEC)
     parser.add_argument("--duration", type=int, default=DEFAULT_DURATION)
+    parser.add_argument("--profile", choices=PROFILES, default="const")
+    parser.add_argument("--profile_start", type=float, default=0.0)
+    parser.add_argument("--step_size", type=float, default=0.0)
+    parser.add_argument("--step_hold", type=float, default=30.0)
+    parser.add_argument("--spike_every", type=float, default=60.0)
+    parser.add_argument("--spike_len", type=float, default=10.0)
+    parser.add_argument("--spike_rate", type=float, default=0.0)
+    parser.add_argument("--p99_threshold_ms", type=float, default=50.0)
     parser.add_argument("--table_count", type=int, default=DEFAULT_TABLE_COUNT)
     parser.add_argument("--rows_per_table", type=int, default=DEFAULT_ROWS_PER_TABLE)
     parser.add_argument("--batch_insert", type=int, default=DEFAULT_BATCH_INSERT)
+    parser.add_argument("--write_batch", type=int, default=1)
     parser.add_argument("--seed", action="store_true")
     parser.add_argument("--no_create", action="store_true")
     parser.add_argument("--ratios", default="")
+    parser.add_argument("--workload", default="")
+    parser.add_argument("--report_interval", type=float, default=REPORT_EVERY)
+    parser.add_argument("--metrics_out", default="")
+    parser.add_argument("--prometheus_port", type=int, default=0)
+    parser.add_argument("--prometheus_addr", default=DEFAULT_PROMETHEUS_ADDR)
+    parser.add_argument("--key_dist", choices=KEY_DISTS, default="uniform")
+    parser.add_argument("--zipf_theta", type=float, default=0.99)
+    parser.add_argument("--hot_fraction", type=float, default=0.2)
+    parser.add_argument("--hot_ops", type=float, default=0.8)
+    parser.add_argument("--key_refresh", type=float, default=10.0)
     args = parser.parse_args()
 
-    ratios = parse_ratios(args.ratios)
-    per_worker_ops = float(args.ops_per_sec) / max(1, args.concurrency)
-    table_names = [f"prod_sim_{i+1}" for i in range(args.table_count)]
-
-    # create connection pool
-    pool = ThreadedConnectionPool(1, max(2, args.concurrency + 2),
-                                  host=args.host, port=args.port, user=args.user,
-                                  password=args.password, dbname=args.dbname)
-
-    dbworker = DBWorker(pool, table_names, batch_insert=args.batch_insert)
+    if args.engine == 'async' and psycopg3 is None:
+        parser.error('--engine async requires psycopg 3: pip install "psycopg[binary]" psycopg_pool')
 
-    if not args.no_create:
-        print(f"[{now_ts()}] Creating schema and indexes...")
-        dbworker.setup_schema()
-    if args.seed:
-        print(f"[{now_ts()}] Seeding initial data ({args.rows_per_table} rows per table)...")
-        dbworker.seed_initial_data(rows_per_table=args.rows_per_table)
-        print(f"[{now_ts()}] Seeding done.")
+    workload = None
+    if args.workload:
+        try:
+            workload = Workload(args.workload, dict(dist=args.key_dist, zipf_theta=args.zipf_theta,
+                                                    hot_fraction=args.hot_fraction, hot_ops=args.hot_ops,
+                                                    refresh_every=args.key_refresh))
+        except (OSError, ValueError) as e:
+            parser.error(f"--workload: {e}")
+        ratios = workload.ratios
+    else:
+        ratios = parse_ratios(args.ratios)
+    processes = max(1, args.processes)
+    if args.profile != 'const' and args.ops_per_sec <= 0 and not (args.profile == 'knee' and args.profile_start > 0):
+        parser.error(f"--profile {args.profile} needs --ops_per_sec > 0")
+    profile = LoadProfile(args.profile, args.ops_per_sec, args.duration, start=args.profile_start,
+                          step_size=args.step_size, step_hold=args.step_hold, spike_every=args.spike_every,
+                          spike_len=args.spike_len, spike_rate=args.spike_rate)
+    rate = RateTarget(profile.start if args.profile in ('ramp', 'steps', 'knee') else args.ops_per_sec,
+                      args.concurrency * processes)
+    table_names = [f"prod_sim_{i+1}" for i in range(args.table_count)]
+    conn_kwargs = dict(host=args.host, port=args.port, user=args.user,
+                       password=args.password, dbname=args.dbname)
+
+    if workload is not None:
+        print(f"[{now_ts()}] Workload {args.workload}: {len(workload.ops)} ops, {len(workload.keys)} key spaces; built-in schema/seed skipped")
+    elif not args.no_create or args.seed:
+        # отдельный пул только под схему и seed
+        # при --seed — по соединению на таблицу, чтобы COPY шли параллельно
+        setup_pool = ConnectionPool(conn_kwargs, max(2, len(table_names) + 1) if args.seed else 2)
+        dbworker = DBWorker(setup_pool, table_names, batch_insert=args.batch_insert)
+        if not args.no_create:
+            print(f"[{now_ts()}] Creating schema and indexes...")
+            dbworker.setup_schema()
+        if args.seed:
+            print(f"[{now_ts()}] Seeding initial data ({args.rows_per_table} rows per table)...")
+            dbworker.seed_initial_data(rows_per_table=args.rows_per_table)
+            print(f"[{now_ts()}] Seeding done.")
+        setup_pool.closeall()
 
     stats = SafeStats()
 
-    runners = []
-    for i in range(args.concurrency):
-        r = OpRunner(f"w{i+1}", dbworker, ratios, per_worker_ops, stats)
-        runners.append(r)
-
     def sigint_handler(signum, frame):
         print(f"\n[{now_ts()}] Received stop signal, shutting down gracefully...")
         STOP.set()
@@ -450,43 +1857,123 @@ def main():
     signal.signal(signal.SIGINT, sigint_handler)
     signal.signal(signal.SIGTERM, sigint_handler)
 
-    print(f"[{now_ts()}] Starting {len(runners)} workers, target total ops/sec ~= {args.ops_per_sec}")
-    for r in runners:
-        r.start()
+    print(f"[{now_ts()}] Starting {processes} x {args.concurrency} {args.engine} workers, protocol={args.protocol}, profile={args.profile}, target total ops/sec ~= {rate.total():.0f}")
+    procs = []
+    runners, pool = [], None
+    stats_queue = stop_event = None
+    if processes > 1:
+        stats_queue = multiprocessing.Queue()
+        stop_event = multiprocessing.Event()
+        for i in range(processes):
+            p = multiprocessing.Process(target=simulator_process, name=f"sim{i+1}",
+                                        args=(i, args, ratios, conn_kwargs, table_names,
+                                              rate, stats_queue, stop_event, workload))
+            p.start()
+            procs.append(p)
+    else:
+        runners, pool = start_runners(args, ratios, stats, conn_kwargs, table_names, rate, workload)
+
+    def pump():
+        if stats_queue is not None:
+            pump_stats(stats, stats_queue)
+
+    op_names = {name: name for name in workload.ops} if workload is not None else None
+    writer = MetricsWriter(args.metrics_out, op_names) if args.metrics_out else None
+    exporter = PrometheusExporter(args.prometheus_port, args.prometheus_addr) if args.prometheus_port else None
+
+    def report(record):
+        print(f"[{record['ts']}] elapsed={int(record['elapsed'])}s total_ops={record['total_ops']} ops/s={record['ops_per_sec']:.2f} "
+              f"avg_latency={record['avg_latency_ms']:.2f}ms p50={record['p50_ms']:.2f}ms p95={record['p95_ms']:.2f}ms "
+              f"p99={record['p99_ms']:.2f}ms pool_wait={record['pool_wait_ms_avg']:.2f}ms errors={record['total_errors']}")
+        line = (f"   phases/op: acquire={record['acquire_ms_per_op']:.2f}ms execute={record['execute_ms_per_op']:.2f}ms "
+                f"commit={record['commit_ms_per_op']:.2f}ms client={record['client_ms_per_op']:.2f}ms")
+        if args.connect_per_op:
+            line += f" connects/s={record['connects_per_sec']:.2f} connect_avg={record['connect_ms_avg']:.2f}ms"
+        print(line)
+        for k, v in sorted(record['ops_by_type'].items(), key=lambda x: -x[1])[:10]:
+            errs = record['errors_by_type'].get(k, 0)
+            if not v and not errs:
+                continue
+            print(f"   {k}: {v}" + (f" (errors {errs})" if errs else ""))
+        if writer is not None:
+            writer.write(record)
+        if exporter is not None:
+            exporter.update(record, stats)
 
     start_time = time.time()
-    next_report = start_time + 5
+    reporter = IntervalReporter(stats, start_time, rate)
+    knee = None
+    if args.profile == 'knee':
+        knee = KneeFinder(stats, rate, profile.start, profile.step_size, args.step_hold,
+                          args.p99_threshold_ms, start_time)
+    next_report = start_time + args.report_interval
     end_time = start_time + args.duration if args.duration > 0 else float('inf')
 
     try:
         while time.time() < end_time and not STOP.is_set():
+            pump()
             now = time.time()
+            if knee is not None:
+                if knee.tick(now):
+                    break
+            elif args.profile != 'const':
+                rate.set(profile.rate(now - start_time))
             if now >= next_report:
-                elapsed = now - start_time
-                data_snap, by_type_snap, time_total = stats.snapshot()
-                total_ops = data_snap.get('ops', 0)
-                ops_per_sec = (total_ops / elapsed) if elapsed > 0 else 0
-                avg_latency = (time_total / total_ops) if total_ops > 0 else 0
-                errors = data_snap.get('errors', 0)
-                print(f"[{now_ts()}] elapsed={int(elapsed)}s total_ops={total_ops} ops/s={ops_per_sec:.2f} avg_latency={avg_latency*1000:.2f}ms errors={errors}")
-                for k, v in sorted(by_type_snap.items(), key=lambda x: -x[1])[:10]:
-                    print(f"   {k}: {v}")
-                next_report = now + 5
-            time.sleep(0.5)
+                report(reporter.tick(now))
+                next_report = now + args.report_interval
+            time.sleep(min(0.5, args.report_interval))
     except KeyboardInterrupt:
         STOP.set()
 
     STOP.set()
     print(f"[{now_ts()}] Waiting for workers to finish...")
-    for r in runners:
-        r.join(timeout=5)
+    if procs:
+        stop_event.set()
+        deadline = time.time() + 60
+        # читаем очередь, пока ждём: процесс с непрочитанными данными в Queue не завершится
+        while any(p.is_alive() for p in procs) and time.time() < deadline:
+            pump()
+            time.sleep(0.2)
+        pump()
+        for p in procs:
+            p.join(timeout=1)
+    else:
+        stop_runners(runners, pool, args.engine)
+    # хвост после последнего отчёта, чтобы во временном ряду не терялись последние секунды
+    report(reporter.tick(time.time()))
+    if writer is not None:
+        writer.close()
+    if exporter is not None:
+        exporter.close()
 
     total_elapsed = time.time() - start_time
     data_snap, by_type_snap, time_total = stats.snapshot()
+    hist = stats.hist_snapshot()
     total_ops = data_snap.get('ops', 0)
     errors = data_snap.get('errors', 0)
-    print(f"[{now_ts()}] Finished. elapsed={int(total_elapsed)}s total_ops={total_ops} ops/s={(total_ops/total_elapsed if total_elapsed>0 else 0):.2f} errors={errors}")
-    pool.closeall()
+    if knee is not None:
+        if knee.best is not None:
+            print(f"[{now_ts()}] Max sustainable throughput: target={knee.best['target']:.0f} "
+                  f"achieved={knee.best['achieved']:.2f} ops/s p99={knee.best['p99_ms']:.2f}ms "
+                  f"(threshold {args.p99_threshold_ms}ms)")
+        elif knee.done:
+            print(f"[{now_ts()}] Knee at the first step ({profile.start:.0f} ops/s) — lower --profile_start")
+        if not knee.done:
+            print(f"[{now_ts()}] Knee not reached within --duration — increase --duration or --step_size")
+    print(f"[{now_ts()}] Finished. elapsed={int(total_elapsed)}s total_ops={total_ops} ops/s={(total_ops/total_elapsed if total_elapsed>0 else 0):.2f} "
+          f"p50={hist_percentile(hist, 0.50):.2f}ms p95={hist_percentile(hist, 0.95):.2f}ms p99={hist_percentile(hist, 0.99):.2f}ms errors={errors}")
+    _, timers = stats.extra_snapshot()
+    calls = sum(hist)
+    if calls:
+        acquire = timers.get('pool_wait', 0.0) + timers.get('connect', 0.0)
+        print(f"[{now_ts()}] Phases per op: acquire={acquire / calls * 1000.0:.2f}ms "
+              f"execute={timers.get('execute', 0.0) / calls * 1000.0:.2f}ms "
+              f"commit={timers.get('commit', 0.0) / calls * 1000.0:.2f}ms "
+              f"total={time_total / calls * 1000.0:.2f}ms")
+    if args.connect_per_op and total_elapsed > 0:
+        connects = data_snap.get('connect_count', 0)
+        print(f"[{now_ts()}] Connects: {connects} ({connects / total_elapsed:.2f}/s), "
+              f"avg connect={(timers.get('connect', 0.0) / connects * 1000.0 if connects else 0.0):.2f}ms")
 
 
 if __name__ == '__main__':
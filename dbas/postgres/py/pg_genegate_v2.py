@@ -1,8 +1,15 @@
 import csv
+import io
 import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from faker import Faker
 from multiprocessing import Pool
 import psycopg2
+from psycopg2.extensions import parse_dsn
 from tqdm import tqdm
 import os
 
@@ -24,6 +31,15 @@ N_PAYMENTS = 20_000_00
 
 N_PROCESSES = 8
 CHUNK = 500_000
+CACHE_CHUNKS = 4   # сколько прочитанных CSV-чанков держим в памяти, общих для всех баз
+
+TABLES = [  # порядок учитывает FK
+    ("users", ["id","full_name","email","phone","address","created_at"]),
+    ("products", ["id","name","category","price","created_at"]),
+    ("orders", ["id","user_id","created_at","status"]),
+    ("order_items", ["id","order_id","product_id","quantity","price"]),
+    ("payments", ["id","order_id","amount","method","created_at"]),
+]
 
 
 # ---------- Генерация CSV ----------
@@ -96,16 +112,103 @@ def gen_payments(start, end, filename):
             ])
 
 
-# ---------- Загрузка CSV в PostgreSQL ----------
-def load_table(db_conn, table, columns, filenames):
-    conn = psycopg2.connect(db_conn)
-    cur = conn.cursor()
-    for file in filenames:
-        with open(file, "r") as f:
-            cur.copy_expert(f"COPY {table} ({','.join(columns)}) FROM STDIN WITH CSV", f)
-        conn.commit()
-    cur.close()
-    conn.close()
+# ---------- Fan-out: один CSV-чанк → все базы параллельно ----------
+class ChunkCache:
+    """Общий кеш прочитанных чанков. Базы, идущие примерно вровень, получают файл, прочитанный
+    с диска один раз; отставшая база, вышедшая за окно CACHE_CHUNKS, перечитывает файл сама
+    и не держит остальные."""
+
+    def __init__(self, size):
+        self.size = size
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.file_locks = {}
+        self.disk_reads = 0
+
+    def get(self, path):
+        with self.lock:
+            if path in self.data:
+                self.data.move_to_end(path)
+                return self.data[path]
+            file_lock = self.file_locks.setdefault(path, threading.Lock())
+        with file_lock:  # одновременно пришедшие базы ждут одно чтение, а не читают файл каждая
+            with self.lock:
+                if path in self.data:
+                    return self.data[path]
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except BaseException:
+                with self.lock:
+                    self.file_locks.pop(path, None)
+                raise
+            with self.lock:
+                self.data[path] = data
+                while len(self.data) > self.size:
+                    self.data.popitem(last=False)
+                # лок нужен только на время чтения: дальше файл берут из data, а после
+                # вытеснения заводят новый лок — словарь не растёт на весь прогон
+                self.file_locks.pop(path, None)
+                self.disk_reads += 1
+            return data
+
+
+def table_files(prefix):
+    """Чанки таблицы в порядке номеров — все базы идут по файлам одинаково и попадают в кеш."""
+    pattern = re.compile(rf"^{prefix}_(\d+)\.csv$")
+    found = []
+    for f in os.listdir(CSV_DIR):
+        m = pattern.match(f)
+        if m:
+            found.append((int(m.group(1)), f))
+    return [os.path.join(CSV_DIR, f) for _, f in sorted(found)]
+
+
+def target_label(idx, db_conn):
+    params = parse_dsn(db_conn)
+    port = f":{params['port']}" if "port" in params else ""
+    return f"[{idx}] {params.get('host', 'local')}{port}/{params.get('dbname', '')}"
+
+
+def load_target(idx, db_conn, plan, cache):
+    """Вся загрузка одной базы на своём соединении. Ошибка возвращается, а не пробрасывается —
+    упавшая база не останавливает остальные."""
+    started = time.time()
+    bar = tqdm(total=sum(len(files) for _, _, files in plan), desc=target_label(idx, db_conn),
+               position=idx, unit="chunk", leave=True)
+    try:
+        create_schema(db_conn)
+        conn = psycopg2.connect(db_conn)
+        try:
+            cur = conn.cursor()
+            for table, columns, files in plan:
+                bar.set_postfix_str(table)
+                sql = f"COPY {table} ({','.join(columns)}) FROM STDIN WITH CSV"
+                for path in files:
+                    cur.copy_expert(sql, io.BytesIO(cache.get(path)))
+                    conn.commit()
+                    bar.update(1)
+            cur.close()
+        finally:
+            conn.close()
+        bar.set_postfix_str("done")
+        return None, time.time() - started
+    except Exception as e:
+        bar.set_postfix_str(f"FAILED: {type(e).__name__}")
+        return e, time.time() - started
+    finally:
+        bar.close()
+
+
+def fanout_load(db_conns, plan):
+    """Грузит plan [(table, columns, files)] во все базы сразу: поток и соединение на базу."""
+    cache = ChunkCache(CACHE_CHUNKS)
+    with ThreadPoolExecutor(max_workers=len(db_conns)) as pool:
+        futures = [pool.submit(load_target, i, db, plan, cache) for i, db in enumerate(db_conns)]
+        results = [f.result() for f in futures]
+    total_files = sum(len(files) for _, _, files in plan)
+    print(f"\nЧтений CSV с диска: {cache.disk_reads} на {total_files} чанков × {len(db_conns)} баз")
+    return results
 
 
 # ---------- Создание схемы ----------
@@ -183,20 +286,16 @@ if __name__ == "__main__":
     run_generation(N_ORDER_ITEMS, gen_order_items, "order_items")
     run_generation(N_PAYMENTS, gen_payments, "payments")
 
-    # 2. Загружаем данные во все базы
-    for db in DB_CONNS:
-        print(f"🔄 Работаем с {db}")
-        create_schema(db)
-
-        load_table(db, "users", ["id","full_name","email","phone","address","created_at"],
-                   [os.path.join(CSV_DIR, f) for f in os.listdir(CSV_DIR) if f.startswith("users_")])
-        load_table(db, "products", ["id","name","category","price","created_at"],
-                   [os.path.join(CSV_DIR, f) for f in os.listdir(CSV_DIR) if f.startswith("products_")])
-        load_table(db, "orders", ["id","user_id","created_at","status"],
-                   [os.path.join(CSV_DIR, f) for f in os.listdir(CSV_DIR) if f.startswith("orders_")])
-        load_table(db, "order_items", ["id","order_id","product_id","quantity","price"],
-                   [os.path.join(CSV_DIR, f) for f in os.listdir(CSV_DIR) if f.startswith("order_items_")])
-        load_table(db, "payments", ["id","order_id","amount","method","created_at"],
-                   [os.path.join(CSV_DIR, f) for f in os.listdir(CSV_DIR) if f.startswith("payments_")])
-
-        print(f"✅ Данные загружены в {db}")
+    # 2. Загружаем данные во все базы параллельно, каждый чанк читается один раз
+    plan = [(table, columns, table_files(table)) for table, columns in TABLES]
+    results = fanout_load(DB_CONNS, plan)
+
+    failed = 0
+    for i, (db, (err, elapsed)) in enumerate(zip(DB_CONNS, results)):
+        if err is None:
+            print(f"✅ {target_label(i, db)}: данные загружены за {elapsed:.1f}s")
+        else:
+            failed += 1
+            print(f"❌ {target_label(i, db)}: {type(err).__name__}: {err}".rstrip())
+    if failed:
+        raise SystemExit(f"Не загружено баз: {failed} из {len(DB_CONNS)}")
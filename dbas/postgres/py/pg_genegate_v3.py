@@ -1,7 +1,8 @@
 import csv
 import random
+from datetime import datetime, timedelta
 from faker import Faker
-from multiprocessing import Pool
+from multiprocessing import Pool, Semaphore, util
 import psycopg2
 from tqdm import tqdm
 import os
@@ -22,27 +23,160 @@ N_ORDER_ITEMS = 60_000_000_0
 N_PAYMENTS = 20_000_000_0
 
 CHUNK = 500_000  # строки на один файл/чанк
+# created_at берётся из фиксированного окна: fake.date_time_this_decade() зависит от текущего времени
+TS_FROM = datetime(2020, 1, 1)
+TS_TO = datetime(2025, 1, 1)
+N_WORKERS = os.cpu_count()
+MAX_COPIES_PER_DB = 4  # одновременных COPY в одну базу от всех воркеров — не душим маленькие DBaaS
 
 
 # ---------- Генерация и загрузка чанка ----------
-def gen_users_chunk(start, end, filename):
+# Каждый чанк сидируется своим (таблица, start): форкнутые воркеры иначе делят одно состояние random,
+# а перегенерированный после сбоя файл совпадает с прежним байт в байт (при той же версии Faker).
+def rand_ts(rnd):
+    return TS_FROM + timedelta(seconds=rnd.randrange(int((TS_TO - TS_FROM).total_seconds())))
+
+
+def chunk_rng(prefix, start):
+    rnd = random.Random(f"{prefix}:{start}")
     fake = Faker()
+    fake.seed_instance(f"{prefix}:{start}")
+    return rnd, fake
+
+
+def gen_users_chunk(start, end, filename):
+    rnd, fake = chunk_rng("users", start)
     with open(filename, "w", newline="") as f:
         writer = csv.writer(f)
         for i in range(start, end):
             writer.writerow([i+1, fake.name(), f"user{i}@example.com",
                              fake.phone_number(), fake.address(),
-                             fake.date_time_this_decade()])
+                             rand_ts(rnd)])
+
+
+def gen_products_chunk(start, end, filename):
+    rnd, fake = chunk_rng("products", start)
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        for i in range(start, end):
+            writer.writerow([i+1, fake.word(), fake.word(),
+                             round(rnd.uniform(10, 5000), 2),
+                             rand_ts(rnd)])
+
+
+def gen_orders_chunk(start, end, filename):
+    rnd, _ = chunk_rng("orders", start)
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        for i in range(start, end):
+            writer.writerow([i+1, rnd.randint(1, N_USERS),
+                             rand_ts(rnd),
+                             rnd.choice(["new", "paid", "shipped", "cancelled"])])
+
+
+def gen_order_items_chunk(start, end, filename):
+    rnd, _ = chunk_rng("order_items", start)
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        for i in range(start, end):
+            writer.writerow([i+1, rnd.randint(1, N_ORDERS), rnd.randint(1, N_PRODUCTS),
+                             rnd.randint(1, 10), round(rnd.uniform(10, 5000), 2)])
+
+
+def gen_payments_chunk(start, end, filename):
+    rnd, _ = chunk_rng("payments", start)
+    with open(filename, "w", newline="") as f:
+        writer = csv.writer(f)
+        for i in range(start, end):
+            writer.writerow([i+1, rnd.randint(1, N_ORDERS),
+                             round(rnd.uniform(10, 5000), 2),
+                             rnd.choice(["card", "cash", "paypal", "crypto"]),
+                             rand_ts(rnd)])
+
+
+GENERATORS = {
+    "users": gen_users_chunk,
+    "products": gen_products_chunk,
+    "orders": gen_orders_chunk,
+    "order_items": gen_order_items_chunk,
+    "payments": gen_payments_chunk,
+}
+
+TOTALS = {
+    "users": N_USERS,
+    "products": N_PRODUCTS,
+    "orders": N_ORDERS,
+    "order_items": N_ORDER_ITEMS,
+    "payments": N_PAYMENTS,
+}
+
+# Фазы по FK: следующая стартует, только когда все чанки предыдущей загружены во все базы.
+# Внутри фазы чанки всех её таблиц идут параллельно.
+PHASES = [
+    ["users", "products"],
+    ["orders"],
+    ["order_items", "payments"],
+]
+
+
+# ---------- Состояние воркера пула ----------
+# Соединения живут всё время жизни процесса: TLS/auth платим один раз на воркер × базу, а не на чанк.
+_conns = {}
+_copy_slots = {}
+
+
+def init_worker(copy_slots):
+    """Инициализатор Pool: общие (между процессами) семафоры COPY по базам."""
+    global _copy_slots
+    _copy_slots = copy_slots
+    util.Finalize(None, close_connections, exitpriority=10)
+
+
+def close_connections():
+    for conn in _conns.values():
+        conn.close()
+    _conns.clear()
+
+
+def get_conn(db_conn):
+    conn = _conns.get(db_conn)
+    if conn is None or conn.closed:
+        conn = psycopg2.connect(db_conn)
+        _conns[db_conn] = conn
+    return conn
 
 
 def load_chunk(db_conn, table, columns, filename):
-    conn = psycopg2.connect(db_conn)
-    cur = conn.cursor()
-    with open(filename, "r") as f:
-        cur.copy_expert(f"COPY {table} ({','.join(columns)}) FROM STDIN WITH CSV", f)
-    conn.commit()
-    cur.close()
-    conn.close()
+    conn = get_conn(db_conn)
+    try:
+        with open(filename, "r") as f, conn.cursor() as cur:
+            cur.copy_expert(f"COPY {table} ({','.join(columns)}) FROM STDIN WITH CSV", f)
+        conn.commit()
+    except psycopg2.Error:
+        # сломанное соединение выбрасываем — следующий чанк переподключится
+        if conn.closed:
+            _conns.pop(db_conn, None)
+        else:
+            conn.rollback()
+        raise
+
+
+def load_to_all(table, filename, chunk_no):
+    """Чанк во все базы. Стартуем с разных баз (по номеру чанка) и берём ту, где есть свободный
+    слот COPY; ждём слот, только если заняты все оставшиеся."""
+    pending = DB_CONNS[chunk_no % len(DB_CONNS):] + DB_CONNS[:chunk_no % len(DB_CONNS)]
+    while pending:
+        for db in pending:
+            if _copy_slots[db].acquire(block=False):
+                break
+        else:
+            db = pending[0]
+            _copy_slots[db].acquire()
+        try:
+            load_chunk(db, table, get_columns(table), filename)
+        finally:
+            _copy_slots[db].release()
+        pending.remove(db)
 
 
 def process_chunk(args):
@@ -50,16 +184,13 @@ def process_chunk(args):
     start, end, prefix = args
     filename = os.path.join(CSV_DIR, f"{prefix}_{start//CHUNK}.csv")
 
-    # 1️⃣ Генерим CSV если нет
+    # 1️⃣ Генерим CSV если нет (через .tmp — оборванная генерация не оставит «готовый» огрызок)
     if not os.path.exists(filename):
-        if prefix == "users":
-            gen_users_chunk(start, end, filename)
-        # тут можно добавить gen_products_chunk, gen_orders_chunk и т.д.
-        # для краткости оставлен только users
+        GENERATORS[prefix](start, end, filename + ".tmp")
+        os.replace(filename + ".tmp", filename)
 
-    # 2️⃣ Загружаем этот CSV параллельно во все базы
-    for db in DB_CONNS:
-        load_chunk(db, prefix, get_columns(prefix), filename)
+    # 2️⃣ Загружаем этот CSV во все базы через постоянные соединения воркера
+    load_to_all(prefix, filename, start // CHUNK)
 
 
 def get_columns(table):
@@ -133,11 +264,19 @@ if __name__ == "__main__":
     for db in DB_CONNS:
         create_schema(db)
 
-    # формируем список чанков для users
-    chunks = [(i, min(i+CHUNK, N_USERS), "users") for i in range(0, N_USERS, CHUNK)]
-
-    # параллельная генерация и загрузка
-    with Pool(processes=os.cpu_count()) as pool:
-        list(tqdm(pool.imap_unordered(process_chunk, chunks), total=len(chunks)))
+    # параллельная генерация и загрузка по фазам; пул (и соединения воркеров) общий на все фазы,
+    # семафоры общие для всех воркеров
+    copy_slots = {db: Semaphore(MAX_COPIES_PER_DB) for db in DB_CONNS}
+    pool = Pool(processes=N_WORKERS, initializer=init_worker, initargs=(copy_slots,))
+    try:
+        for phase in PHASES:
+            chunks = [(i, min(i+CHUNK, TOTALS[t]), t) for t in phase for i in range(0, TOTALS[t], CHUNK)]
+            list(tqdm(pool.imap_unordered(process_chunk, chunks), total=len(chunks), desc=" + ".join(phase)))
+        pool.close()  # штатное завершение воркеров — закрываются их соединения (Finalize)
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
 
     print("✅ CSV сгенерированы и загружены во все базы")
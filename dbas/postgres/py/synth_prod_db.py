@@ -15,6 +15,8 @@ import math
 from datetime import datetime, timedelta, timezone
 from multiprocessing import Pool, cpu_count
 from functools import partial
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import numpy as np
 import psycopg2
@@ -33,6 +35,8 @@ N_PROCESSES = min(12, max(2, cpu_count()))  # количество паралл
 CHUNK = 500_000                  # строки на CSV-файл (подбирай под RAM/IO)
 USE_GZIP = False                 # если True — создаёт .csv.gz (COPY FROM PROGRAM нужен на сервере)
 RANDOM_SEED = 42
+SERVER_SIDE = False              # True — строки генерирует сам Postgres (INSERT ... SELECT FROM generate_series), без CSV
+SERVER_JOBS = N_PROCESSES        # параллельных соединений в серверном режиме (чанки по CHUNK строк)
 
 # Базовые ориентиры (можно менять)
 BASE_USERS = 2_000_000
@@ -50,6 +54,10 @@ AVG_EVENT_BYTES = 900
 # Даты
 TODAY = datetime.now(timezone.utc)
 START_DATE = TODAY - timedelta(days=365 * 4)
+PARTITIONS = 48                  # месячных (по 30 дней) партиций orders/events назад от TODAY
+# границы нарезанных партиций (без tz — как и в DDL, трактуются в часовом поясе сессии)
+PART_FROM = datetime.strptime((TODAY - timedelta(days=30 * PARTITIONS)).strftime("%Y-%m-%d"), "%Y-%m-%d")
+PART_TO = datetime.strptime(TODAY.strftime("%Y-%m-%d"), "%Y-%m-%d")
 
 # Инициализация стохастики
 random.seed(RANDOM_SEED)
@@ -71,10 +79,12 @@ def build_schema_sql():
     partitions_orders = []
     partitions_events = []
     # создаём месячные партиции за 48 месяцев назад (пример)
-    for i in range(48):
+    for i in range(PARTITIONS):
         from_dt = (TODAY - timedelta(days=30*(i+1))).strftime("%Y-%m-%d")
         to_dt = (TODAY - timedelta(days=30*i)).strftime("%Y-%m-%d")
-        ym = (TODAY - timedelta(days=30*i)).strftime("%Y_%m")
+        # имя по дате начала: 30-дневные окна иногда попадают в один месяц, и по "%Y_%m"
+        # DROP IF EXISTS следующего окна удалял предыдущую партицию (дыра в диапазоне)
+        ym = (TODAY - timedelta(days=30*(i+1))).strftime("%Y_%m_%d")
         partitions_orders.append(f"DROP TABLE IF EXISTS orders_{ym} CASCADE; CREATE TABLE orders_{ym} PARTITION OF orders FOR VALUES FROM ('{from_dt}') TO ('{to_dt}');")
         partitions_events.append(f"DROP TABLE IF EXISTS events_{ym} CASCADE; CREATE TABLE events_{ym} PARTITION OF events FOR VALUES FROM ('{from_dt}') TO ('{to_dt}');")
 
@@ -484,6 +494,11 @@ def copy_from_files(table, columns, files):
         cur.close()
         conn.close()
 
+def build_indexes_and_analyze():
+    print("Creating indexes and analyzing (this can take time)...")
+    run_sql(INDEXES_SQL)
+    run_sql(ANALYZE_SQL)
+
 # ----------------- Параллельная генерация CSV -----------------
 def parallel_write(generate_func, total, prefix, extra_args=()):
     files = []
@@ -502,6 +517,242 @@ def write_static_rows(rows, prefix):
     written = write_rows_csv(fn, rows, header=None, gzip_enabled=USE_GZIP)
     return [written]
 
+# ----------------- Серверная генерация (generate_series) -----------------
+# При SERVER_SIDE строки собирает сам Postgres: INSERT ... SELECT ... FROM generate_series(lo, hi).
+# Python только режет id-диапазоны по CHUNK и раздаёт их по SERVER_JOBS соединениям — CSV не пишутся,
+# по сети идут короткие команды. Выражения приближают распределения gen_* выше (numpy lognormal/normal —
+# через Box-Muller, Faker — md5-текст). Значение, нужное в нескольких колонках, считается во вложенном
+# подзапросе: с volatile-функциями Postgres его не «схлопывает».
+
+def s_int(lo, hi):
+    return f"({lo} + floor(random() * {hi - lo + 1})::bigint)"
+
+def s_uniform(lo, hi, digits=2):
+    return f"round(({lo} + random() * {hi - lo})::numeric, {digits})"
+
+def s_choice(values):
+    items = ", ".join(f"'{v}'" for v in values)
+    return f"(ARRAY[{items}])[1 + floor(random() * {len(values)})::int]"
+
+def s_weighted(values, weights, r):
+    """random.choices(values, weights) по заранее посчитанному random() в колонке r."""
+    total = float(sum(weights))
+    acc = 0.0
+    parts = []
+    for v, w in zip(values[:-1], weights[:-1]):
+        acc += w
+        parts.append(f"WHEN {r} < {acc / total:.6f} THEN '{v}'")
+    return f"CASE {' '.join(parts)} ELSE '{values[-1]}' END"
+
+def s_normal(mu, sigma):
+    return f"({mu} + {sigma} * sqrt(-2 * ln(1 - random())) * cos(2 * pi() * random()))"
+
+def s_lognormal(mu, sigma, digits=2):
+    return f"round(exp{s_normal(mu, sigma)}::numeric, {digits})"
+
+def s_ts(start=START_DATE, end=TODAY):
+    """Аналог fake.date_time_between(start, end)."""
+    secs = int((end - start).total_seconds())
+    return f"(TIMESTAMPTZ '{start.isoformat()}' + random() * INTERVAL '{secs} seconds')"
+
+def s_word(lo=4, hi=10):
+    return f"initcap(substr(md5(random()::text), 1, {lo} + floor(random() * {hi - lo + 1})::int))"
+
+def s_text(max_chars):
+    # подзапрос ссылается на g — выполняется на каждую строку, а не один раз
+    words = max(1, max_chars // 33)
+    return (f"(SELECT left(string_agg(md5(random()::text), ' '), {max_chars}) "
+            f"FROM generate_series(1, 1 + floor(random() * {words})::int + 0 * g))")
+
+def s_tags(values, mean):
+    """Аналог list({choice for _ in poisson(mean)}): каждый тег независимо с p = mean/len; пусто → NULL."""
+    items = ", ".join(f"'{v}'" for v in values)
+    return f"(SELECT array_agg(t) FROM unnest(ARRAY[{items}]) t WHERE random() + 0 * g < {mean / len(values):.4f})"
+
+def s_ip():
+    return "('0.0.0.0'::inet + floor(random() * 4294967296)::bigint)"
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 13_5) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.6 Safari/605.1.15",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148",
+    "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Mobile Safari/537.36",
+]
+
+GS = "generate_series(%(lo)s, %(hi)s) g"
+ITEMS_SEQ = "order_items_gen_id"
+
+def server_tables(event_rows):
+    """(фаза, таблица, строк, SQL с %(lo)s/%(hi)s). Фазы учитывают FK; orders вместе с order_items
+    и payments — один INSERT с data-modifying CTE, чтобы order_created совпадал с партицией заказа."""
+    n_cat, n_wh, n_acc, n_prod = BASE_CATEGORIES, BASE_WAREHOUSES, BASE_USERS, BASE_PRODUCTS
+    # orders/events партиционированы: время только внутри нарезанных партиций
+    part_ts = s_ts(PART_FROM, PART_TO)
+    order_statuses = ["new", "paid", "processing", "shipped", "delivered", "cancelled", "returned"]
+    pay_statuses = ["pending", "authorized", "captured", "refunded", "failed"]
+    pay_methods = ["card", "cash", "paypal", "crypto", "bank_transfer", "apple_pay", "google_pay"]
+    return [
+        (0, "categories", n_cat, f"""
+            INSERT INTO categories (id, name, parent_id, path, created_at)
+            SELECT g, 'category_' || g,
+                   CASE WHEN g > 1 AND random() < 0.3 THEN g - floor(random() * (LEAST(10, g - 1) + 1))::bigint END,
+                   'path_' || g, {s_ts()}
+            FROM {GS}"""),
+        (0, "warehouses", n_wh, f"""
+            INSERT INTO warehouses (id, code, name, country, tz, latitude, longitude, created_at)
+            SELECT g, 'W' || (999 + g), 'Warehouse W' || (999 + g), {s_choice(COUNTRIES)}, {s_choice(WAREHOUSE_TZS)},
+                   {s_uniform(-70, 70, 5)}, {s_uniform(-170, 170, 5)}, {s_ts()}
+            FROM {GS}"""),
+        (0, "accounts", n_acc, f"""
+            INSERT INTO accounts (id, uuid, full_name, email, phone, is_active, created_at, last_login, preferences, tags)
+            SELECT g, md5(random()::text)::uuid, {s_word(3, 9)} || ' ' || {s_word(4, 12)}, 'user' || (g - 1) || '@example.com',
+                   CASE WHEN random() < 0.9 THEN '+' || {s_int(1, 99)} || ' ' || lpad({s_int(0, 9_999_999_999)}::text, 10, '0') END,
+                   random() > 0.02, created,
+                   CASE WHEN random() < 0.85 THEN created + {s_int(0, 600)} * INTERVAL '1 day' END,
+                   jsonb_build_object('email_promos', random() < 0.6, 'lang', {s_choice(["en", "de", "pl", "fr", "es", "it"])},
+                                      'currency', {s_choice(CURRENCIES)}, 'theme', {s_choice(["light", "dark"])}),
+                   {s_tags(USER_TAGS, 1.2)}
+            FROM (SELECT g, {s_ts()} AS created FROM {GS}) x"""),
+
+        (1, "addresses", n_acc, f"""
+            INSERT INTO addresses (id, account_id, type, country, city, postal_code, street, created_at, geo)
+            SELECT 2 * g - 2 + v.k, g, v.t::address_type, {s_choice(COUNTRIES)}, {s_word(4, 12)},
+                   lpad({s_int(0, 99999)}::text, 5, '0'), {s_int(1, 9999)} || ' ' || {s_word()} || ' St', {s_ts()},
+                   point({s_uniform(-70, 70, 6)}, {s_uniform(-170, 170, 6)})
+            FROM {GS} CROSS JOIN (VALUES (1, 'billing', 1.0), (2, 'shipping', 0.85)) v(k, t, p)
+            WHERE random() + 0 * g < v.p"""),
+        (1, "products", n_prod, f"""
+            INSERT INTO products (id, sku, name, category_id, price, currency, attributes, tags, weight_grams, created_at)
+            SELECT g, 'SKU-' || lpad(g::text, 8, '0'), lower({s_word()}) || ' ' || lower({s_word()}), {s_int(1, n_cat)},
+                   {s_lognormal(4.8, 0.6)}, {s_choice(CURRENCIES)},
+                   jsonb_build_object('color', {s_choice(["red", "green", "blue", "black", "white", "silver", "gold"])},
+                                      'size', {s_choice(["XS", "S", "M", "L", "XL"])},
+                                      'material', {s_choice(["cotton", "plastic", "metal", "leather", "glass", "wood"])},
+                                      'warranty_months', ({s_choice(["6", "12", "24", "36"])})::int),
+                   {s_tags(PRODUCT_TAGS, 1.1)}, abs{s_normal(500, 300)}::int, {s_ts()}
+            FROM {GS}"""),
+        (1, "sessions", BASE_SESSIONS, f"""
+            INSERT INTO sessions (id, account_id, ip, user_agent, started_at, ended_at)
+            SELECT md5(random()::text)::uuid, CASE WHEN random() < 0.7 THEN {s_int(1, n_acc)} END, {s_ip()},
+                   {s_choice(USER_AGENTS)}, started,
+                   CASE WHEN random() < 0.95 THEN started + GREATEST(1, abs{s_normal(12, 10)}::int) * INTERVAL '1 minute' END
+            FROM (SELECT g, {s_ts()} AS started FROM {GS}) x"""),
+        (1, "events", event_rows, f"""
+            INSERT INTO events (id, account_id, type, payload, created_at)
+            SELECT g, CASE WHEN random() < 0.8 THEN {s_int(1, n_acc)} END, {s_choice(EVENT_TYPES)},
+                   jsonb_build_object('request_id', md5(random()::text)::uuid, 'ua', {s_choice(USER_AGENTS)},
+                                      'path', '/' || (SELECT string_agg(lower({s_word()}), '/')
+                                                      FROM generate_series(1, 1 + floor(random() * 4)::int + 0 * g)),
+                                      'latency_ms', abs{s_normal(120, 90)}::int, 'ab', {s_choice(["A", "B", "C"])},
+                                      'extra', {s_text(500)}),
+                   {part_ts}
+            FROM {GS}"""),
+
+        (2, "inventory", n_prod, f"""
+            INSERT INTO inventory (product_id, warehouse_id, qty, reserved, updated_at)
+            SELECT g, w, qty, LEAST(qty, abs{s_normal(5, 10)}::int), {s_ts()}
+            FROM (SELECT g, {s_int(1, n_wh)} AS w, abs{s_normal(50, 80)}::int AS qty
+                  FROM {GS} CROSS JOIN LATERAL
+                       generate_series(1, 1 + floor(random() * {min(3, n_wh)})::int + 0 * g) k) x
+            ON CONFLICT DO NOTHING"""),
+        (2, "reviews", BASE_REVIEWS, f"""
+            INSERT INTO reviews (id, product_id, account_id, rating, title, body, helpful_count, created_at)
+            SELECT g, {s_int(1, n_prod)}, {s_int(1, n_acc)}, LEAST(5, GREATEST(1, trunc{s_normal(4, 1)}::int)),
+                   {s_text(60)}, {s_text(300)}, abs{s_normal(3, 5)}::int, {s_ts()}
+            FROM {GS}"""),
+        # zipf(1.3) ≈ Парето с хвостом k^-0.3: floor((1-u)^(-1/0.3)), как в Python — по модулю числа товаров
+        (2, "orders", BASE_ORDERS, f"""
+            WITH o AS (
+                INSERT INTO orders (id, account_id, status, total_amount, currency, created_at, updated_at, metadata)
+                SELECT g, {s_int(1, n_acc)}, ({s_weighted(order_statuses, [5, 20, 10, 15, 30, 8, 2], "rs")})::order_status,
+                       {s_lognormal(4.5, 0.7)}, {s_choice(CURRENCIES)}, created,
+                       created + {s_int(0, 10)} * INTERVAL '1 day',
+                       jsonb_build_object('channel', {s_choice(["web", "mobile", "support"])},
+                                          'campaign', CASE WHEN random() < 0.2 THEN lower({s_word()}) END)
+                FROM (SELECT g, {part_ts} AS created, random() AS rs FROM {GS}) x
+                RETURNING id, created_at
+            ), items AS (
+                INSERT INTO order_items (id, order_id, order_created, product_id, qty, unit_price, discount)
+                SELECT nextval('{ITEMS_SEQ}'), id, created_at, product_id, qty, unit_price,
+                       round(unit_price * qty * CASE WHEN random() < 0.3
+                             THEN ({s_choice(["0", "0", "0.05", "0.1", "0.15"])})::numeric ELSE 0 END, 2)
+                FROM (SELECT o.id, o.created_at,
+                             CASE WHEN random() < 0.2 THEN {s_int(1, n_prod)}
+                                  ELSE 1 + mod(floor(power(1 - random(), -1 / 0.3))::numeric, {n_prod})::bigint END AS product_id,
+                             GREATEST(1, abs{s_normal(2, 1.5)}::int) AS qty,
+                             {s_lognormal(4.6, 0.6)} AS unit_price
+                      FROM o CROSS JOIN LATERAL
+                           generate_series(1, GREATEST(1, round(-ln(1 - random()) * {AVG_ITEMS_PER_ORDER})::int + 0 * o.id)) k) x
+            )
+            INSERT INTO payments (id, order_id, order_created, amount, method, status, details, paid_at)
+            SELECT id, id, created_at, {s_lognormal(4.5, 0.7)},
+                   ({s_weighted(pay_methods, [60, 5, 15, 3, 10, 4, 3], "rm")})::payment_method, status::payment_status,
+                   jsonb_build_object('auth_code', CASE WHEN status <> 'failed'
+                       THEN upper(substr(md5(random()::text), 1, 4)) || '-' || lpad({s_int(0, 99_999_999)}::text, 8, '0') END),
+                   CASE WHEN status IN ('authorized', 'captured', 'refunded') THEN created_at + {s_int(1, 60)} * INTERVAL '1 minute' END
+            FROM (SELECT id, created_at, rm, {s_weighted(pay_statuses, [5, 15, 70, 5, 5], "rs")} AS status
+                  FROM (SELECT id, created_at, random() AS rm, random() AS rs FROM o) r) x"""),
+    ]
+
+_server_local = threading.local()
+_server_conns = []
+_server_lock = threading.Lock()
+
+def server_conn():
+    """Одно соединение на поток пула — без переподключения на каждый чанк."""
+    conn = getattr(_server_local, "conn", None)
+    if conn is None:
+        conn = psycopg2.connect(DB_CONN)
+        with conn.cursor() as cur:
+            cur.execute("SET synchronous_commit = OFF")
+        conn.commit()
+        _server_local.conn = conn
+        with _server_lock:
+            _server_conns.append(conn)
+    return conn
+
+def server_chunk(sql, lo, hi, seed):
+    conn = server_conn()
+    try:
+        with conn.cursor() as cur:
+            # setseed на чанк: тот же RANDOM_SEED даёт те же значения при любом SERVER_JOBS
+            cur.execute("SELECT setseed(%s)", (seed,))
+            cur.execute(sql, {"lo": lo, "hi": hi})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+def load_server_side(event_rows):
+    tables = server_tables(event_rows)
+    run_sql(f"DROP SEQUENCE IF EXISTS {ITEMS_SEQ}; CREATE SEQUENCE {ITEMS_SEQ}")
+    try:
+        with ThreadPoolExecutor(max_workers=SERVER_JOBS) as pool:
+            for phase in sorted({t[0] for t in tables}):
+                futures = {}
+                for ph, table, total, sql in tables:
+                    if ph != phase:
+                        continue
+                    for lo, hi in gen_id_ranges(total):
+                        seed = random.Random(f"{RANDOM_SEED}:{table}:{lo}").uniform(-1, 1)
+                        futures[pool.submit(server_chunk, sql, lo + 1, hi, seed)] = table
+                names = ", ".join(sorted(set(futures.values())))
+                try:
+                    for fut in tqdm(as_completed(futures), total=len(futures), desc=f"Server-side [{names}]"):
+                        fut.result()
+                except BaseException:
+                    for fut in futures:
+                        fut.cancel()
+                    raise
+    finally:
+        with _server_lock:
+            for c in _server_conns:
+                c.close()
+            _server_conns.clear()
+    run_sql(f"DROP SEQUENCE IF EXISTS {ITEMS_SEQ};"
+            "SELECT setval(pg_get_serial_sequence('events', 'id'), COALESCE((SELECT max(id) FROM events), 0) + 1, false);")
+
 # ----------------- MAIN -----------------
 def main():
     print("Building schema SQL and creating tables (in default schema)...")
@@ -511,6 +762,13 @@ def main():
     event_rows = plan_event_rows(TARGET_DB_SIZE_GB)
     print(f"Planned event rows: {event_rows:,}")
 
+    if SERVER_SIDE:
+        print(f"Server-side generation via generate_series ({SERVER_JOBS} connections)...")
+        load_server_side(event_rows)
+        build_indexes_and_analyze()
+        print("✅ Done. Synthetic DB generated on the server.")
+        return
+
     # Справочники
     print("Generating categories and warehouses...")
     categories_rows = gen_categories(BASE_CATEGORIES)
@@ -603,9 +861,7 @@ def main():
     copy_from_files("events", ["id","account_id","type","payload","created_at"], events_files)
 
     # ----------------- ИНДЕКСЫ И АНАЛИЗ -----------------
-    print("Creating indexes and analyzing (this can take time)...")
-    run_sql(INDEXES_SQL)
-    run_sql(ANALYZE_SQL)
+    build_indexes_and_analyze()
 
     print("✅ Done. Synthetic DB generated and loaded.")
 